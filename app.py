@@ -1,11 +1,28 @@
 from pathlib import Path
+import atexit
+import base64
+import hashlib
+import heapq
+import json
+import os
 import random
+import sqlite3
+import threading
+import uuid
+import numpy as np
 import pandas as pd
 import streamlit as st
+import httpx
 from supabase import create_client
+from postgrest import SyncPostgrestClient, DEFAULT_POSTGREST_CLIENT_HEADERS
 from streamlit_cookies_manager import EncryptedCookieManager
 import streamlit.components.v1 as components
-from collections import Counter
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from collections import Counter, OrderedDict
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from vocab_catalog import LEVEL_ORDER, effective_entry, load_manifest, load_partition, merge_encoded, ordered
 
 # ============================================================
 # ✅ Streamlit 기본 설정 (최상단)
@@ -195,10 +212,11 @@ POS_MODES = ["i_adj", "na_adj", "verb", "mix_adj"]
 
 st.markdown('<div id="__TOP__"></div>', unsafe_allow_html=True)
 
-def mastery_key(qtype: str | None = None, pos_mode: str | None = None) -> str:
+def mastery_key(qtype: str | None = None, pos_mode: str | None = None, level: str | None = None) -> str:
     qt = qtype or st.session_state.get("quiz_type", "reading")
     pm = pos_mode or st.session_state.get("pos_mode", "i_adj")
-    return f"{pm}|{qt}"
+    lv = level or current_level()
+    return f"{lv}|{pm}|{qt}"
 
 def scroll_to_top(nonce: int = 0):
     components.html(
@@ -395,6 +413,34 @@ SUPABASE_ANON_KEY = st.secrets["SUPABASE_ANON_KEY"]
 
 sb = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
 
+# ✅ DB(PostgREST)용 커넥션 풀(transport)만 프로세스 전체가 1개를 공유 (keep-alive 재사용)
+#    - httpx.Client는 PostgREST 클라이언트마다 따로 → 헤더(apikey/Bearer)가 클라이언트별로 분리됨
+#      (postgrest ≤2.21은 auth()/세션 생성 때 http_client.headers를 직접 고침
+#       → Client를 공유하면 한 유저의 토큰이 다른 세션 요청에 실림)
+@st.cache_resource(show_spinner=False)
+def _shared_http_transport() -> httpx.HTTPTransport:
+    return httpx.HTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=50, keepalive_expiry=60.0),
+    )
+
+def _new_http_client(transport: httpx.HTTPTransport | None = None) -> httpx.Client:
+    return httpx.Client(
+        transport=transport or _shared_http_transport(),
+        follow_redirects=True,
+        timeout=httpx.Timeout(10.0, connect=5.0),
+    )
+
+def new_rest_client(token: str, transport: httpx.HTTPTransport | None = None) -> SyncPostgrestClient:
+    """transport: 백그라운드 스레드는 미리 받아 둔 공유 transport를 넘김"""
+    http_client = _new_http_client(transport)
+    client = SyncPostgrestClient(
+        f"{SUPABASE_URL.rstrip('/')}/rest/v1",
+        headers={**DEFAULT_POSTGREST_CLIENT_HEADERS, "apikey": SUPABASE_ANON_KEY},
+        http_client=http_client,
+    )
+    return client.auth(token)
+
 # ============================================================
 # ✅ 상수/설정
 # ============================================================
@@ -402,11 +448,11 @@ SHOW_POST_SUBMIT_UI = "N"   # "Y"면 제출 후 상세(통계/기록/오답노
 SHOW_NAVER_TALK = "Y"    
 NAVER_TALK_URL = "https://talk.naver.com/W45141"
 APP_URL = "https://hotenaquiztestapp-5wiha4zfuvtnq4qgxdhq72.streamlit.app/"
-LEVEL = "N4"
+DEFAULT_LEVEL = "N4"
 N = 10
 KST_TZ = "Asia/Seoul"
 BASE_DIR = Path(__file__).resolve().parent
-CSV_PATH = BASE_DIR / "data" / "words_adj_300.csv"
+CATALOG_DIR = BASE_DIR / "data" / "catalog"   # <레벨>/<품사>.csv(.arrow) + manifest.json (scripts/build_catalog.py)
 
 quiz_label_map = {
     "reading": "발음",
@@ -422,103 +468,986 @@ QUIZ_TYPES_USER = ["reading", "meaning", "kr2jp"]                 # 일반 유
 QUIZ_TYPES_ADMIN = ["reading", "meaning", "kr2jp"]       # 관리자만 3종
 
 # ============================================================
-# ✅ (추가) 어디 페이지에서든 pool/pool_i를 보장하는 Lazy Loader
+# ✅ 품사 (mix_adj = 세 품사 혼합)
 # ============================================================
-READ_KW = dict(
-    dtype=str,
-    keep_default_na=False,
-    na_values=["nan", "NaN", "NULL", "null", "None", "none"],
-)
+MIX_POS = ("i_adj", "na_adj", "verb")
 
-@st.cache_data(show_spinner=False)
-def _load_pools_cached(csv_path_str: str, level: str):
-    # 1) CSV 로드
-    df = pd.read_csv(csv_path_str, **READ_KW)
+# ============================================================
+# ✅ 단어 카탈로그: 레벨 × 품사 파티션 (파일 입출력은 vocab_catalog.py)
+#    - manifest.json = {"levels": {레벨: {품사: {"file", "rows", "sha256"}}}}
+#    - manifest만 먼저 읽고, 파티션은 그 레벨을 처음 쓰는 세션이 생길 때 읽음
+#    - 컴파일된 .arrow가 최신이면 memory map, 아니면 CSV를 읽고 다시 컴파일
+#    - 레벨 안의 word_id = manifest 품사 순서대로 이어 붙인 행 번호
+# ============================================================
+VOCAB_CHECK_INTERVAL_SEC = 2.0   # manifest/CSV 변경 확인(stat) 간격
+VOCAB_PIN_TTL_SEC = 60 * 60      # 이 시간 동안 안 쓴 세션의 고정(pin)은 풀림
 
-    # 2) 필수 컬럼 체크 (먼저!)
-    required_cols = {"level", "pos", "jp_word", "reading", "meaning"}
-    missing = required_cols - set(df.columns)
-    if missing:
-        raise ValueError(f"CSV 필수 컬럼 누락: {sorted(list(missing))}")
+# ============================================================
+# ✅ 단어 데이터 스냅샷 레지스트리 (재시작 없이 단어장 교체)
+#    - 버전 = 레벨 + 파티션 CSV 내용 sha256 → 내용이 같으면 같은 스냅샷
+#    - VOCAB_CHECK_INTERVAL_SEC마다 파일 (mtime, 크기)만 보고, 바뀌었을 때만 해시 계산
+#    - manifest를 다시 만들지 않고 CSV만 고쳐도 반영 (CSV가 원본)
+#    - 새 버전은 다 만든 뒤 current를 한 번에 바꿈 (만드는 중/실패하면 이전 버전 그대로)
+#    - 세션은 지금 풀고 있는 퀴즈의 버전에 고정(pin), 새 퀴즈를 만들 때 최신으로 옮김
+#    - current도 아니고 고정한 세션도 없는 버전은 레지스트리에서 빼서 메모리 해제
+# ============================================================
+@st.cache_resource(show_spinner=False)
+def _vocab_registry() -> dict:
+    return {
+        "lock": threading.Lock(),        # 아래 dict 보호 (짧게만 잡음)
+        "build_lock": threading.Lock(),  # 변경 확인/빌드는 한 번에 하나 (동시에 온 세션은 결과 공유)
+        "manifest": None,                # (stat 서명, manifest, 확인 시각)
+        "checked": {},                   # level → (stat 서명, 확인 시각)
+        "current": {},                   # level → version
+        "snapshots": {},                 # version → 스냅샷
+        "pins": {},                      # session_id → (version, 마지막 사용 시각)
+        "stats": {"loads": 0, "swaps": 0, "released": 0, "errors": 0},
+        "last_error": None,
+    }
 
-    # 3) 정규화 (공백/대소문자 문제 방지)
-    df["level"] = df["level"].astype(str).str.strip().str.upper()
-    df["pos"]   = df["pos"].astype(str).str.strip().str.lower()
+def _file_sig(path: Path):
+    try:
+        s = path.stat()
+    except OSError:
+        return None
+    return (s.st_mtime_ns, s.st_size)
 
-    level_norm = str(level).strip().upper()
+def catalog_manifest() -> dict:
+    reg = _vocab_registry()
+    now = time.monotonic()
+    cached = reg["manifest"]
+    if cached is not None and now - cached[2] < VOCAB_CHECK_INTERVAL_SEC:
+        return cached[1]
 
-    # 4) level 필터 (정규화된 값으로!)
-    pool = df[df["level"] == level_norm].copy()
+    sig = _file_sig(CATALOG_DIR / "manifest.json")
+    if cached is not None and cached[0] == sig:
+        reg["manifest"] = (sig, cached[1], now)
+        return cached[1]
 
-    # 5) 품사별 분리
-    pool_i  = pool[pool["pos"] == "i_adj"].copy()
-    pool_na = pool[pool["pos"] == "na_adj"].copy()
-    pool_v  = pool[pool["pos"] == "verb"].copy()
+    try:
+        manifest = load_manifest(CATALOG_DIR)
+    except (OSError, ValueError):
+        if cached is None:
+            raise
+        manifest = cached[1]  # 쓰는 도중 등 → 이전 manifest 유지, 다음 확인 때 다시
+        sig = cached[0]
+    reg["manifest"] = (sig, manifest, now)
+    return manifest
+
+def catalog_levels() -> list[str]:
+    return ordered(catalog_manifest()["levels"], LEVEL_ORDER)
+
+def current_level() -> str:
+    levels = catalog_levels()
+    level = st.session_state.get("level")
+    if level in levels:
+        return level
+    return DEFAULT_LEVEL if DEFAULT_LEVEL in levels else levels[0]
+
+def vocab_version(level: str, entries: dict) -> str:
+    h = hashlib.sha256(level.encode("utf-8"))
+    for pos, entry in entries.items():
+        h.update(f"\x1f{pos}\x1e{entry['sha256']}".encode("utf-8"))
+    return f"{level}-{h.hexdigest()[:12]}"
 
-    # 6) reading용(표기 없는 단어 제거), meaning용(전체 허용)
-    def _has_jp_word(x: pd.DataFrame) -> pd.DataFrame:
-        return x[x["jp_word"].notna() & (x["jp_word"].astype(str).str.strip() != "")].copy()
+# ============================================================
+# ✅ 단어 테이블: word_id(= 행 번호) 기준 컬럼 배열 + 풀은 word_id 배열
+#    - words[col][word_id] 로 접근 (값 = 고유값 배열[코드] → 같은 문자열은 같은 객체, 행마다 만들지 않음)
+#    - codes[col] = (고유값 배열, word_id → 코드) — 인덱스/코덱은 문자열 대신 코드로 numpy 연산
+#    - pools[(pos_mode, "all"|"reading")] = word_id 배열 (DataFrame 복사 없음)
+#    - 불변 객체이므로 스냅샷 하나를 프로세스 전체가 공유
+# ============================================================
+def _first_ids(values: np.ndarray, codes: np.ndarray) -> dict:
+    """값 → 그 값이 처음 나온 word_id (빈 값 제외)"""
+    present, first = np.unique(codes, return_index=True)
+    vals = values[present]
+    nonempty = vals != ""
+    return dict(zip(vals[nonempty].tolist(), first[nonempty].tolist()))
+
+def _build_word_table(level: str, entries: dict):
+    # 1) 이 레벨의 품사 파티션만 로드 (manifest 순서 = word_id 순서, 정규화/word_key/코드는 컴파일 때 끝남)
+    parts = [load_partition(CATALOG_DIR, entry)[0] for entry in entries.values()]
+
+    # 2) level 필터 (파티션 안에 다른 레벨 행이 섞여 있으면 제외) — 비교는 고유값에만
+    level_norm = str(level).strip().upper()
+    level_values, level_codes = merge_encoded([p["level"] for p in parts])
+    keep = (level_values == level_norm)[level_codes]
+
+    # ✅ word_key = 단어 키(표기 우선, 없으면 읽기) — 맞힌/틀린 단어 추적·DB 통계에서 공통으로 쓰는 키
+    words, codes = {}, {}
+    for name in ("pos", "jp_word", "reading", "meaning", "word_key"):
+        values, col_codes = merge_encoded([p[name] for p in parts])
+        col_codes = col_codes[keep]
+        col = values[col_codes]
+        for arr in (values, col_codes, col):
+            arr.flags.writeable = False
+        words[name], codes[name] = col, (values, col_codes)
+
+    level_arr = np.full(int(keep.sum()), level_norm, dtype=object)
+    level_arr.flags.writeable = False
+    words = {"level": level_arr, **words}
+
+    # 4) 품사별 word_id 풀 + reading용(표기 없는 단어 제거)
+    def _ids(mask: np.ndarray) -> np.ndarray:
+        ids = np.flatnonzero(mask).astype(np.int32)
+        ids.flags.writeable = False
+        return ids
+
+    has_jp = words["jp_word"] != ""
+    pools = {}
+    for p in MIX_POS:
+        is_pos = words["pos"] == p
+        pools[(p, "all")] = _ids(is_pos)
+        pools[(p, "reading")] = _ids(is_pos & has_jp)
+
+    for kind in ("all", "reading"):
+        mix = np.concatenate([pools[(p, kind)] for p in MIX_POS])
+        mix.flags.writeable = False
+        pools[("mix_adj", kind)] = mix
+
+    # ✅ word_key → word_id (중복 키는 첫 행 기준)
+    key_to_id = _first_ids(*codes["word_key"])
+
+    # ✅ 빌드 함수 안에서는 UI 출력(st.caption) 하지 않는 걸 추천
+    return words, codes, pools, key_to_id
 
-    pool_i_reading = _has_jp_word(pool_i)
-    pool_i_meaning = pool_i.copy()
+# ============================================================
+# ✅ 오답 보기(distractor) 인덱스: (level, pos, field) → 버킷
+#    - 버킷 = {"values": 중복 제거된 후보값 배열, "pos_of_word": word_id → 그 단어 값의 후보 위치(-1=없음)}
+#    - 문제마다 풀을 pos로 다시 거르지 않도록, 풀 로드 직후 1번만 만든다
+#    - pos="mix_adj"는 혼합 모드 fallback용(い/な/동사 전체)
+# ============================================================
+DISTRACTOR_FIELDS = ("reading", "meaning", "jp_word")
 
-    pool_na_reading = _has_jp_word(pool_na)
-    pool_na_meaning = pool_na.copy()
+def _build_distractor_index(level: str, codes: dict, pools: dict) -> dict:
+    level_norm = str(level).strip().upper()
 
-    pool_v_reading = _has_jp_word(pool_v)
-    pool_v_meaning = pool_v.copy()
+    def _bucket(ids: np.ndarray, field: str) -> dict:
+        values, word_codes = codes[field]
+        # 풀 안에서 처음 나온 순서대로 고유 코드 (빈 값 제외)
+        present, first = np.unique(word_codes[ids], return_index=True)
+        order = present[np.argsort(first)]
+        order = order[values[order] != ""]
+
+        slot = np.full(len(values), -1, dtype=np.int32)
+        slot[order] = np.arange(len(order), dtype=np.int32)
+        values_arr = values[order]
+        pos_of_word = slot[word_codes]
+        values_arr.flags.writeable = False
+        pos_of_word.flags.writeable = False
+        return {"values": values_arr, "pos_of_word": pos_of_word}
+
+    index = {}
+    for field in DISTRACTOR_FIELDS:
+        # reading/jp_word는 표기 있는 단어 풀, meaning은 전체 풀에서 (build_quiz와 동일 기준)
+        kind = "all" if field == "meaning" else "reading"
+        for pos in MIX_POS + ("mix_adj",):
+            index[(level_norm, pos, field)] = _bucket(pools[(pos, kind)], field)
+
+    return index
 
-    # ✅ 캐시 함수 안에서는 UI 출력(st.caption) 하지 않는 걸 추천
-    return (
-        pool,
-        pool_i,  pool_i_reading,  pool_i_meaning,
-        pool_na, pool_na_reading, pool_na_meaning,
-        pool_v,  pool_v_reading,  pool_v_meaning,
-    )
+# ============================================================
+# ✅ progress 압축 저장용: 단어 데이터 지문 + (필드, 값) → word_id
+#    - 저장: 보기 텍스트 대신 word_id만 / 복원: 같은 지문일 때만 word_id → 텍스트
+# ============================================================
+def _build_progress_codec(words: dict, codes: dict) -> dict:
+    h = hashlib.sha1()
+    for col in ("word_key", "reading", "meaning"):
+        h.update("\x1f".join(words[col].tolist()).encode("utf-8"))
+        h.update(b"\x1e")
+
+    value_word = {field: _first_ids(*codes[field]) for field in DISTRACTOR_FIELDS}
+
+    return {"fingerprint": h.hexdigest()[:16], "value_word": value_word}
 
-def ensure_pools_ready():
-    global pool, pool_i, pool_i_reading, pool_i_meaning
-    global pool_na, pool_na_reading, pool_na_meaning
-    global pool_v, pool_v_reading, pool_v_meaning
+# ============================================================
+# ✅ 단어 데이터 1버전 = VocabSnapshot (불변)
+#    - 만든 뒤에는 속성 대입 불가 + dict는 읽기 전용 뷰 + 배열은 writeable=False
+#    - 그래서 여러 세션/prefetch 스레드가 락 없이 같은 객체를 읽음
+#    - 모듈 전역 대신 이 객체를 build_quiz / make_questions 등에 직접 넘김
+# ============================================================
+class VocabSnapshot:
+    __slots__ = ("version", "level", "words", "pools", "key_to_id", "distractor_index", "codec", "n_words", "_prefix_digest")
 
-    required_names = (
-        "pool","pool_i","pool_i_reading","pool_i_meaning",
-        "pool_na","pool_na_reading","pool_na_meaning",
-        "pool_v","pool_v_reading","pool_v_meaning",
+    version: str
+    level: str
+    words: MappingProxyType          # 컬럼 → word_id 인덱스 배열
+    pools: MappingProxyType          # (pos_mode, "all"|"reading") → word_id 배열
+    key_to_id: MappingProxyType      # word_key → word_id
+    distractor_index: MappingProxyType
+    codec: MappingProxyType          # progress 압축 저장용 {"fingerprint", "value_word"}
+    n_words: int
+
+    def __init__(self, version: str, level: str, words: dict, pools: dict, key_to_id: dict, distractor_index: dict, codec: dict):
+        init = object.__setattr__
+        init(self, "version", version)
+        init(self, "level", level)
+        init(self, "words", MappingProxyType(words))
+        init(self, "pools", MappingProxyType(pools))
+        init(self, "key_to_id", MappingProxyType(key_to_id))
+        init(self, "distractor_index", MappingProxyType(distractor_index))
+        init(self, "codec", MappingProxyType(codec))
+        init(self, "n_words", len(words["word_key"]))
+        init(self, "_prefix_digest", {})  # n_bits → digest (처음 쓸 때 계산, 값이 같으므로 경합해도 무해)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"VocabSnapshot은 바꿀 수 없습니다: {name}")
+
+    def __repr__(self) -> str:
+        return f"VocabSnapshot({self.version}, words={self.n_words})"
+
+    def prefix_digest(self, n_bits: int) -> str:
+        """앞 n_bits개 word_key의 digest (비트셋 저장/복원 때 단어장이 같은지 확인)"""
+        digest = self._prefix_digest.get(n_bits)
+        if digest is None:
+            digest = hashlib.sha1("\x1f".join(self.words["word_key"][:n_bits].tolist()).encode("utf-8")).hexdigest()[:16]
+            self._prefix_digest[n_bits] = digest
+        return digest
+
+def build_vocab_snapshot(level: str, entries: dict, version: str) -> VocabSnapshot:
+    words, codes, pools, key_to_id = _build_word_table(level, entries)
+    return VocabSnapshot(
+        version, level, words, pools, key_to_id,
+        _build_distractor_index(level, codes, pools),
+        _build_progress_codec(words, codes),
     )
-    globals_ok = all((name in globals()) and (globals().get(name) is not None) for name in required_names)
 
-    if st.session_state.get("pool_ready") and globals_ok:
-        return
+def _vocab_release_locked(reg: dict, now: float):
+    for sid, (_version, ts) in list(reg["pins"].items()):
+        if now - ts > VOCAB_PIN_TTL_SEC:
+            del reg["pins"][sid]
+
+    keep = set(reg["current"].values()) | {version for version, _ts in reg["pins"].values()}
+    for version in [v for v in reg["snapshots"] if v not in keep]:
+        del reg["snapshots"][version]
+        reg["stats"]["released"] += 1
+
+def latest_vocab(level: str) -> VocabSnapshot:
+    """이 레벨의 최신 스냅샷 (파일이 바뀌었으면 새로 만들어서 교체)"""
+    reg = _vocab_registry()
+    now = time.monotonic()
+    with reg["lock"]:
+        version = reg["current"].get(level)
+        if version is not None and now - reg["checked"][level][1] < VOCAB_CHECK_INTERVAL_SEC:
+            return reg["snapshots"][version]
+
+    # ✅ 다시 만드는 건 한 세션만: 나머지는 기다리지 않고 지금 스냅샷으로 계속 (다 만들어지면 교체)
+    #    (처음 불러오는 레벨만 보여 줄 스냅샷이 없으므로 기다림)
+    if version is not None:
+        if not reg["build_lock"].acquire(blocking=False):
+            return reg["snapshots"][version]
+    else:
+        reg["build_lock"].acquire()
+    try:
+        return _latest_vocab_build(reg, level, now)
+    finally:
+        reg["build_lock"].release()
+
+def _latest_vocab_build(reg: dict, level: str, now: float) -> VocabSnapshot:
+    """(build_lock 잡은 상태) 파일 서명을 확인하고 바뀌었으면 새 스냅샷으로 교체"""
+    with reg["lock"]:
+        version = reg["current"].get(level)
+
+    entries = catalog_manifest()["levels"].get(level)
+    if entries is None:
+        if version is None:
+            raise KeyError(f"카탈로그에 없는 레벨: {level}")
+        return reg["snapshots"][version]  # manifest에서 빠진 레벨 → 풀던 세션은 그대로
+
+    sig = (reg["manifest"][0], tuple(_file_sig(CATALOG_DIR / e["file"]) for e in entries.values()))
+    with reg["lock"]:
+        version = reg["current"].get(level)
+        if version is not None and reg["checked"][level][0] == sig:
+            reg["checked"][level] = (sig, now)
+            return reg["snapshots"][version]
 
     try:
-        (
-            pool,
-            pool_i,  pool_i_reading,  pool_i_meaning,
-            pool_na, pool_na_reading, pool_na_meaning,
-            pool_v,  pool_v_reading,  pool_v_meaning,
-        ) = _load_pools_cached(str(CSV_PATH), LEVEL)
+        resolved = {pos: effective_entry(CATALOG_DIR, entry) for pos, entry in entries.items()}
+        new_version = vocab_version(level, resolved)
+        snap = reg["snapshots"].get(new_version)
+        loaded = snap is None
+        if loaded:
+            snap = build_vocab_snapshot(level, resolved, new_version)
+    except Exception as e:
+        if version is None:
+            raise
+        # ✅ 고치는 도중의 CSV 등 → 이전 버전으로 계속 서비스, 파일이 다시 바뀌면 재시도
+        with reg["lock"]:
+            reg["stats"]["errors"] += 1
+            reg["last_error"] = f"{level}: {e}"
+            reg["checked"][level] = (sig, now)
+        return reg["snapshots"][version]
+
+    with reg["lock"]:
+        reg["snapshots"][new_version] = snap
+        reg["stats"]["loads"] += int(loaded)
+        reg["stats"]["swaps"] += int(version is not None and version != new_version)
+        reg["current"][level] = new_version
+        reg["checked"][level] = (sig, now)
+        _vocab_release_locked(reg, now)
+    return snap
+
+def _session_id() -> str:
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "-"
+
+def remap_session_word_state(level: str, old_keys: np.ndarray, snap: VocabSnapshot):
+    """같은 레벨의 새 버전으로 옮길 때 word_id 인덱스 상태를 word_key 기준으로 옮김
+
+    - 맞힌/틀린 비트셋, SRS 배열(힙은 다시 만듦), 풀고 있는 퀴즈의 word_id
+    - word_id 기반 캐시(가중 샘플러/통계 배열)와 prefetch는 버림 → 다음에 새 버전으로 다시 만듦
+    """
+    new_key_to_id = snap.key_to_id
+    n_words = snap.n_words
+    pairs = [(i, new_key_to_id[wk]) for i, wk in enumerate(old_keys.tolist()) if wk in new_key_to_id]
+    src = np.array([p[0] for p in pairs], dtype=np.int64)
+    dst = np.array([p[1] for p in pairs], dtype=np.int64)
+    prefix = f"{level}|"
+
+    def _move(arr: np.ndarray, fill) -> np.ndarray:
+        out = np.full(n_words, fill, dtype=arr.dtype)
+        out[dst] = arr[src]
+        return out
+
+    for store in ("mastered_words", "excluded_wrong_words"):
+        d = st.session_state.get(store)
+        if not isinstance(d, dict):
+            continue
+        for k, bits in list(d.items()):
+            if k.startswith(prefix) and isinstance(bits, np.ndarray) and bits.shape == old_keys.shape:
+                d[k] = _move(bits, False)
 
+    for k, state in list((st.session_state.get("srs") or {}).items()):
+        if not (k.startswith(prefix) and isinstance(state, dict) and getattr(state.get("due"), "shape", None) == old_keys.shape):
+            continue
+        for col, fill in (("due", np.inf), ("ease", SRS_EASE_INIT), ("ivl", 0.0), ("reps", 0)):
+            state[col] = _move(state[col], fill)
+        srs_rebuild_heap(state)
+
+    for q in st.session_state.get("quiz") or []:
+        if isinstance(q, dict) and "word_id" in q:
+            wid = new_key_to_id.get(str(q.get("jp_word", "")).strip() or str(q.get("reading", "")).strip())
+            q["word_id"] = wid
+
+    st.session_state.pop("_word_sampler", None)
+    st.session_state.pop("_word_stats", None)
+    invalidate_quiz_prefetch()
+
+def vocab_snapshot(fresh: bool = False) -> VocabSnapshot:
+    """이 세션이 쓰는 단어 스냅샷
+
+    - 평소: 고정(pin)된 버전 (풀고 있는 퀴즈의 word_id가 그대로 맞음)
+    - fresh=True(새 퀴즈 만들 때) / 레벨 변경 / 고정이 풀렸을 때: 최신 버전으로 옮김
+    """
+    level = current_level()
+    reg = _vocab_registry()
+    sid = _session_id()
+    pin = st.session_state.get("_vocab_pin") or {}
+    now = time.monotonic()
+
+    if not fresh and pin.get("level") == level:
+        with reg["lock"]:
+            snap = reg["snapshots"].get(pin.get("version"))
+            if snap is not None:
+                reg["pins"][sid] = (snap.version, now)
+                return snap
+
+    try:
+        snap = latest_vocab(level)
     except Exception as e:
         st.error(f"단어 데이터 로드 실패: {e}")
         st.stop()
 
-    pos_mode = st.session_state.get("pos_mode", "i_adj")
+    if snap.version != pin.get("version"):
+        if pin.get("level") == level and pin.get("word_key") is not None:
+            remap_session_word_state(level, pin["word_key"], snap)
+        # ✅ word_key 배열만 들고 있음 (옛 스냅샷 전체를 세션이 붙잡지 않게)
+        st.session_state["_vocab_pin"] = {"version": snap.version, "level": level, "word_key": snap.words["word_key"]}
+
+    with reg["lock"]:
+        reg["pins"][sid] = (snap.version, now)
+        _vocab_release_locked(reg, now)
+    return snap
+
+def sample_distinct(rng: np.random.Generator, m, k: int) -> np.ndarray:
+    """행마다 range(m[r])에서 서로 다른 k개를 뽑는다 (Floyd 알고리즘, 행 방향 벡터화). m >= k 필요."""
+    m = np.asarray(m, dtype=np.int64)
+    out = np.empty((m.size, k), dtype=np.int64)
+    for t in range(k):
+        j = m - k + t
+        r = rng.integers(0, j + 1)
+        dup = (out[:, :t] == r[:, None]).any(axis=1)
+        out[:, t] = np.where(dup, j, r)
+    return out
 
-    if pos_mode in ["i_adj", "mix_adj"] and len(pool_i) < N:
-        st.error(f"い형용사 단어가 부족합니다: pool={len(pool_i)}")
-        st.stop()
+# ============================================================
+# ✅ 맞힌/틀린 단어 = word_id 기준 비트셋(bool 배열)
+#    - st.session_state[store][조합키] = np.ndarray(bool, 단어 수)
+#    - 예전 세션의 set(word_key)는 처음 접근할 때 비트셋으로 변환
+# ============================================================
+def word_bitset(store: str, k: str) -> np.ndarray:
+    vocab = vocab_snapshot()
+
+    if store not in st.session_state or not isinstance(st.session_state[store], dict):
+        st.session_state[store] = {}
+
+    n_words = vocab.n_words
+    bits = st.session_state[store].get(k)
+    if isinstance(bits, np.ndarray) and bits.dtype == bool and bits.shape == (n_words,):
+        return bits
+
+    # ✅ 단어장과 길이가 다름(다른 버전 기준) → 0으로 채우지 않고 DB에서 다시
+    if isinstance(bits, np.ndarray):
+        reload_persisted_word_state(k)
+        bits = st.session_state[store].get(k)
+        if isinstance(bits, np.ndarray) and bits.shape == (n_words,):
+            return bits
+        bits = None
+
+    # ✅ 이 조합키를 처음 쓰는 순간에만 DB에서 불러옴 (두 비트셋을 한 번에)
+    if bits is None and load_persisted_bitsets(k):
+        return st.session_state[store][k]
+
+    new_bits = np.zeros(n_words, dtype=bool)
+    if isinstance(bits, (set, list, tuple)):
+        ids = [vocab.key_to_id[wk] for wk in bits if wk in vocab.key_to_id]
+        new_bits[ids] = True
+
+    st.session_state[store][k] = new_bits
+    return new_bits
+
+def blocked_bitset(k: str) -> np.ndarray:
+    """출제 제외 = 맞힌 단어 | 틀린 단어"""
+    return word_bitset("mastered_words", k) | word_bitset("excluded_wrong_words", k)
+
+def mark_word_result(k: str, word_id, word_key: str, is_correct: bool):
+    wid = word_id if word_id is not None else vocab_snapshot().key_to_id.get(word_key)
+    if wid is None:
+        return
+    wid = int(wid)
 
-    if pos_mode in ["na_adj", "mix_adj"] and len(pool_na) < N:
-        st.error(f"な형용사 단어가 부족합니다: pool={len(pool_na)}")
-        st.stop()
+    mastered = word_bitset("mastered_words", k)
+    excluded = word_bitset("excluded_wrong_words", k)
+    if wid >= mastered.size:
+        return
 
-    if pos_mode in ["verb", "mix_adj"] and len(pool_v) < N:
-        st.error(f"동사 단어가 부족합니다: pool={len(pool_v)}")
-        st.stop()
+    if is_correct:
+        # ✅ 맞힌 단어 기록 + 정답으로 맞히면 오답 제외 해제
+        mastered[wid] = True
+        excluded[wid] = False
+    else:
+        # ✅ 틀린 단어는 랜덤 출제에서 제외
+        excluded[wid] = True
 
-    st.session_state["pool_ready"] = True
+# ============================================================
+# ✅ 맞힌/틀린 단어 비트셋 저장 (유저 × 조합키 1행, user_word_bitsets)
+#    - np.packbits → base64 (단어 300개 = 38바이트 → 52자)
+#    - n_bits + 앞 n_bits개 word_key의 digest를 같이 저장
+#      → CSV 뒤에 단어가 추가돼도 기존 비트는 그대로 쓰고, 순서가 바뀌었으면 버림
+#    - 쓰기는 write-behind 큐(조합키별로 합쳐짐)로, 제출 때마다 1번 enqueue
+#    - 같은 행에 SM-2 일정(srs)도 같이 저장 → 새 세션에서도 1일/6일 복습이 이어짐
+# ============================================================
+def encode_bitset(bits: np.ndarray) -> str:
+    return base64.b64encode(np.packbits(bits).tobytes()).decode("ascii")
+
+def decode_bitset(text: str, n_bits: int) -> np.ndarray:
+    packed = np.frombuffer(base64.b64decode(text or ""), dtype=np.uint8)
+    return np.unpackbits(packed, count=n_bits).astype(bool) if n_bits else np.zeros(0, dtype=bool)
+
+# 일정이 있는 단어 1개 = word_id(u4) + due(f8) + ease(f4) + ivl(f4) + reps(i2), 열 단위로 이어 붙임
+_SRS_FIELDS = (("wid", "<u4"), ("due", "<f8"), ("ease", "<f4"), ("ivl", "<f4"), ("reps", "<i2"))
+_SRS_RECORD_BYTES = sum(np.dtype(t).itemsize for _, t in _SRS_FIELDS)
+
+def encode_srs(state: dict, n_bits: int) -> str:
+    idx = np.flatnonzero(np.isfinite(state["due"][:n_bits]))
+    cols = {"wid": idx, "due": state["due"][idx], "ease": state["ease"][idx], "ivl": state["ivl"][idx], "reps": state["reps"][idx]}
+    return base64.b64encode(b"".join(cols[name].astype(t).tobytes() for name, t in _SRS_FIELDS)).decode("ascii")
+
+def decode_srs(text: str, n_bits: int, n_words: int) -> dict:
+    state = srs_new_state(n_words)
+    raw = base64.b64decode(text or "")
+    m = len(raw) // _SRS_RECORD_BYTES
+    cols, off = {}, 0
+    for name, t in _SRS_FIELDS:
+        cols[name] = np.frombuffer(raw, dtype=t, count=m, offset=off)
+        off += m * np.dtype(t).itemsize
+    ok = cols["wid"] < n_bits
+    wid = cols["wid"][ok].astype(np.int64)
+    state["due"][wid] = cols["due"][ok]
+    state["ease"][wid] = cols["ease"][ok]
+    state["ivl"][wid] = cols["ivl"][ok]
+    state["reps"][wid] = cols["reps"][ok]
+    srs_rebuild_heap(state)
+    return state
+
+def fetch_word_bitsets(sb_authed, user_id: str, k: str) -> dict | None:
+    res = (
+        sb_authed.table("user_word_bitsets")
+        .select("n_bits, words_digest, mastered, excluded, srs")
+        .eq("user_id", user_id)
+        .eq("mastery_key", k)
+        .limit(1)
+        .execute()
+    )
+    return res.data[0] if res.data else None
+
+def write_word_bitsets_row(sb_authed, user_id: str, row: dict):
+    sb_authed.table("user_word_bitsets").upsert(
+        {"user_id": user_id, **row},
+        on_conflict="user_id,mastery_key",
+    ).execute()
+
+def load_persisted_bitsets(k: str) -> bool:
+    """조합키 k의 비트셋 + SM-2 일정을 DB에서 세션으로 (불러왔으면 True)
 
+    - 조회에 실패한 키는 이 세션에서 저장하지 않음 (빈 비트셋으로 DB를 덮어쓰지 않게)
+    - 일정 없이 막혀 있던 단어(일정 저장 전 기록)는 지금 복습할 단어로 일정을 붙임
+      → 한 번 틀린/맞힌 단어가 세션을 넘어 영영 안 나오는 일이 없게
+    """
+    loaded = st.session_state.setdefault("_bitsets_loaded", {})
+    if k in loaded:
+        return False
+
+    u = st.session_state.get("user")
+    sb_authed_local = get_authed_sb() if u is not None else None
+    if u is None or sb_authed_local is None:
+        return False
+
+    try:
+        row = fetch_word_bitsets(sb_authed_local, u.id, k)
+    except Exception:
+        loaded[k] = "failed"
+        return False
+    loaded[k] = "ok" if row else "none"
+    if not row:
+        return False
+
+    vocab = vocab_snapshot()
+    n_words = vocab.n_words
+    n_bits = int(row.get("n_bits") or 0)
+    if n_bits > n_words or row.get("words_digest") != vocab.prefix_digest(n_bits):
+        return False  # 단어장이 바뀜 → 처음부터
+
+    for store, col in (("mastered_words", "mastered"), ("excluded_wrong_words", "excluded")):
+        bits = np.zeros(n_words, dtype=bool)
+        bits[:n_bits] = decode_bitset(row.get(col), n_bits)
+        st.session_state.setdefault(store, {})[k] = bits
+    if not isinstance(st.session_state.get("srs"), dict):
+        st.session_state["srs"] = {}
+    state = decode_srs(row.get("srs"), n_bits, n_words)
+    mastered = st.session_state["mastered_words"][k]
+    excluded = st.session_state["excluded_wrong_words"][k]
+    orphan = (mastered | excluded) & ~np.isfinite(state["due"])
+    if orphan.any():
+        now = time.time()
+        state["due"][orphan] = now
+        state["reps"][orphan & mastered & ~excluded] = 1
+        state["ivl"][orphan & mastered & ~excluded] = 1.0
+        srs_rebuild_heap(state)
+    st.session_state["srs"][k] = state
+    return True
+
+def reload_persisted_word_state(k: str):
+    """세션의 k 상태가 지금 단어장과 길이가 다를 때(레벨/핫리로드 어긋남): 버리고 DB에서 다시
+
+    - 다시 못 불러오면(조회 실패/단어장 순서 바뀜) 이 세션에서는 k를 저장하지 않음
+      (0으로 채운 배열이 DB의 진행 기록을 덮어쓰지 않게)
+    """
+    for store in ("mastered_words", "excluded_wrong_words", "srs"):
+        d = st.session_state.get(store)
+        if isinstance(d, dict):
+            d.pop(k, None)
+    loaded = st.session_state.setdefault("_bitsets_loaded", {})
+    loaded.pop(k, None)
+    if not load_persisted_bitsets(k) and loaded.get(k) != "none":
+        loaded[k] = "stale"
+
+def enqueue_bitsets_save(k: str):
+    u = st.session_state.get("user")
+    if u is None or st.session_state.get("_bitsets_loaded", {}).get(k) in ("failed", "stale"):
+        return
+    sb_authed_local = get_authed_sb()
+    if sb_authed_local is None:
+        return
+
+    mastered = word_bitset("mastered_words", k)
+    excluded = word_bitset("excluded_wrong_words", k)
+    row = {
+        "mastery_key": k,
+        "n_bits": int(mastered.size),
+        "words_digest": vocab_snapshot().prefix_digest(int(mastered.size)),
+        "mastered": encode_bitset(mastered),
+        "excluded": encode_bitset(excluded),
+        "srs": encode_srs(srs_state(k), int(mastered.size)),
+        "updated_at": pd.Timestamp.now(tz="UTC").isoformat(),
+    }
+    enqueue_progress_save(sb_authed_local, u.id, row, key=(u.id, "bitsets", k), write=write_word_bitsets_row)
+
+# ============================================================
+# ✅ 간격 반복(SM-2) 스케줄러
+#    - st.session_state["srs"][조합키] = {"due", "ease", "ivl", "reps", "heap", "ver"}
+#      due/ease/ivl/reps는 word_id 인덱스 배열, heap은 (due, word_id) 최소 힙
+#    - 한 번이라도 푼 단어(맞힘/틀림 비트셋)만 복습 대상, 나머지는 새 단어
+#    - 복습 시각이 된 단어 N개 = 힙에서 N번 pop 후 되돌려 넣기 → O(N log M)
+#    - 힙의 오래된 항목은 due 배열과 비교해서 버림(lazy invalidation)
+# ============================================================
+SRS_EASE_INIT = 2.5
+SRS_EASE_MIN = 1.3
+SRS_QUALITY_CORRECT = 4
+SRS_QUALITY_WRONG = 2
+SRS_RELEARN_SEC = 10 * 60  # 틀린 단어는 10분 뒤 다시 복습 대상
+DAY_SEC = 24 * 60 * 60
+
+def srs_new_state(n_words: int) -> dict:
+    return {
+        "due": np.full(n_words, np.inf),                         # 다음 복습 시각(epoch 초), inf = 일정 없음
+        "ease": np.full(n_words, SRS_EASE_INIT, dtype=np.float32),
+        "ivl": np.zeros(n_words, dtype=np.float32),              # 복습 간격(일)
+        "reps": np.zeros(n_words, dtype=np.int16),               # 연속 정답 횟수
+        "heap": [],
+        "ver": 0,                                                # 일정이 바뀔 때마다 +1 (prefetch 검증용)
+    }
+
+def srs_rebuild_heap(state: dict):
+    live = np.flatnonzero(np.isfinite(state["due"]))
+    state["heap"] = list(zip(state["due"][live].tolist(), live.tolist()))
+    heapq.heapify(state["heap"])
+    state["ver"] += 1
+
+def srs_state(k: str) -> dict:
+    n_words = vocab_snapshot().n_words
+
+    if "srs" not in st.session_state or not isinstance(st.session_state["srs"], dict):
+        st.session_state["srs"] = {}
+
+    state = st.session_state["srs"].get(k)
+    if isinstance(state, dict) and getattr(state.get("due"), "shape", None) == (n_words,):
+        return state
+
+    # ✅ 다른 버전 기준 일정 → 새로 만들지 않고 DB에서 다시 (비트셋과 같이)
+    if state is not None:
+        reload_persisted_word_state(k)
+        state = st.session_state["srs"].get(k)
+        if isinstance(state, dict) and getattr(state.get("due"), "shape", None) == (n_words,):
+            return state
+        state = None
+
+    # ✅ 이 조합키를 처음 쓰는 순간에만 DB에서 (비트셋과 같은 행)
+    if state is None and load_persisted_bitsets(k):
+        return st.session_state["srs"][k]
+
+    state = srs_new_state(n_words)
+    st.session_state["srs"][k] = state
+    return state
+
+def _srs_compact(state: dict):
+    """힙의 오래된 항목이 너무 쌓이면 유효한 것만 남겨 다시 heapify"""
+    heap = state["heap"]
+    n_live = int(np.count_nonzero(np.isfinite(state["due"])))
+    if len(heap) <= 2 * n_live + 64:
+        return
+    due = state["due"]
+    live = [(d, wid) for (d, wid) in heap if due[wid] == d]
+    heapq.heapify(live)
+    state["heap"] = live
+
+def srs_review(state: dict, word_id: int, is_correct: bool, now: float):
+    wid = int(word_id)
+    q = SRS_QUALITY_CORRECT if is_correct else SRS_QUALITY_WRONG
+    ease = float(state["ease"][wid]) + (0.1 - (5 - q) * (0.08 + (5 - q) * 0.02))
+    state["ease"][wid] = max(SRS_EASE_MIN, ease)
+
+    if is_correct:
+        reps = int(state["reps"][wid]) + 1
+        if reps == 1:
+            ivl = 1.0
+        elif reps == 2:
+            ivl = 6.0
+        else:
+            ivl = float(state["ivl"][wid]) * float(state["ease"][wid])
+        state["reps"][wid] = reps
+        state["ivl"][wid] = ivl
+        due = now + ivl * DAY_SEC
+    else:
+        state["reps"][wid] = 0
+        state["ivl"][wid] = 0.0
+        due = now + SRS_RELEARN_SEC
+
+    state["due"][wid] = due
+    heapq.heappush(state["heap"], (due, wid))
+    state["ver"] += 1
+    _srs_compact(state)
+
+def srs_forget(state: dict, mask: np.ndarray):
+    """mask에 해당하는 단어의 일정을 지움 (다시 새 단어로)"""
+    state["due"][mask] = np.inf
+    state["ease"][mask] = SRS_EASE_INIT
+    state["ivl"][mask] = 0.0
+    state["reps"][mask] = 0
+    state["ver"] += 1
+    _srs_compact(state)
+
+def srs_review_quiz(k: str, quiz: list, answers: list, now: float | None = None):
+    """제출한 퀴즈 1세트를 스케줄러에 반영 (시도당 1번만 호출)"""
+    state = srs_state(k)
+    now = time.time() if now is None else now
+    for q, picked in zip(quiz, answers):
+        wid = q.get("word_id")
+        if wid is None:
+            wid = vocab_snapshot().key_to_id.get(str(q.get("jp_word", "")).strip() or str(q.get("reading", "")).strip())
+        if wid is None or int(wid) >= state["due"].size:
+            continue
+        srs_review(state, wid, picked == q["correct_text"], now)
+
+def srs_due_ids(state: dict, word_pos: np.ndarray, want: dict, allowed: np.ndarray | None = None, now: float | None = None) -> np.ndarray:
+    """복습 시각이 지난 단어를 급한 순서로 품사별 want[pos]개까지 (word_id 배열)
+
+    - word_pos: word_id → 품사 (VocabSnapshot.words["pos"])
+    - allowed: 출제 가능한 word_id 비트셋 (예: 읽기 있는 단어만)
+    - 힙에서 꺼낸 항목은 다시 넣으므로 상태는 바뀌지 않음 (오래된 항목만 정리됨)
+    """
+    now = time.time() if now is None else now
+    heap, due = state["heap"], state["due"]
+    left = dict(want)
+    n_left = sum(left.values())
+    picked, popped = [], []
+
+    while heap and n_left > 0 and heap[0][0] <= now:
+        d, wid = heapq.heappop(heap)
+        if due[wid] != d:
+            continue  # 더 새 일정이 있는 오래된 항목
+        popped.append((d, wid))
+        if allowed is not None and not allowed[wid]:
+            continue
+        pos = word_pos[wid]
+        if left.get(pos, 0) > 0:
+            left[pos] -= 1
+            n_left -= 1
+            picked.append(wid)
+
+    for item in popped:
+        heapq.heappush(heap, item)
+    return np.asarray(picked, dtype=np.int32)
+
+def srs_due_for_quiz(qtype: str, pos_mode: str, count: int = 1) -> tuple[np.ndarray, int]:
+    """build_quizzes에 넘길 복습 단어 + 스케줄 버전"""
+    vocab = vocab_snapshot()
+    k = mastery_key(qtype=qtype, pos_mode=pos_mode)
+    state = srs_state(k)
+    kind = "reading" if qtype in ["reading", "kr2jp"] else "all"
+
+    parts = MIX_RATIO if pos_mode == "mix_adj" else ((pos_mode, N),)
+    allowed = np.zeros(state["due"].size, dtype=bool)
+    for pos, _n in parts:
+        allowed[vocab.pools[(pos, kind)]] = True
+
+    want = {pos: n * count for pos, n in parts}
+    return srs_due_ids(state, vocab.words["pos"], want, allowed), state["ver"]
+
+# ============================================================
+# ✅ 오답률 가중 샘플링 (새 단어 채우기용)
+#    - 서버 누적 통계(user_word_agg)를 세션당 1번 읽어 유형별 배열로 보관
+#      (wrong_list 백필분 backfilled_wrong은 본 횟수를 모르므로 제외)
+#    - 가중치 = 1 + WORD_WEIGHT_ERROR × 오답률 × 최근성
+#    - (조합키, 품사)마다 Fenwick 트리 1개: 비트셋/통계가 바뀐 단어만 점 갱신
+#    - N개 비복원 추출 = 뽑은 가중치를 잠시 빼 두고 N번 탐색 → O(N log M)
+# ============================================================
+WORD_WEIGHT_ERROR = 4.0
+WORD_WEIGHT_RECENCY_DAYS = 14.0
+WORD_STATS_RETRY_SEC = 300.0
+
+def fenwick_build(w: np.ndarray) -> np.ndarray:
+    """tree[i] = w[i - lowbit(i+1) + 1 .. i] 합 (벡터 연산 1번)"""
+    csum = np.concatenate([[0.0], np.cumsum(w, dtype=np.float64)])
+    i1 = np.arange(1, w.size + 1)
+    return csum[i1] - csum[i1 - (i1 & -i1)]
+
+def fenwick_add(tree: np.ndarray, i: int, delta: float):
+    n = tree.size
+    i += 1
+    while i <= n:
+        tree[i - 1] += delta
+        i += i & -i
+
+def fenwick_total(tree: np.ndarray) -> float:
+    total, i = 0.0, tree.size
+    while i > 0:
+        total += tree[i - 1]
+        i -= i & -i
+    return float(total)
+
+def fenwick_find(tree: np.ndarray, u: float) -> int:
+    """누적합이 u를 넘는 첫 위치"""
+    pos, step = 0, 1 << (tree.size.bit_length() - 1)
+    while step:
+        nxt = pos + step
+        if nxt <= tree.size and tree[nxt - 1] <= u:
+            pos = nxt
+            u -= tree[nxt - 1]
+        step >>= 1
+    return min(pos, tree.size - 1)
+
+def word_stats(qtype: str) -> dict | None:
+    """{"seen", "wrong", "last_wrong"} (word_id 인덱스) — 로그인 전/조회 실패면 None"""
+    vocab = vocab_snapshot()
+
+    u = st.session_state.get("user")
+    user_id = getattr(u, "id", None)
+    if not user_id:
+        return None
+
+    level = current_level()
+    cached = st.session_state.get("_word_stats")
+    if isinstance(cached, dict) and cached.get("user_id") == user_id and cached.get("level") == level:
+        if cached.get("by_qtype") is not None:
+            return cached["by_qtype"].get(qtype)
+        if time.monotonic() - cached.get("failed_at", 0.0) < WORD_STATS_RETRY_SEC:
+            return None
+
+    sb_authed_local = get_authed_sb()
+    if sb_authed_local is None:
+        return None
+    try:
+        rows = fetch_user_word_stats(sb_authed_local, user_id)
+    except Exception:
+        st.session_state["_word_stats"] = {
+            "user_id": user_id, "level": level, "by_qtype": None, "failed_at": time.monotonic(),
+        }
+        return None
+
+    n_words = vocab.n_words
+    by_qtype = {}
+    for r in rows:
+        wid = vocab.key_to_id.get(str(r.get("word_key") or ""))
+        if wid is None:
+            continue
+        stats = by_qtype.get(r.get("quiz_type"))
+        if stats is None:
+            stats = by_qtype[r.get("quiz_type")] = {
+                "seen": np.zeros(n_words, dtype=np.int32),
+                "wrong": np.zeros(n_words, dtype=np.int32),
+                "last_wrong": np.full(n_words, np.nan),
+            }
+        # 백필 오답(본 횟수 모름)은 오답률에서 뺌
+        bf = int(r.get("backfilled_wrong") or 0)
+        stats["seen"][wid] += max(int(r.get("seen_count") or 0) - bf, 0)
+        stats["wrong"][wid] += max(int(r.get("wrong_count") or 0) - bf, 0)
+        if r.get("last_wrong_at"):
+            ts = pd.Timestamp(r["last_wrong_at"]).timestamp()
+            stats["last_wrong"][wid] = np.fmax(stats["last_wrong"][wid], ts)
+
+    st.session_state["_word_stats"] = {"user_id": user_id, "level": level, "by_qtype": by_qtype}
+    return by_qtype.get(qtype)
+
+def word_weights(stats: dict, ids: np.ndarray, now: float) -> np.ndarray:
+    err = stats["wrong"][ids] / (stats["seen"][ids] + 2.0)
+    age_days = (now - stats["last_wrong"][ids]) / DAY_SEC
+    recency = np.where(np.isnan(age_days), 0.5, 0.5 + 0.5 * np.exp(-np.maximum(age_days, 0.0) / WORD_WEIGHT_RECENCY_DAYS))
+    return 1.0 + WORD_WEIGHT_ERROR * err * recency
+
+def word_sampler(k: str, pos: str, qtype: str, stats: dict, blocked: np.ndarray, now: float) -> dict:
+    """(조합키, 품사) Fenwick 샘플러 — 이전 호출 이후 막힘 여부가 바뀐 단어만 갱신"""
+    if "_word_sampler" not in st.session_state or not isinstance(st.session_state["_word_sampler"], dict):
+        st.session_state["_word_sampler"] = {}
+
+    kind = "reading" if qtype in ["reading", "kr2jp"] else "all"
+    pool = vocab_snapshot().pools[(pos, kind)]
+    is_blocked = blocked[pool]
+
+    sp = st.session_state["_word_sampler"].get((k, pos))
+    if sp is None or sp["pool"] is not pool:
+        base = word_weights(stats, pool, now)
+        w = np.where(is_blocked, 0.0, base)
+        sp = {"pool": pool, "base": base, "w": w, "blocked": is_blocked.copy(), "tree": fenwick_build(w)}
+        st.session_state["_word_sampler"][(k, pos)] = sp
+        return sp
+
+    changed = np.flatnonzero(is_blocked != sp["blocked"])
+    if changed.size > pool.size // 8:
+        sp["w"] = np.where(is_blocked, 0.0, sp["base"])
+        sp["tree"] = fenwick_build(sp["w"])
+    else:
+        for i in changed:
+            new_w = 0.0 if is_blocked[i] else float(sp["base"][i])
+            fenwick_add(sp["tree"], int(i), new_w - float(sp["w"][i]))
+            sp["w"][i] = new_w
+    sp["blocked"] = is_blocked.copy()
+    return sp
+
+def word_sampler_draw(sp: dict, rng: np.random.Generator, n: int) -> np.ndarray:
+    """가중치 비례 비복원 추출 n개 (word_id). 트리는 끝나면 원래대로 되돌림"""
+    tree, w = sp["tree"], sp["w"]
+    total = fenwick_total(tree)
+    picked = []
+    for _ in range(n):
+        if total <= 1e-9:
+            break
+        i = fenwick_find(tree, rng.random() * total)
+        if w[i] <= 0.0:  # 부동소수 오차로 0 가중치에 걸리면 남은 후보에서 직접 선택
+            nz = np.flatnonzero(w > 0.0)
+            nz = nz[~np.isin(nz, picked)]
+            if nz.size == 0:
+                break
+            i = int(nz[0])
+        picked.append(int(i))
+        fenwick_add(tree, int(i), -float(w[i]))
+        total -= float(w[i])
+    for i in picked:
+        fenwick_add(tree, i, float(w[i]))
+    return sp["pool"][np.asarray(picked, dtype=np.int64)]
+
+def weighted_fresh_ids(qtype: str, pos_mode: str, blocked: np.ndarray, count: int = 1, seed=None) -> dict | None:
+    """build_quizzes(fresh=...)용 새 단어 후보 {품사: (count, n) 배열}. 통계가 없으면 None(균등 추출)"""
+    stats = word_stats(qtype)
+    if stats is None:
+        return None
+
+    k = mastery_key(qtype=qtype, pos_mode=pos_mode)
+    now = time.time()
+    rng = np.random.default_rng(seed)
+    parts = MIX_RATIO if pos_mode == "mix_adj" else ((pos_mode, N),)
+
+    fresh = {}
+    for pos, n in parts:
+        sp = word_sampler(k, pos, qtype, stats, blocked, now)
+        rows = [word_sampler_draw(sp, rng, n) for _ in range(count)]
+        width = min(r.size for r in rows)
+        fresh[pos] = np.stack([r[:width] for r in rows])
+    return fresh
+
+def update_word_stats_local(qtype: str, quiz: list, answers: list, now: float | None = None):
+    """제출 결과를 세션 통계/샘플러 가중치에 바로 반영 (서버 재조회 없음)"""
+    stats = word_stats(qtype)
+    if stats is None:
+        return
+    now = time.time() if now is None else now
+
+    touched = []
+    for q, picked in zip(quiz, answers):
+        wid = q.get("word_id")
+        if wid is None:
+            continue
+        wid = int(wid)
+        stats["seen"][wid] += 1
+        if picked != q["correct_text"]:
+            stats["wrong"][wid] += 1
+            stats["last_wrong"][wid] = now
+        touched.append(wid)
+    if not touched:
+        return
+
+    touched = np.asarray(touched, dtype=np.int32)
+    for (k, _pos), sp in (st.session_state.get("_word_sampler") or {}).items():
+        if not k.endswith(f"|{qtype}"):
+            continue
+        local = np.searchsorted(sp["pool"], touched)
+        hit = (local < sp["pool"].size) & (sp["pool"][np.minimum(local, sp["pool"].size - 1)] == touched)
+        for i, wid in zip(local[hit], touched[hit]):
+            new_base = float(word_weights(stats, np.array([wid]), now)[0])
+            sp["base"][i] = new_base
+            if not sp["blocked"][i]:
+                fenwick_add(sp["tree"], int(i), new_base - float(sp["w"][i]))
+                sp["w"][i] = new_base
 
 # ============================================================
 # ✅ mastered_words를 유형별로 유지하는 유틸
@@ -527,11 +1456,8 @@ def ensure_mastered_words_shape():
     if "mastered_words" not in st.session_state or not isinstance(st.session_state.mastered_words, dict):
         st.session_state.mastered_words = {}
 
-    # ✅ 조합키(품사|유형) 기준으로 보장
-    types = QUIZ_TYPES_ADMIN if is_admin() else QUIZ_TYPES_USER
-    for qt in types:
-        k = mastery_key(qtype=qt, pos_mode=st.session_state.get("pos_mode", "i_adj"))
-        st.session_state.mastered_words.setdefault(k, set())
+    # ✅ 지금 쓰는 조합키(품사|유형)만 보장 (나머지는 처음 쓸 때 불러옴)
+    word_bitset("mastered_words", mastery_key())
 
 def ensure_mastery_banner_shape():
     if "mastery_banner_shown" not in st.session_state or not isinstance(st.session_state.mastery_banner_shown, dict):
@@ -543,16 +1469,10 @@ def ensure_mastery_banner_shape():
     types = QUIZ_TYPES_ADMIN if is_admin() else QUIZ_TYPES_USER
     for pm in POS_MODES:
         for qt in types:
-            k = f"{pm}|{qt}"
+            k = mastery_key(qtype=qt, pos_mode=pm)
             st.session_state.mastery_banner_shown.setdefault(k, False)
             st.session_state.mastery_done.setdefault(k, False)
 
-    if "mastered_words" not in st.session_state or not isinstance(st.session_state.mastered_words, dict):
-        st.session_state.mastered_words = {}
-    for pm in POS_MODES:
-        for qt in types:
-            st.session_state.mastered_words.setdefault(f"{pm}|{qt}", set())
-
 # ============================================================
 # ✅ (추가) 틀린 단어를 랜덤 출제에서 제외하는 세트 유지
 #    - 정답으로 맞히면 제외 해제(다시 랜덤에 포함)
@@ -561,23 +1481,34 @@ def ensure_excluded_wrong_words_shape():
     if "excluded_wrong_words" not in st.session_state or not isinstance(st.session_state.excluded_wrong_words, dict):
         st.session_state.excluded_wrong_words = {}
 
-    types = QUIZ_TYPES_ADMIN if is_admin() else QUIZ_TYPES_USER
-    for qt in types:
-        k = mastery_key(qtype=qt, pos_mode=st.session_state.get("pos_mode", "i_adj"))
-        st.session_state.excluded_wrong_words.setdefault(k, set())
+    word_bitset("excluded_wrong_words", mastery_key())
 
 # ============================================================
 # ✅ (중요) 위젯 잔상(q_...) 완전 제거 유틸
+#    - 문항 위젯 키는 question_widget_key()로만 만들고 "_widget_keys"에 quiz_version별로 기록
+#      → 지울 때 session_state 전체를 훑지 않고 기록된 키(= 문항 수)만 지움
+#    - quiz_version이 바뀐 뒤 처음 키를 만들 때 이전 버전 키는 자동 정리 (긴 세션에서도 안 쌓임)
 # ============================================================
+def question_widget_key(idx: int) -> str:
+    qv = int(st.session_state.get("quiz_version", 0) or 0)
+    reg = st.session_state.get("_widget_keys")
+    if not isinstance(reg, dict) or reg.get("version") != qv:
+        clear_question_widget_keys()
+        reg = st.session_state["_widget_keys"] = {"version": qv, "keys": set()}
+    key = f"q_{qv}_{idx}"
+    reg["keys"].add(key)
+    return key
+
 def clear_question_widget_keys():
-    keys_to_del = [k for k in list(st.session_state.keys()) if isinstance(k, str) and k.startswith("q_")]
-    for k in keys_to_del:
+    reg = st.session_state.pop("_widget_keys", None)
+    if not isinstance(reg, dict):
+        return
+    for k in reg.get("keys", ()):
         st.session_state.pop(k, None)
 # ============================================================
 # ✅ (핵심) 위젯 값 기준으로 answers를 재구성 (보이는 것 = 채점)
 # ============================================================
 def sync_answers_from_widgets():
-    qv = st.session_state.get("quiz_version", 0)
     quiz = st.session_state.get("quiz", [])
     if not isinstance(quiz, list):
         return
@@ -587,7 +1518,7 @@ def sync_answers_from_widgets():
         st.session_state.answers = [None] * len(quiz)
 
     for idx in range(len(quiz)):
-        widget_key = f"q_{qv}_{idx}"
+        widget_key = question_widget_key(idx)
         if widget_key in st.session_state:
             st.session_state.answers[idx] = st.session_state[widget_key]
 
@@ -603,16 +1534,12 @@ def mark_progress_dirty():
     if (sb_authed_local is None) or (u is None):
         return
 
-    # ✅ 너무 자주 저장하지 않게 1.0초 쿨다운(원하면 0.3~2초로 조절)
-    now = time.time()
-    last = st.session_state.get("_last_progress_save_ts", 0.0)
-    if now - last < 10.0:
-        return
-
+    # ✅ 네트워크 대기 없이 write-behind 큐에만 넣음 (연속 클릭은 1번의 쓰기로 합쳐짐)
     try:
-        save_progress_to_db(sb_authed_local, u.id)
-        st.session_state._last_progress_save_ts = now
-        st.session_state.progress_dirty = False
+        payload = build_progress_payload()
+        if payload is not None:
+            enqueue_progress_save(sb_authed_local, u.id, payload)
+            st.session_state.progress_dirty = False
     except Exception:
         # 저장 실패해도 앱 흐름은 유지
         pass
@@ -635,20 +1562,124 @@ def start_quiz_state(quiz_list: list, qtype: str, clear_wrongs: bool = True):
 
 
     st.session_state.submitted = False
-    st.session_state.saved_this_attempt = False
-    st.session_state.stats_saved_this_attempt = False
+    st.session_state.attempt_id = None
+    st.session_state.attempt_result = None
     st.session_state.session_stats_applied_this_attempt = False
 
     if clear_wrongs:
         st.session_state.wrong_list = []
 
+    # ✅ 푸는 동안 다음 퀴즈를 미리 만들어 둠
+    if quiz_list:
+        schedule_quiz_prefetch(qtype)
+
 # ============================================================
 # ✅ 유틸: JWT 만료 감지 + 세션 갱신 + DB 호출 래퍼
+#    - access_token의 exp를 로컬에서 읽어서 만료 TOKEN_REFRESH_MARGIN_SEC 전에 미리 갱신
+#    - 갱신은 refresh_token 단위 single-flight: 같은 토큰으로 동시에 들어오면 1번만 호출하고 결과 공유
+#      (refresh_token은 한 번 쓰면 바뀌므로 두 번째 호출은 실패함 → 결과를 잠깐 보관해서 같이 씀)
+#    - 그래도 DB가 만료라고 하면 run_db가 토큰만 바꿔서 그 자리에서 1번 더 (rerun X)
 # ============================================================
+TOKEN_REFRESH_MARGIN_SEC = 120
+TOKEN_REFRESH_REUSE_SEC = 30.0     # 같은 refresh_token의 갱신 결과(실패 포함)를 다시 쓰는 시간
+TOKEN_REFRESH_WAIT_SEC = 15.0
+
 def is_jwt_expired_error(e: Exception) -> bool:
     msg = str(e).lower()
     return ("jwt expired" in msg) or ("pgrst303" in msg)
 
+def jwt_exp(token: str | None) -> float | None:
+    """JWT payload의 exp (서명 검증 X — 갱신 시점 판단용)"""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+@st.cache_resource(show_spinner=False)
+def _token_refresher() -> dict:
+    return {
+        "lock": threading.Lock(),
+        "flights": {},          # sha256(refresh_token) -> {"event", "session"} (진행 중)
+        "done": OrderedDict(),  # sha256(refresh_token) -> (monotonic, session | None) (최근 결과)
+        "stats": {"proactive": 0, "refreshed": 0, "shared": 0, "failed": 0, "retried": 0},
+    }
+
+def refresh_session_single_flight(rt: str, reuse_failure: bool = True):
+    """sb.auth.refresh_session(rt) (성공하면 응답, 실패하면 None)
+
+    reuse_failure=False: 최근 실패 결과는 쓰지 않고 다시 호출 (DB가 만료라고 한 경우 — 일시적 실패로 로그아웃 X)
+    """
+    tr = _token_refresher()
+    key = hashlib.sha256(rt.encode("utf-8")).hexdigest()
+    with tr["lock"]:
+        now = time.monotonic()
+        while tr["done"] and next(iter(tr["done"].values()))[0] < now - TOKEN_REFRESH_REUSE_SEC:
+            tr["done"].popitem(last=False)
+        if key in tr["done"] and (reuse_failure or tr["done"][key][1] is not None):
+            tr["stats"]["shared"] += 1
+            return tr["done"][key][1]
+        flight = tr["flights"].get(key)
+        leader = flight is None
+        if leader:
+            flight = tr["flights"][key] = {"event": threading.Event(), "session": None}
+        else:
+            tr["stats"]["shared"] += 1
+
+    if not leader:
+        flight["event"].wait(timeout=TOKEN_REFRESH_WAIT_SEC)
+        return flight["session"]
+
+    refreshed = None
+    try:
+        res = sb.auth.refresh_session(rt)
+        if res and res.session and res.session.access_token:
+            refreshed = res
+    except Exception:
+        pass
+    finally:
+        with tr["lock"]:
+            flight["session"] = refreshed
+            tr["flights"].pop(key, None)
+            tr["done"][key] = (time.monotonic(), refreshed)
+            tr["stats"]["refreshed" if refreshed is not None else "failed"] += 1
+        flight["event"].set()
+    return refreshed
+
+def _apply_refreshed_session(refreshed):
+    st.session_state.user = refreshed.user
+    st.session_state.access_token = refreshed.session.access_token
+    st.session_state.refresh_token = refreshed.session.refresh_token
+
+    u_email = getattr(refreshed.user, "email", None)
+    if u_email:
+        st.session_state["login_email"] = u_email.strip()
+
+    cookies["access_token"] = refreshed.session.access_token
+    cookies["refresh_token"] = refreshed.session.refresh_token
+    cookies.save()
+
+def ensure_fresh_token(force: bool = False) -> bool:
+    """만료가 가까우면(force면 무조건) 갱신. 지금 쓸 수 있는 토큰이 있으면 True"""
+    token = st.session_state.get("access_token")
+    exp = jwt_exp(token)
+    if not force and token and (exp is None or exp - time.time() > TOKEN_REFRESH_MARGIN_SEC):
+        return True
+
+    rt = st.session_state.get("refresh_token") or cookies.get("refresh_token")
+    refreshed = refresh_session_single_flight(rt, reuse_failure=not force) if rt else None
+    if refreshed is None:
+        # 아직 안 만료됐으면 지금 토큰으로 계속 (실패 결과는 TOKEN_REFRESH_REUSE_SEC 뒤에 다시 시도)
+        return bool(token) and not force and (exp or 0) > time.time()
+
+    if not force:
+        tr = _token_refresher()
+        with tr["lock"]:
+            tr["stats"]["proactive"] += 1
+    _apply_refreshed_session(refreshed)
+    return True
+
 def clear_auth_everywhere():
     try:
         cookies["access_token"] = ""
@@ -663,15 +1694,17 @@ def clear_auth_everywhere():
         "auth_mode", "signup_done", "last_signup_ts",
         "page",
         "quiz", "answers", "submitted", "wrong_list",
-        "quiz_version", "quiz_type",
-        "saved_this_attempt", "stats_saved_this_attempt",
+        "quiz_version", "quiz_type", "level",
+        "attempt_id", "attempt_result",
         "history", "wrong_counter", "total_counter",
-        "attendance_checked", "streak_count", "did_attend_today",
+        "_bootstrap_key", "_bootstrap_att", "streak_count", "did_attend_today",
         "is_admin_cached",
         "session_stats_applied_this_attempt",
-        "mastered_words",
-        "progress_restored", "pool_ready",
-        "_sb_authed", "_sb_authed_token",
+        "mastered_words", "excluded_wrong_words", "_bitsets_loaded",
+        "srs", "_word_stats", "_word_sampler",
+        "progress_restored", "_vocab_pin",
+        "_sb_authed", "_sb_authed_token", "_auth_restore_failed",
+        "_quiz_prefetch", "_admin_explorer", "_admin_cube",
     ]:
         st.session_state.pop(k, None)
 
@@ -679,14 +1712,22 @@ def run_db(callable_fn):
     try:
         return callable_fn()
     except Exception as e:
-        if is_jwt_expired_error(e):
-            ok = refresh_session_from_cookie_if_needed(force=True)
-            if ok:
-                st.rerun()
-            clear_auth_everywhere()
-            st.warning("세션이 만료되었습니다. 다시 로그인해 주세요.")
-            st.rerun()
-        raise
+        if not is_jwt_expired_error(e):
+            raise
+        # ✅ 토큰만 새로 받아 세션 클라이언트의 Bearer를 바꾸고 그 자리에서 1번 더 (스크립트 전체 rerun X)
+        #    (호출부는 모두 get_authed_sb()가 준 세션 클라이언트를 쓰므로 같은 객체에 새 토큰이 들어감)
+        if ensure_fresh_token(force=True) and get_authed_sb() is not None:
+            tr = _token_refresher()
+            with tr["lock"]:
+                tr["stats"]["retried"] += 1
+            try:
+                return callable_fn()
+            except Exception as e2:
+                if not is_jwt_expired_error(e2):
+                    raise
+        clear_auth_everywhere()
+        st.warning("세션이 만료되었습니다. 다시 로그인해 주세요.")
+        st.rerun()
 # ============================================================
 # ✅✅✅ (로그인 유지/새로고침 복원) 최소 수정 핵심
 #   1) refresh_token으로 refresh_session 시도
@@ -700,23 +1741,10 @@ def refresh_session_from_cookie_if_needed(force: bool = False) -> bool:
     at = cookies.get("access_token")
 
     if rt:
-        try:
-            refreshed = sb.auth.refresh_session(rt)
-            if refreshed and refreshed.session and refreshed.session.access_token:
-                st.session_state.user = refreshed.user
-                st.session_state.access_token = refreshed.session.access_token
-                st.session_state.refresh_token = refreshed.session.refresh_token
-
-                u_email = getattr(refreshed.user, "email", None)
-                if u_email:
-                    st.session_state["login_email"] = u_email.strip()
-
-                cookies["access_token"] = refreshed.session.access_token
-                cookies["refresh_token"] = refreshed.session.refresh_token
-                cookies.save()
-                return True
-        except Exception:
-            pass
+        refreshed = refresh_session_single_flight(rt)
+        if refreshed is not None:
+            _apply_refreshed_session(refreshed)
+            return True
 
     if at:
         try:
@@ -740,7 +1768,13 @@ def refresh_session_from_cookie_if_needed(force: bool = False) -> bool:
 
 def get_authed_sb():
     if not st.session_state.get("access_token"):
-        refresh_session_from_cookie_if_needed(force=True)
+        # 쿠키 복원은 같은 쿠키로 한 번만 (실패한 쿠키로 호출마다 다시 시도하지 않음)
+        creds = (cookies.get("refresh_token") or "", cookies.get("access_token") or "")
+        if any(creds) and st.session_state.get("_auth_restore_failed") != creds:
+            if not refresh_session_from_cookie_if_needed(force=True):
+                st.session_state["_auth_restore_failed"] = creds
+    else:
+        ensure_fresh_token()
 
     token = st.session_state.get("access_token")
     if not token:
@@ -752,8 +1786,20 @@ def get_authed_sb():
     if cached is not None and cached_token == token:
         return cached
 
-    sb2 = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-    sb2.postgrest.auth(token)
+    # ✅ 새 토큰 → outbox에서 토큰을 기다리는 제출도 이 토큰으로 다시 보냄
+    u = st.session_state.get("user")
+    if u is not None:
+        try:
+            outbox_refresh_token(u.id, token)
+        except Exception:
+            pass
+
+    # ✅ 토큰만 바뀌었으면 기존 클라이언트의 Bearer만 교체 (새 커넥션 풀 생성 X)
+    if cached is not None:
+        cached.auth(token)
+        sb2 = cached
+    else:
+        sb2 = new_rest_client(token)
 
     st.session_state["_sb_authed"] = sb2
     st.session_state["_sb_authed_token"] = token
@@ -772,61 +1818,766 @@ def to_kst_naive(x):
 # ============================================================
 
 def delete_all_learning_records(sb_authed, user_id):
+    discard_pending_writes(user_id)
+    outbox_discard_user(user_id)
     sb_authed.table("quiz_attempts").delete().eq("user_id", user_id).execute()
+    sb_authed.table("user_word_agg").delete().eq("user_id", user_id).execute()
+    sb_authed.table("user_word_bitsets").delete().eq("user_id", user_id).execute()
     clear_progress_in_db(sb_authed, user_id)
   
-def ensure_profile(sb_authed, user):
+def ensure_profile(sb_authed, user) -> bool:
     try:
         sb_authed.table("profiles").upsert(
             {"id": user.id, "email": getattr(user, "email", None)},
             on_conflict="id",
         ).execute()
+        return True
     except Exception:
-        pass
-
-def mark_attendance_once(sb_authed):
-    if st.session_state.get("attendance_checked"):
-        return None
+        return False
 
+def mark_attendance(sb_authed):
     try:
         res = sb_authed.rpc("mark_attendance_kst", {}).execute()
-        st.session_state.attendance_checked = True
         return res.data[0] if res.data else None
     except Exception:
-        st.session_state.attendance_checked = True
         return None
 
-def save_attempt_to_db(sb_authed, user_id, user_email, level, quiz_type, quiz_len, score, wrong_list):
-    payload = {
-        "user_id": user_id,
+# ============================================================
+# ✅ 세션 부트스트랩: 프로필 upsert + 출석 RPC는 (user_id, KST 날짜)당 1번만
+#    - 프로세스 전체 메모(로그아웃/재로그인/새 탭이어도 같은 날이면 다시 쓰지 않음)
+#    - 생략한 쓰기 횟수는 skipped에 기록 (관리자 대시보드에서 확인)
+#    - 둘 다 성공했을 때만 메모 (실패하면 다음 rerun/세션이 다시 시도, 기다리던 탭도 직접 재시도)
+# ============================================================
+def kst_today() -> str:
+    return pd.Timestamp.now(tz=KST_TZ).date().isoformat()
+
+@st.cache_resource(show_spinner=False)
+def _bootstrap_registry() -> dict:
+    return {
+        "lock": threading.Lock(),
+        "day": None,
+        "done": {},        # user_id -> 출석 결과(dict|None)
+        "inflight": {},    # user_id -> threading.Event
+        "skipped": {"ensure_profile": 0, "mark_attendance": 0},
+    }
+
+def _bootstrap_skip(reg: dict, *kinds: str):
+    with reg["lock"]:
+        for kind in kinds:
+            reg["skipped"][kind] += 1
+
+def bootstrap_session_once(sb_authed, user):
+    reg = _bootstrap_registry()
+    day = kst_today()
+    boot_key = f"{user.id}|{day}"
+
+    # ✅ 이 세션에서 이미 끝났으면 네트워크/락 없이 통과 (rerun마다 하던 upsert 생략)
+    if st.session_state.get("_bootstrap_key") == boot_key:
+        _bootstrap_skip(reg, "ensure_profile")
+        return st.session_state.get("_bootstrap_att")
+
+    for _ in range(2):
+        with reg["lock"]:
+            if reg["day"] != day:  # 날짜가 바뀌면 전날 메모는 버림
+                reg["day"] = day
+                reg["done"] = {}
+            if user.id in reg["done"]:
+                att = reg["done"][user.id]
+                break
+            ev = reg["inflight"].get(user.id)
+            owner = ev is None
+            if owner:
+                ev = reg["inflight"][user.id] = threading.Event()
+
+        if not owner:
+            ev.wait(timeout=10)  # 같은 유저의 다른 탭이 처리 중이면 결과를 기다림
+            with reg["lock"]:
+                done = user.id in reg["done"]
+                att = reg["done"].get(user.id)
+            if done:
+                break
+            continue  # 그 탭이 실패 → 이번엔 직접 시도
+
+        ok, att = False, None
+        try:
+            ok = ensure_profile(sb_authed, user)
+            att = mark_attendance(sb_authed)
+            ok = ok and att is not None
+            if ok:
+                with reg["lock"]:
+                    reg["done"][user.id] = att
+        finally:
+            with reg["lock"]:
+                reg["inflight"].pop(user.id, None)
+            ev.set()
+        if not ok:
+            return att  # 메모/세션 키를 남기지 않음 → 다음에 다시 시도
+        st.session_state["_bootstrap_key"] = boot_key
+        st.session_state["_bootstrap_att"] = att
+        return att
+    else:
+        return None  # 다른 탭이 계속 처리 중/실패 → 다음 rerun에서 다시
+
+    _bootstrap_skip(reg, "ensure_profile", "mark_attendance")
+    st.session_state["_bootstrap_key"] = boot_key
+    st.session_state["_bootstrap_att"] = att
+    return att
+
+# ============================================================
+# ✅ 제출 = submit_attempt RPC 1번 (기록 insert + 단어 통계가 한 트랜잭션)
+#    - attempt_id는 제출 버튼을 누를 때 클라이언트가 만듦 (progress에도 저장)
+#      → rerun/재시도/복원 후 다시 불러도 서버에서 한 번만 반영
+#    - 반환값 = {"attempt_id", "duplicate", "recent": 최근 10회 집계}
+#      (연속 출석은 bootstrap_session_once가 받아 둔 값 → 제출마다 출석을 다시 쓰지 않음)
+# ============================================================
+def new_attempt_id() -> str:
+    return str(uuid.uuid4())
+
+def build_attempt_payload(attempt_id, user_email, level, quiz_type, quiz_len, score, wrong_list, pos_mode=None) -> dict:
+    return {
+        "attempt_id": str(attempt_id),
         "user_email": user_email,
         "level": level,
-        "pos_mode": quiz_type,
+        "pos_mode": pos_mode,
+        "quiz_type": quiz_type,
         "quiz_len": int(quiz_len),
         "score": int(score),
         "wrong_count": int(len(wrong_list)),
         "wrong_list": wrong_list,
     }
-    sb_authed.table("quiz_attempts").insert(payload).execute()
+
+def submit_attempt_to_db(sb_authed, attempt: dict, items: list[dict]) -> dict:
+    res = sb_authed.rpc("submit_attempt", {"p_attempt": attempt, "p_items": items}).execute()
+    return res.data or {}
+
+# ============================================================
+# ✅ 제출 outbox (앱 서버 로컬 SQLite → DB가 느리거나 죽어 있어도 제출은 유실되지 않음)
+#    - 제출은 먼저 outbox에 1행(attempt_id가 키 → 같은 제출은 몇 번 넣어도 1행)
+#    - 백그라운드 워커가 OUTBOX_BATCH개씩 꺼내 submit_attempt 호출 (유저 간 병렬)
+#    - 일시적인 오류(네트워크/5xx/DB 연결·잠금)만 지수 백오프(+지터)로 재시도,
+#      입력/권한/스키마 오류(4xx·22xxx·23xxx·42xxx 등)는 다시 보내도 같으므로 바로 'failed'
+#      → 제출 화면에 실패 + "다시 저장" 버튼 (outbox_retry)
+#    - 프로세스가 재시작돼도 파일에 남은 행부터 이어서
+#    - 토큰은 파일에 남기지 않음: 유저별 최신 access_token을 메모리(ob["tokens"])에만 두고 보낼 때 찾음
+#      · 없거나 만료됐으면 'need_token' → 그 유저의 세션이 새 토큰을 받으면(get_authed_sb)
+#        outbox_refresh_token으로 메모리에 넣고 다시 'pending'
+#      · 재시작 직후엔 모든 행이 토큰 대기 → 유저가 다시 들어오면 이어서 보냄
+#    - 끝난 행은 결과(JSON)만 OUTBOX_DONE_TTL_SEC 동안 남김 (세션이 가져감)
+#    - 제출 화면은 기다리지 않음: 넣고 바로 다음으로, 저장 상태는 render_submit_status 조각이
+#      OUTBOX_STATUS_POLL_SEC마다 확인 (대기/실패 + "다시 저장"은 모든 유저에게)
+#    - SQLite 연결은 프로세스에 1개 (db_lock) — 세션 스레드마다 새로 열지 않음
+#    - OUTBOX_FLUSH_WINDOW_SEC 동안(또는 OUTBOX_BATCH개까지) 모든 유저의 제출을 모아서
+#      submit_attempts_batch 1번 = DB 트랜잭션 1번 (반 전체가 한꺼번에 제출해도 1번)
+#      · 유저 귀속은 서버가 확인: 유저마다 자기 토큰으로 받은 제출 티켓(issue_submit_ticket)을
+#        같이 보냄 (service_role 키 없음, 티켓은 메모리에만, 서버에는 해시만)
+#      · 단어 결과는 (유저, 단어, 유형, 정답여부)로 미리 합쳐서 개수(n)로 → DB가 seen/wrong에 그대로 더함
+#      · 티켓을 못 받은 유저, 재시도가 섞인 유저('retry'), 배치 호출 실패 → 그 행만 submit_attempt로 1건씩
+# ============================================================
+SUBMIT_OUTBOX_PATH = BASE_DIR / ".outbox" / "submit_outbox.sqlite3"
+OUTBOX_BATCH = 50
+OUTBOX_WORKERS = 4
+OUTBOX_POLL_SEC = 1.0
+OUTBOX_BACKOFF_BASE_SEC = 2.0
+OUTBOX_BACKOFF_MAX_SEC = 300.0
+OUTBOX_MAX_TRIES = 50              # 일시적 오류도 이만큼 넘으면 'failed'로 두고 재시도 중단 (행은 파일에 남음)
+# 재시도할 SQLSTATE 클래스: 연결(08) / 직렬화·데드락(40) / 자원 부족(53) / 잠금(55) / 운영자 개입(57) / 시스템(58)
+OUTBOX_RETRY_SQLSTATE = ("08", "40", "53", "55", "57", "58")
+OUTBOX_DONE_TTL_SEC = 600.0
+OUTBOX_STATUS_POLL_SEC = 1.0       # 제출 화면이 저장 상태를 다시 확인하는 주기 (화면 조각만 다시 그림)
+OUTBOX_TICKET_MARGIN_SEC = 600.0   # 제출 티켓이 이만큼 안 남았으면 새로 발급
+OUTBOX_FLUSH_WINDOW_SEC = 0.25     # 첫 제출 후 이만큼 더 모았다가 보냄 (OUTBOX_BATCH개 차면 바로)
+
+_OUTBOX_SCHEMA = """
+create table if not exists submit_outbox (
+  attempt_id  text primary key,
+  user_id     text not null,
+  attempt     text not null,
+  items       text not null,
+  status      text not null default 'pending',
+  tries       integer not null default 0,
+  next_try_at real not null,
+  created_at  real not null,
+  updated_at  real not null,
+  last_error  text,
+  result      text
+);
+create index if not exists submit_outbox_due_idx on submit_outbox (status, next_try_at);
+create index if not exists submit_outbox_user_idx on submit_outbox (user_id, status);
+"""
+
+def _outbox_connect(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=10.0, isolation_level=None, check_same_thread=False)
+    conn.execute("pragma journal_mode=wal")
+    conn.execute("pragma synchronous=full")  # 커밋 = 디스크 반영
+    conn.executescript(_OUTBOX_SCHEMA)
+    try:
+        os.chmod(path, 0o600)  # 유저별 제출 내용
+    except OSError:
+        pass
+    return conn
+
+@st.cache_resource(show_spinner=False)
+def _submit_outbox() -> dict:
+    ob = {
+        "path": SUBMIT_OUTBOX_PATH,
+        "conn": _outbox_connect(SUBMIT_OUTBOX_PATH),  # 프로세스 전체가 연결 1개 (스키마/pragma도 여기서 1번)
+        "db_lock": threading.Lock(),         # conn을 쓰는 동안 (SQLite 호출은 짧음 → 네트워크 대기 중엔 잡지 않음)
+        "wake": threading.Event(),
+        "lock": threading.Lock(),
+        "full": threading.Event(),           # OUTBOX_BATCH개가 쌓이면 창을 기다리지 않고 바로
+        "unsent": 0,
+        "tokens": {},                        # user_id -> 최신 access_token (메모리에만)
+        "tickets": {},                       # user_id -> (제출 티켓, 만료 epoch) (메모리에만)
+        "stats": {"queued": 0, "dedup": 0, "sent": 0, "duplicate": 0, "retried": 0, "need_token": 0, "failed": 0, "batches": 0},
+        "flush": {
+            "n": 0, "rows": 0, "rows_max": 0, "users": 0, "items": 0, "groups": 0,
+            "ms_total": 0.0, "ms_max": 0.0, "fallbacks": 0, "tickets": 0,
+        },
+        "transport": _shared_http_transport(),
+        "anon": new_rest_client(SUPABASE_ANON_KEY, _shared_http_transport()),  # 배치 전용 (유저 토큰 없음, 티켓으로 확인)
+        "history": _attempt_history_cache(),
+        "pool": ThreadPoolExecutor(max_workers=OUTBOX_WORKERS, thread_name_prefix="submit_outbox_send"),
+    }
+    t = threading.Thread(target=_outbox_drainer_loop, args=(ob,), name="submit_outbox", daemon=True)
+    t.start()
+    return ob
+
+def _outbox_exec(ob: dict, sql: str, params: tuple = ()) -> tuple[list, int]:
+    """공유 연결로 1문장 실행 → (가져온 행, 바뀐 행 수)"""
+    with ob["db_lock"]:
+        cur = ob["conn"].execute(sql, params)
+        return cur.fetchall(), cur.rowcount
+
+def _outbox_backoff(tries: int) -> float:
+    return min(OUTBOX_BACKOFF_MAX_SEC, OUTBOX_BACKOFF_BASE_SEC * (2 ** min(tries, 16))) * random.uniform(0.5, 1.0)
+
+def _outbox_token(ob: dict, user_id: str) -> str | None:
+    """이 유저의 최신 access_token (없거나 만료됐으면 None, 만료된 건 메모리에서도 버림)"""
+    with ob["lock"]:
+        token = ob["tokens"].get(user_id)
+        exp = jwt_exp(token)
+        if token is not None and exp is not None and exp <= time.time():
+            ob["tokens"].pop(user_id, None)
+            return None
+        return token
+
+def _outbox_retryable(e: Exception) -> bool:
+    """다시 보내면 될 수도 있는 오류인지 (입력/권한/스키마 문제는 몇 번을 보내도 같음)"""
+    if isinstance(e, httpx.TransportError):
+        return True
+    code = str(getattr(e, "code", None) or "")
+    if not code:
+        return True  # 모르는 오류 → 재시도 쪽으로
+    if code.isdigit() and len(code) == 3:  # JSON이 아닌 응답 → HTTP 상태 코드
+        return code in ("408", "429") or code.startswith("5")
+    if code.startswith("PGRST"):
+        return code.startswith("PGRST0")  # PGRST0xx = DB 연결/스키마 캐시 로딩
+    return code[:2] in OUTBOX_RETRY_SQLSTATE
+
+def _outbox_send(ob: dict, row: tuple) -> tuple:
+    """행 1개 전송 → (kind, (update SQL, params))"""
+    attempt_id, user_id, attempt, items, tries = row
+    now = time.time()
+    token = _outbox_token(ob, user_id)
+    if token is None:
+        return "need_token", (
+            "update submit_outbox set status = 'need_token', updated_at = ? where attempt_id = ? and status = 'pending'",
+            (now, attempt_id),
+        )
+    try:
+        client = new_rest_client(token, ob["transport"])
+        res = client.rpc("submit_attempt", {"p_attempt": json.loads(attempt), "p_items": json.loads(items)}).execute()
+    except Exception as e:
+        err = str(e)[:500]
+        if is_jwt_expired_error(e) or str(getattr(e, "code", "")).startswith("PGRST3"):
+            with ob["lock"]:
+                if ob["tokens"].get(user_id) == token:
+                    ob["tokens"].pop(user_id, None)
+            return "need_token", (
+                "update submit_outbox set status = 'need_token', tries = tries + 1, last_error = ?, updated_at = ? "
+                "where attempt_id = ?",
+                (err, now, attempt_id),
+            )
+        if not _outbox_retryable(e) or tries + 1 >= OUTBOX_MAX_TRIES:
+            return "failed", (
+                "update submit_outbox set status = 'failed', tries = tries + 1, last_error = ?, updated_at = ? where attempt_id = ?",
+                (err, now, attempt_id),
+            )
+        return "retried", (
+            "update submit_outbox set tries = tries + 1, next_try_at = ?, last_error = ?, updated_at = ? where attempt_id = ?",
+            (now + _outbox_backoff(tries), err, now, attempt_id),
+        )
+
+    return _outbox_done(ob, attempt_id, user_id, res.data or {})
+
+def _outbox_done(ob: dict, attempt_id: str, user_id: str, result: dict) -> tuple:
+    invalidate_attempt_history(user_id, ob["history"])
+    return ("duplicate" if result.get("duplicate") else "sent"), (
+        "update submit_outbox set status = 'done', tries = tries + 1, result = ?, last_error = null, "
+        "updated_at = ? where attempt_id = ?",
+        (json.dumps(result, ensure_ascii=False), time.time(), attempt_id),
+    )
+
+def _outbox_ticket(ob: dict, user_id: str) -> str | None:
+    """이 유저의 제출 티켓 (없거나 곧 만료면 유저 토큰으로 새로 발급, 토큰도 없으면 None)"""
+    now = time.time()
+    with ob["lock"]:
+        ticket, exp = ob["tickets"].get(user_id, (None, 0.0))
+    if ticket is not None and exp - now > OUTBOX_TICKET_MARGIN_SEC:
+        return ticket
+
+    token = _outbox_token(ob, user_id)
+    if token is None:
+        return None
+    try:
+        res = new_rest_client(token, ob["transport"]).rpc("issue_submit_ticket", {}).execute()
+        data = res.data or {}
+        ticket = data["ticket"]
+        exp = datetime.fromisoformat(data["expires_at"]).timestamp()
+    except Exception:
+        return None  # 이번엔 이 유저만 submit_attempt로 1건씩 (토큰 만료면 거기서 need_token)
+    with ob["lock"]:
+        ob["tickets"][user_id] = (ticket, exp)
+        ob["flush"]["tickets"] += 1
+    return ticket
+
+def _outbox_send_batch(ob: dict, rows: list, tickets: dict) -> list:
+    """여러 유저의 행을 submit_attempts_batch 1번으로 (티켓으로 유저 확인) → 행마다 (kind, update)"""
+    rows_out, groups, levels, n_items = [], Counter(), {}, 0
+    for _attempt_id, user_id, attempt, items, _tries in rows:
+        rows_out.append({"user_id": user_id, "attempt": json.loads(attempt)})
+        for it in json.loads(items):
+            n_items += 1
+            key = (user_id, it.get("word_key"), it.get("quiz_type"), bool(it.get("is_correct")))
+            groups[key] += 1
+            levels.setdefault(key, (it.get("level"), it.get("pos")))
+    users = [{"user_id": u, "ticket": tickets[u]} for u in {r["user_id"] for r in rows_out}]
+    words = [
+        {
+            "user_id": u, "word_key": k, "level": levels[(u, k, qt, ok)][0], "pos": levels[(u, k, qt, ok)][1],
+            "quiz_type": qt, "is_correct": ok, "n": n,
+        }
+        for (u, k, qt, ok), n in groups.items()
+    ]
+
+    t0 = time.perf_counter()
+    res = ob["anon"].rpc("submit_attempts_batch", {"p_users": users, "p_rows": rows_out, "p_words": words}).execute()
+    ms = (time.perf_counter() - t0) * 1000.0
+
+    with ob["lock"]:
+        f = ob["flush"]
+        f["n"] += 1
+        f["rows"] += len(rows)
+        f["rows_max"] = max(f["rows_max"], len(rows))
+        f["users"] += len(users)
+        f["items"] += n_items
+        f["groups"] += len(words)
+        f["ms_total"] += ms
+        f["ms_max"] = max(f["ms_max"], ms)
+
+    results = {str(r.get("attempt_id")): r for r in (res.data or []) if isinstance(r, dict)}
+    outcomes, leftover = {}, []
+    for row in rows:
+        r = results.get(row[0]) or {}
+        if r.get("status") == "done":
+            outcomes[row[0]] = _outbox_done(ob, row[0], row[1], {k: r.get(k) for k in ("attempt_id", "duplicate", "recent")})
+            continue
+        if r.get("status") == "ticket":  # 만료/폐기된 티켓 → 다음 배치 전에 새로 발급
+            with ob["lock"]:
+                if ob["tickets"].get(row[1], (None,))[0] == tickets[row[1]]:
+                    ob["tickets"].pop(row[1], None)
+        leftover.append(row)
+    for row, outcome in zip(leftover, ob["pool"].map(lambda r: _outbox_send(ob, r), leftover)):
+        outcomes[row[0]] = outcome
+    return [outcomes[row[0]] for row in rows]
+
+def _outbox_drain_once(ob: dict) -> int:
+    now = time.time()
+    # 토큰 대기 중 새 토큰이 들어온 유저 (보내는 도중 갱신된 경우 등) → 다시 보냄
+    with ob["lock"]:
+        users = list(ob["tokens"])
+    fresh = [u for u in users if _outbox_token(ob, u) is not None]  # 만료된 토큰은 여기서 정리
+    with ob["db_lock"]:
+        db = ob["conn"]
+        db.execute("delete from submit_outbox where status = 'done' and updated_at < ?", (now - OUTBOX_DONE_TTL_SEC,))
+        if fresh:
+            db.execute(
+                "update submit_outbox set status = 'pending', next_try_at = ?, updated_at = ? "
+                "where status = 'need_token' and user_id in (select value from json_each(?))",
+                (now, now, json.dumps(fresh)),
+            )
+        rows = db.execute(
+            "select attempt_id, user_id, attempt, items, tries from submit_outbox "
+            "where status = 'pending' and next_try_at <= ? order by created_at limit ?",
+            (now, OUTBOX_BATCH),
+        ).fetchall()
+    if not rows:
+        return 0
+
+    # ✅ 티켓이 있는 유저의 행은 전부 배치 1번, 티켓을 못 받은 유저만 submit_attempt로 1건씩
+    users = list(dict.fromkeys(row[1] for row in rows))
+    tickets = {u: t for u, t in zip(users, ob["pool"].map(lambda u: _outbox_ticket(ob, u), users)) if t is not None}
+    batch = [row for row in rows if row[1] in tickets]
+    single = [row for row in rows if row[1] not in tickets]
+    try:
+        outcomes = _outbox_send_batch(ob, batch, tickets) if batch else []
+    except Exception:
+        with ob["lock"]:
+            ob["flush"]["fallbacks"] += 1
+        outcomes, single = [], rows
+    outcomes += list(ob["pool"].map(lambda r: _outbox_send(ob, r), single))
+
+    # ✅ 배치 결과는 SQLite 트랜잭션 1번으로 반영
+    with ob["db_lock"]:
+        db = ob["conn"]
+        db.execute("begin immediate")
+        try:
+            for _kind, (sql, params) in outcomes:
+                db.execute(sql, params)
+            db.execute("commit")
+        except Exception:
+            db.execute("rollback")
+            raise
+
+    with ob["lock"]:
+        ob["stats"]["batches"] += 1
+        for kind, _update in outcomes:
+            ob["stats"][kind] += 1
+    return len(rows)
+
+def _outbox_drainer_loop(ob: dict):
+    while True:
+        ob["wake"].wait(timeout=OUTBOX_POLL_SEC)
+        ob["full"].wait(timeout=OUTBOX_FLUSH_WINDOW_SEC)  # 짧게 더 모아서 한 번에
+        ob["full"].clear()
+        ob["wake"].clear()
+        with ob["lock"]:
+            ob["unsent"] = 0
+        try:
+            while _outbox_drain_once(ob) >= OUTBOX_BATCH:
+                pass
+        except Exception:
+            time.sleep(OUTBOX_POLL_SEC)  # SQLite 잠김/디스크 문제 등 → 다음 주기에 다시
+
+def outbox_put(user_id: str, token: str, attempt: dict, items: list[dict]) -> bool:
+    """제출을 outbox에 기록하고 워커를 깨움 (같은 attempt_id가 이미 있으면 False)"""
+    ob = _submit_outbox()
+    now = time.time()
+    if token:
+        with ob["lock"]:
+            ob["tokens"][user_id] = token
+    _rows, inserted = _outbox_exec(
+        ob,
+        "insert or ignore into submit_outbox "
+        "(attempt_id, user_id, attempt, items, next_try_at, created_at, updated_at) values (?, ?, ?, ?, ?, ?, ?)",
+        (
+            attempt["attempt_id"], user_id,
+            json.dumps(attempt, ensure_ascii=False), json.dumps(items, ensure_ascii=False),
+            now, now, now,
+        ),
+    )
+    with ob["lock"]:
+        ob["stats"]["queued" if inserted else "dedup"] += 1
+        ob["unsent"] += 1 if inserted else 0
+        full = ob["unsent"] >= OUTBOX_BATCH
+    ob["wake"].set()
+    if full:
+        ob["full"].set()
+    return bool(inserted)
+
+def outbox_status(attempt_id: str) -> tuple[str | None, dict | None]:
+    """(status, 결과) — 없으면 (None, None), 끝났으면 ("done", submit_attempt 반환값)"""
+    rows, _n = _outbox_exec(
+        _submit_outbox(), "select status, result from submit_outbox where attempt_id = ?", (attempt_id,)
+    )
+    if not rows:
+        return None, None
+    return rows[0][0], (json.loads(rows[0][1]) if rows[0][1] else None)
+
+def outbox_refresh_token(user_id: str, token: str):
+    """세션이 새 access_token을 받았을 때: 메모리의 토큰을 바꾸고 이 유저의 대기 행을 바로 재시도"""
+    ob = _submit_outbox()
+    with ob["lock"]:
+        if ob["tokens"].get(user_id) == token:
+            return
+        ob["tokens"][user_id] = token
+    now = time.time()
+    _rows, changed = _outbox_exec(
+        ob,
+        "update submit_outbox set status = 'pending', next_try_at = ?, updated_at = ? "
+        "where user_id = ? and status in ('pending', 'need_token')",
+        (now, now, user_id),
+    )
+    if changed:
+        ob["wake"].set()
+
+def outbox_retry(attempt_id: str, user_id: str, token: str | None) -> bool:
+    """'failed' 행을 처음부터 다시 보냄 (제출 화면의 "다시 저장")"""
+    ob = _submit_outbox()
+    if token:
+        with ob["lock"]:
+            ob["tokens"][user_id] = token
+    now = time.time()
+    _rows, changed = _outbox_exec(
+        ob,
+        "update submit_outbox set status = 'pending', tries = 0, next_try_at = ?, updated_at = ? "
+        "where attempt_id = ? and user_id = ? and status = 'failed'",
+        (now, now, attempt_id, user_id),
+    )
+    if changed:
+        ob["wake"].set()
+    return bool(changed)
+
+def outbox_discard_user(user_id: str):
+    """전체 초기화 직전: 아직 안 보낸 제출이 삭제 뒤에 다시 들어가지 않게 버림"""
+    _outbox_exec(_submit_outbox(), "delete from submit_outbox where user_id = ? and status <> 'done'", (user_id,))
+
+def outbox_summary() -> dict:
+    ob = _submit_outbox()
+    counts = dict(_outbox_exec(ob, "select status, count(*) from submit_outbox group by status")[0])
+    oldest = _outbox_exec(ob, "select min(created_at) from submit_outbox where status in ('pending', 'need_token')")[0][0][0]
+    with ob["lock"]:
+        stats = dict(ob["stats"])
+        flush = dict(ob["flush"])
+    return {
+        "counts": counts,
+        "oldest_age": (time.time() - oldest) if oldest else None,
+        "stats": stats,
+        "flush": flush,
+    }
 
 def fetch_recent_attempts(sb_authed, user_id, limit=10):
     return (
         sb_authed.table("quiz_attempts")
-        .select("created_at, level, pos_mode, quiz_len, score, wrong_count, wrong_list")
+        .select("created_at, level, pos_mode, quiz_type, quiz_len, score, wrong_count")
+        .eq("user_id", user_id)
+        .order("created_at", desc=True)
+        .limit(limit)
+        .execute()
+    )
+
+# ============================================================
+# ✅ 최근 기록 캐시 (프로세스 전체, 유저별)
+#    - 기록은 제출할 때만 바뀌므로 submit_attempt 성공/전체 초기화 때 무효화
+#    - 한 번에 50행을 받아 두고 제출 직후 화면(10회)/마이페이지(50회)가 같이 씀
+#    - TTL(다른 기기에서 푼 기록 반영) + LRU(유저 수 상한)로 메모리 제한
+# ============================================================
+ATTEMPT_HISTORY_FETCH_LIMIT = 50
+ATTEMPT_HISTORY_TTL_SEC = 300.0
+ATTEMPT_HISTORY_MAX_USERS = 2000
+
+@st.cache_resource(show_spinner=False)
+def _attempt_history_cache() -> dict:
+    return {
+        "lock": threading.Lock(),
+        "entries": OrderedDict(),  # user_id -> {"rows": tuple, "limit": int, "ts": float}
+        "gen": {},                 # user_id -> [무효화 세대, 조회 중인 수] (조회 중일 때만 둠 → 조회 중 무효화되면 결과를 버림)
+        "stats": {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0},
+    }
+
+def invalidate_attempt_history(user_id, c: dict | None = None):
+    """c: 백그라운드 스레드는 미리 받아 둔 캐시 dict를 넘김"""
+    c = _attempt_history_cache() if c is None else c
+    with c["lock"]:
+        c["entries"].pop(user_id, None)
+        g = c["gen"].get(user_id)
+        if g is not None:
+            g[0] += 1
+        c["stats"]["invalidations"] += 1
+
+def get_recent_attempts(sb_authed, user_id, limit=10) -> list[dict]:
+    """최근 기록 rows (최신순). 캐시가 유효하면 네트워크 없이 반환"""
+    c = _attempt_history_cache()
+    now = time.monotonic()
+    with c["lock"]:
+        e = c["entries"].get(user_id)
+        if e is not None and e["limit"] >= limit and now - e["ts"] < ATTEMPT_HISTORY_TTL_SEC:
+            c["entries"].move_to_end(user_id)
+            c["stats"]["hits"] += 1
+            return list(e["rows"][:limit])
+        c["stats"]["misses"] += 1
+        g = c["gen"].setdefault(user_id, [0, 0])
+        g[1] += 1
+        gen = g[0]
+
+    fetch_limit = max(int(limit), ATTEMPT_HISTORY_FETCH_LIMIT)
+    try:
+        rows = tuple(fetch_recent_attempts(sb_authed, user_id, limit=fetch_limit).data or [])
+    except Exception:
+        with c["lock"]:
+            _attempt_history_fetch_done(c, user_id)
+        raise
+
+    with c["lock"]:
+        if c["gen"][user_id][0] == gen:
+            c["entries"][user_id] = {"rows": rows, "limit": fetch_limit, "ts": time.monotonic()}
+            c["entries"].move_to_end(user_id)
+            while len(c["entries"]) > ATTEMPT_HISTORY_MAX_USERS:
+                c["entries"].popitem(last=False)
+                c["stats"]["evictions"] += 1
+        _attempt_history_fetch_done(c, user_id)
+    return list(rows[:limit])
+
+def _attempt_history_fetch_done(c: dict, user_id):
+    """(c["lock"] 잡은 상태) 조회 1개 끝 → 이 유저의 조회가 더 없으면 세대 정보도 지움"""
+    g = c["gen"][user_id]
+    g[1] -= 1
+    if g[1] <= 0:
+        del c["gen"][user_id]
+
+def fetch_user_word_stats(sb_authed, user_id, page_size=1000) -> list[dict]:
+    """user_word_agg 전체(유저당 단어×유형 수준) — PostgREST 최대 행 수 때문에 나눠서 받음"""
+    rows, start = [], 0
+    while True:
+        res = (
+            sb_authed.table("user_word_agg")
+            .select("word_key, quiz_type, seen_count, wrong_count, backfilled_wrong, last_wrong_at")
+            .eq("user_id", user_id)
+            .order("word_key")
+            .order("quiz_type")
+            .range(start, start + page_size - 1)
+            .execute()
+        )
+        batch = res.data or []
+        rows.extend(batch)
+        if len(batch) < page_size:
+            return rows
+        start += page_size
+
+def fetch_wrong_word_top(sb_authed, user_id, limit=10) -> list[tuple[str, int]]:
+    """서버 누적 집계(user_wrong_word_top 뷰)에서 오답 TOP N만 조회"""
+    res = (
+        sb_authed.table("user_wrong_word_top")
+        .select("word_key, wrong_count")
+        .eq("user_id", user_id)
+        .order("wrong_count", desc=True)
+        .order("last_wrong_at", desc=True)
+        .limit(limit)
+        .execute()
+    )
+    return [(str(r["word_key"]), int(r["wrong_count"] or 0)) for r in (res.data or [])]
+
+def fetch_wrong_word_top_from_attempts(sb_authed, user_id, limit=10, n_attempts=50) -> list[tuple[str, int]]:
+    """(집계 테이블이 아직 없을 때) 최근 기록의 wrong_list로 직접 세기"""
+    res = (
+        sb_authed.table("quiz_attempts")
+        .select("wrong_list")
         .eq("user_id", user_id)
         .order("created_at", desc=True)
-        .limit(limit)
+        .limit(n_attempts)
         .execute()
     )
+    counter = Counter()
+    for row in (res.data or []):
+        wl = row.get("wrong_list") or []
+        if isinstance(wl, list):
+            for w in wl:
+                word = str(w.get("단어", "")).strip()
+                if word:
+                    counter[word] += 1
+    return counter.most_common(limit)
 
-def fetch_all_attempts_admin(sb_authed, limit=500):
-    return (
+# ============================================================
+# ✅ 관리자 기록 탐색: (created_at, id) keyset 페이지네이션
+#    - OFFSET 없이 "마지막 행보다 과거"만 조회 → 몇 페이지째든 인덱스 범위 스캔 1번
+#    - 인덱스: quiz_attempts (created_at desc, id desc)
+# ============================================================
+ADMIN_PAGE_SIZE = 500
+ADMIN_STREAM_MAX_PAGES = 20  # 버튼 1번에 스트리밍할 최대 페이지 수
+
+def fetch_attempts_page_admin(sb_authed, cursor=None, limit=ADMIN_PAGE_SIZE) -> list[dict]:
+    """cursor=(created_at, id) 이전(더 과거) 행을 최신순으로 limit개"""
+    q = (
         sb_authed.table("quiz_attempts")
-        .select("created_at, user_email, level, pos_mode, quiz_len, score, wrong_count")
-        .order("created_at", desc=True)
+        .select("id, created_at, user_email, level, pos_mode, quiz_type, quiz_len, score, wrong_count")
+    )
+    if cursor is not None:
+        ts, last_id = cursor
+        q = q.or_(f'created_at.lt."{ts}",and(created_at.eq."{ts}",id.lt.{last_id})')
+    res = (
+        q.order("created_at", desc=True)
+        .order("id", desc=True)
         .limit(limit)
         .execute()
     )
+    return res.data or []
+
+# ============================================================
+# ✅ 관리자 분석 큐브 (day × level × pos_mode × quiz_type)
+#    - 서버 함수 admin_rollup_attempt_cube()가 워터마크 이후 기록만 증분 누적
+#    - 큐브는 작으므로 통째로 받아 두고 슬라이스는 메모리에서 계산
+# ============================================================
+ADMIN_CUBE_DIMS = ("day", "level", "pos_mode", "quiz_type")
+ADMIN_CUBE_MEASURES = ("attempts", "score_sum", "item_count", "wrong_count")
+ADMIN_CUBE_TTL_SEC = 60.0
+
+def run_admin_cube_rollup(sb_authed) -> dict:
+    res = sb_authed.rpc("admin_rollup_attempt_cube", {}).execute()
+    return res.data or {}
+
+def fetch_admin_cube(sb_authed) -> pd.DataFrame:
+    res = (
+        sb_authed.table("admin_attempt_cube")
+        .select(",".join(ADMIN_CUBE_DIMS + ADMIN_CUBE_MEASURES))
+        .execute()
+    )
+    cube = pd.DataFrame(res.data or [], columns=list(ADMIN_CUBE_DIMS + ADMIN_CUBE_MEASURES))
+    cube["day"] = pd.to_datetime(cube["day"]).dt.date
+    for m in ADMIN_CUBE_MEASURES:
+        cube[m] = pd.to_numeric(cube[m], errors="coerce").fillna(0).astype("int64")
+    return cube
+
+def slice_admin_cube(cube: pd.DataFrame, by: list[str], filters: dict) -> pd.DataFrame:
+    """filters: {dim: 허용값 목록 | (시작일, 종료일)} → by로 묶은 합계 + 평균 점수/오답률"""
+    mask = pd.Series(True, index=cube.index)
+    for dim, allowed in filters.items():
+        if dim == "day" and isinstance(allowed, tuple):
+            mask &= (cube["day"] >= allowed[0]) & (cube["day"] <= allowed[1])
+        elif allowed:
+            mask &= cube[dim].isin(list(allowed))
+    sub = cube.loc[mask]
+    out = sub.groupby(by, sort=True)[list(ADMIN_CUBE_MEASURES)].sum() if by else sub[list(ADMIN_CUBE_MEASURES)].sum().to_frame().T
+    out["평균 점수"] = (out["score_sum"] / out["attempts"].where(out["attempts"] > 0)).round(2)
+    out["오답률"] = (out["wrong_count"] / out["item_count"].where(out["item_count"] > 0)).round(3)
+    return out.reset_index() if by else out
+
+def new_admin_explorer_state() -> dict:
+    return {
+        "cursor": None,    # 다음 페이지 시작점 (created_at, id)
+        "done": False,
+        "n_rows": 0,
+        "n_pages": 0,
+        "page": [],        # 화면에는 마지막 페이지만 보관
+        "per_day": {},     # "YYYY-MM-DD"(KST) -> 응시 수
+        "per_mode": {},    # pos_mode -> [응시 수, 점수 합, 정답률 합]
+    }
+
+def admin_explorer_add_page(state: dict, rows: list[dict], page_size: int = ADMIN_PAGE_SIZE):
+    """페이지 1개를 누적 집계에 반영 (이전 페이지는 다시 보지 않음)"""
+    if rows:
+        kst_days = to_kst_naive(pd.Series([r.get("created_at") for r in rows])).dt.strftime("%Y-%m-%d")
+        per_day = state["per_day"]
+        for day in kst_days:
+            if isinstance(day, str):
+                per_day[day] = per_day.get(day, 0) + 1
+
+        per_mode = state["per_mode"]
+        for r in rows:
+            acc = per_mode.setdefault(str(r.get("pos_mode") or "-"), [0, 0, 0.0])
+            score = int(r.get("score") or 0)
+            total = int(r.get("quiz_len") or 0)
+            acc[0] += 1
+            acc[1] += score
+            acc[2] += (score / total) if total else 0.0
+
+        last = rows[-1]
+        state["cursor"] = (last["created_at"], last["id"])
+        state["n_rows"] += len(rows)
+        state["n_pages"] += 1
+        state["page"] = rows
+    if len(rows) < page_size:
+        state["done"] = True
 
 def fetch_is_admin_from_db(sb_authed, user_id):
     try:
@@ -887,29 +2638,330 @@ def build_word_results_bulk_payload(
 # ============================================================
 # ✅ Progress (DB 저장/복원)
 # ============================================================
-def save_progress_to_db(sb_authed, user_id: str):
+def build_progress_payload() -> dict | None:
     if "quiz" not in st.session_state or "answers" not in st.session_state:
-        return
+        return None
+
+    # ✅ on_change 콜백 시점엔 answers가 아직 이전 값이라 위젯 값으로 먼저 맞춤
+    sync_answers_from_widgets()
 
     payload = {
+        "level": current_level(),
         "quiz_type": st.session_state.get("quiz_type"),
         "pos_mode": st.session_state.get("pos_mode", "i_adj"), # ✅ 추가
         "quiz_version": int(st.session_state.get("quiz_version", 0) or 0),
-        "quiz": st.session_state.get("quiz"),
-        "answers": st.session_state.get("answers"),
         "submitted": bool(st.session_state.get("submitted", False)),
+        "attempt_id": st.session_state.get("attempt_id"),
+    }
+
+    quiz = st.session_state.get("quiz")
+    answers = list(st.session_state.get("answers") or [])
+
+    # ✅ v2: word_id / 보기 word_id / 답 번호만 저장 (안 되면 예전처럼 quiz 전체 저장)
+    encoded = encode_progress_quiz(quiz, answers, payload["quiz_type"])
+    if encoded is not None:
+        payload.update(encoded)
+    else:
+        payload["quiz"] = quiz
+        payload["answers"] = answers
+    return payload
+
+PROGRESS_FORMAT_VERSION = 2
+
+def encode_progress_quiz(quiz, answers: list, qtype: str) -> dict | None:
+    """quiz → {"v", "data", "w": word_id들, "c": 문항별 보기 word_id 4개(표시 순서), "a": 고른 보기 번호(-1=미선택)}"""
+    if not isinstance(quiz, list):
+        return None
+
+    codec = vocab_snapshot().codec
+
+    w_ids, c_ids, a_idx = [], [], []
+    for i, q in enumerate(quiz):
+        wid = q.get("word_id")
+        if wid is None or q.get("qtype") != qtype or qtype not in QTYPE_FIELD:
+            return None
+
+        value_word = codec["value_word"][QTYPE_FIELD[qtype]]
+        ids = [value_word.get(c) for c in q.get("choices", [])]
+        if any(x is None for x in ids):
+            return None
+
+        picked = answers[i] if i < len(answers) else None
+        w_ids.append(int(wid))
+        c_ids.append(ids)
+        a_idx.append(q["choices"].index(picked) if picked in q["choices"] else -1)
+
+    return {
+        "v": PROGRESS_FORMAT_VERSION,
+        "data": codec["fingerprint"],
+        "w": w_ids,
+        "c": c_ids,
+        "a": a_idx,
     }
 
+def decode_progress_quiz(progress: dict):
+    """v2 progress → (quiz, answers). 단어 데이터가 바뀌어서 복원할 수 없으면 None"""
+    vocab = vocab_snapshot()
+    codec = vocab.codec
+    if progress.get("data") != codec["fingerprint"]:
+        return None
+
+    qtype = progress.get("quiz_type")
+    if qtype not in QTYPE_FIELD:
+        return None
+    field = QTYPE_FIELD[qtype]
+
+    try:
+        quiz, answers = [], []
+        for wid, ids, ai in zip(progress["w"], progress["c"], progress["a"]):
+            choices = [vocab.words[field][int(x)] for x in ids]
+            quiz.append(question_dict(int(wid), qtype, choices, vocab.words))
+            answers.append(choices[ai] if 0 <= ai < len(choices) else None)
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+
+    return quiz, answers
+
+def write_progress_payload(sb_authed, user_id: str, payload: dict | None):
     sb_authed.table("profiles").upsert(
         {"id": user_id, "progress": payload},
         on_conflict="id",
     ).execute()
 
+def save_progress_to_db(sb_authed, user_id: str):
+    payload = build_progress_payload()
+    if payload is None:
+        return
+    write_progress_payload(sb_authed, user_id, payload)
+
 def clear_progress_in_db(sb_authed, user_id: str):
-    sb_authed.table("profiles").upsert(
-        {"id": user_id, "progress": None},
-        on_conflict="id",
-    ).execute()
+    # ✅ 대기 중인 저장이 초기화를 덮어쓰지 않도록 write-behind 큐를 거쳐 바로 씀
+    progress_write_now(sb_authed, user_id, None)
+
+# ============================================================
+# ✅ Progress write-behind 큐 (프로세스 전체 1개)
+#    - 유저별로 마지막 값만 남김(last write wins) → 연속 클릭은 1번의 쓰기로 합쳐짐
+#    - 백그라운드 스레드가 입력이 잠잠해지면(PROGRESS_FLUSH_QUIET_SEC) DB에 씀
+#    - 대기 유저 수가 PROGRESS_QUEUE_MAX를 넘으면 잠깐 기다렸다가, 그래도 꽉 차면 직접 씀(backpressure)
+#    - 제출/로그아웃 때는 flush_progress_for_user()로 즉시 반영
+# ============================================================
+PROGRESS_FLUSH_QUIET_SEC = 2.0
+PROGRESS_FLUSH_MAX_DELAY_SEC = 10.0
+PROGRESS_QUEUE_MAX = 500
+PROGRESS_ENQUEUE_WAIT_SEC = 0.5
+PROGRESS_MAX_RETRIES = 3
+
+@st.cache_resource(show_spinner=False)
+def _progress_writer() -> dict:
+    lock = threading.Lock()
+    w = {
+        "lock": lock,
+        "cond": threading.Condition(lock),
+        # 큐 키: 진행상태 = user_id, 그 외 = (user_id, 종류, ...) — 키마다 마지막 값만 남김
+        "pending": {},       # 키 -> {"client", "user_id", "payload", "write", "seq", "first_ts", "last_ts", "retries"}
+        "user_locks": {},    # 키 -> [Lock, 꺼내 간(쓰는 중/쓸 예정) 값 수] (같은 키의 쓰기는 순서대로)
+        "seq": 0,
+        "written_seq": {},   # 키 -> 마지막으로 DB에 쓴 seq (오래된 값이 새 값을 덮지 않게)
+        # ↑ 둘 다 꺼내 간 값이 0개이고 대기열에도 없으면 지움 (키 수만큼 계속 쌓이지 않게)
+        "stats": {"enqueued": 0, "coalesced": 0, "written": 0, "failed": 0, "sync_fallback": 0},
+    }
+    t = threading.Thread(target=_progress_flusher_loop, args=(w,), name="progress_writer", daemon=True)
+    t.start()
+    atexit.register(_progress_flush_all, w)
+    return w
+
+def _progress_claim(w: dict, user_id: str) -> threading.Lock:
+    """(w["lock"] 잡은 상태) 대기열에서 꺼낸 값 1개를 쓰러 감 → 그 키의 락 (끝나면 _progress_release)"""
+    ent = w["user_locks"].get(user_id)
+    if ent is None:
+        ent = w["user_locks"][user_id] = [threading.Lock(), 0]
+    ent[1] += 1
+    return ent[0]
+
+def _progress_release(w: dict, user_id: str, keep_seq: bool = False):
+    """(w["lock"] 잡은 상태) 이 키를 더 쓰는 곳이 없으면 락/seq 정리"""
+    ent = w["user_locks"].get(user_id)
+    if ent is not None:
+        ent[1] -= 1
+        if ent[1] > 0:
+            return
+    if user_id in w["pending"]:
+        return
+    w["user_locks"].pop(user_id, None)
+    if not keep_seq:  # 실패한 값은 재시도될 수 있으므로 seq는 남겨 둠
+        w["written_seq"].pop(user_id, None)
+
+def _progress_write(w: dict, user_id: str, item: dict) -> bool:
+    """호출 전에 _progress_claim 해 둔 값 1개를 씀 (끝나면 release까지)"""
+    with w["lock"]:
+        lock = w["user_locks"][user_id][0]
+    ok = False
+    try:
+        with lock:
+            with w["lock"]:
+                if item["seq"] < w["written_seq"].get(user_id, -1):
+                    ok = True
+                    return True  # 이미 더 새 값이 써짐
+            try:
+                write = item.get("write") or write_progress_payload
+                write(item["client"], item.get("user_id", user_id), item["payload"])
+            except Exception:
+                with w["lock"]:
+                    w["stats"]["failed"] += 1
+                return False
+            with w["lock"]:
+                w["written_seq"][user_id] = item["seq"]
+                w["stats"]["written"] += 1
+            ok = True
+            return True
+    finally:
+        with w["lock"]:
+            _progress_release(w, user_id, keep_seq=not ok)
+
+def _progress_flusher_loop(w: dict):
+    while True:
+        with w["cond"]:
+            while not w["pending"]:
+                w["cond"].wait()
+
+            now = time.time()
+            due = [
+                uid for uid, it in w["pending"].items()
+                if now - it["last_ts"] >= PROGRESS_FLUSH_QUIET_SEC
+                or now - it["first_ts"] >= PROGRESS_FLUSH_MAX_DELAY_SEC
+            ]
+            if not due:
+                w["cond"].wait(timeout=0.5)
+                continue
+            batch = [(uid, w["pending"].pop(uid)) for uid in due]
+            for uid, _item in batch:
+                _progress_claim(w, uid)
+            w["cond"].notify_all()  # 자리 났음 → backpressure 대기 중인 세션 깨우기
+
+        for uid, item in batch:
+            if _progress_write(w, uid, item):
+                continue
+            # 실패: 더 새 값이 없을 때만 재시도 대기열로
+            with w["cond"]:
+                if uid not in w["pending"] and item["retries"] < PROGRESS_MAX_RETRIES:
+                    item["retries"] += 1
+                    item["first_ts"] = item["last_ts"] = time.time()
+                    w["pending"][uid] = item
+                elif uid not in w["pending"] and uid not in w["user_locks"]:
+                    w["written_seq"].pop(uid, None)  # 포기 → 남은 seq 정리
+
+def _progress_flush_all(w: dict):
+    with w["lock"]:
+        batch = list(w["pending"].items())
+        w["pending"].clear()
+        for uid, _item in batch:
+            _progress_claim(w, uid)
+    for uid, item in batch:
+        _progress_write(w, uid, item)
+
+def enqueue_progress_save(sb_authed, user_id: str, payload: dict, *, key=None, write=None):
+    """key/write를 주면 진행상태 외의 유저 데이터도 같은 큐로 (예: 비트셋)"""
+    w = _progress_writer()
+    qkey = user_id if key is None else key
+    now = time.time()
+    with w["cond"]:
+        if qkey not in w["pending"]:
+            w["cond"].wait_for(lambda: len(w["pending"]) < PROGRESS_QUEUE_MAX, timeout=PROGRESS_ENQUEUE_WAIT_SEC)
+
+        w["seq"] += 1
+        w["stats"]["enqueued"] += 1
+        item = {
+            "client": sb_authed, "user_id": user_id, "payload": payload, "write": write,
+            "seq": w["seq"], "first_ts": now, "last_ts": now, "retries": 0,
+        }
+
+        prev = w["pending"].get(qkey)
+        if prev is not None or len(w["pending"]) < PROGRESS_QUEUE_MAX:
+            if prev is not None:
+                item["first_ts"] = prev["first_ts"]
+                w["stats"]["coalesced"] += 1
+            w["pending"][qkey] = item
+            w["cond"].notify_all()
+            return
+
+        # ✅ 큐가 계속 꽉 차 있으면 이 세션이 직접 씀
+        w["stats"]["sync_fallback"] += 1
+        _progress_claim(w, qkey)
+
+    _progress_write(w, qkey, item)
+
+def _progress_user_keys(w: dict, user_id: str) -> list:
+    return [k for k in w["pending"] if k == user_id or (isinstance(k, tuple) and k[0] == user_id)]
+
+def flush_progress_for_user(user_id: str) -> bool:
+    """이 유저의 대기 중인 쓰기(진행상태 + 비트셋)를 전부 바로 반영"""
+    w = _progress_writer()
+    with w["cond"]:
+        items = [(k, w["pending"].pop(k)) for k in _progress_user_keys(w, user_id)]
+        for k, _item in items:
+            _progress_claim(w, k)
+        w["cond"].notify_all()
+        if not items:
+            lock = _progress_claim(w, user_id)
+    if not items:
+        # 진행 중인 쓰기가 있으면 끝날 때까지 기다림
+        try:
+            with lock:
+                return True
+        finally:
+            with w["lock"]:
+                _progress_release(w, user_id)
+    ok = True
+    for k, item in items:
+        ok = _progress_write(w, k, item) and ok
+    return ok
+
+def discard_pending_writes(user_id: str):
+    """전체 초기화 직전: 대기 중인 쓰기가 삭제 뒤에 다시 살아나지 않게 버림"""
+    w = _progress_writer()
+    with w["cond"]:
+        for k in _progress_user_keys(w, user_id):
+            w["pending"].pop(k, None)
+        w["seq"] += 1
+        # 이미 꺼내 가서 쓰는 중인 값도 무시되게 (정리는 그 쓰기가 끝날 때)
+        for k in set(w["written_seq"]) | set(w["user_locks"]):
+            if k == user_id or (isinstance(k, tuple) and k[0] == user_id):
+                ent = w["user_locks"].get(k)
+                if ent is not None and ent[1] > 0:
+                    w["written_seq"][k] = w["seq"]
+                else:
+                    w["user_locks"].pop(k, None)
+                    w["written_seq"].pop(k, None)
+        w["cond"].notify_all()
+
+def progress_write_now(sb_authed, user_id: str, payload: dict | None):
+    """큐를 건너뛰고 바로 씀 (대기 중인 값은 버림, 실패하면 예외 그대로)"""
+    w = _progress_writer()
+    with w["cond"]:
+        w["pending"].pop(user_id, None)
+        w["seq"] += 1
+        seq = w["seq"]
+        lock = _progress_claim(w, user_id)
+
+    try:
+        with lock:
+            write_progress_payload(sb_authed, user_id, payload)
+            with w["lock"]:
+                w["written_seq"][user_id] = seq
+    finally:
+        with w["lock"]:
+            _progress_release(w, user_id)
+
+def flush_progress_now():
+    """제출/로그아웃: 현재 진행상태를 큐에 넣고 바로 DB까지 반영"""
+    u = st.session_state.get("user")
+    sb_authed_local = get_authed_sb() if u is not None else None
+    if u is None or sb_authed_local is None:
+        return
+    payload = build_progress_payload()
+    if payload is not None:
+        enqueue_progress_save(sb_authed_local, u.id, payload)
+    flush_progress_for_user(u.id)
 
 def restore_progress_from_db(sb_authed, user_id: str):
     try:
@@ -930,14 +2982,31 @@ def restore_progress_from_db(sb_authed, user_id: str):
     if not progress:
         return
 
+    # ✅ 저장 당시 레벨로 먼저 맞춰야 word_id가 같은 단어를 가리킴 (예전 기록은 기본 레벨)
+    level = progress.get("level", DEFAULT_LEVEL)
+    if level not in catalog_levels():
+        return
+    st.session_state.level = level
+
+    if progress.get("v") == PROGRESS_FORMAT_VERSION:
+        decoded = decode_progress_quiz(progress)
+        if decoded is None:
+            return
+        quiz, answers = decoded
+    else:
+        # 예전(v1) 형식: quiz 전체가 JSON으로 저장됨
+        quiz = progress.get("quiz", st.session_state.get("quiz"))
+        answers = progress.get("answers", st.session_state.get("answers"))
+
     st.session_state.quiz_type = progress.get("quiz_type", st.session_state.get("quiz_type", "reading"))
     st.session_state.pos_mode = progress.get("pos_mode", st.session_state.get("pos_mode", "i_adj"))  # ✅ 추가
 
 
     st.session_state.quiz_version = int(progress.get("quiz_version", st.session_state.get("quiz_version", 0) or 0))
-    st.session_state.quiz = progress.get("quiz", st.session_state.get("quiz"))
-    st.session_state.answers = progress.get("answers", st.session_state.get("answers"))
+    st.session_state.quiz = quiz
+    st.session_state.answers = answers
     st.session_state.submitted = bool(progress.get("submitted", st.session_state.get("submitted", False)))
+    st.session_state.attempt_id = progress.get("attempt_id", st.session_state.get("attempt_id"))
 
     if isinstance(st.session_state.quiz, list):
         qlen = len(st.session_state.quiz)
@@ -1374,6 +3443,9 @@ except Exception:
 st.session_state.progress_restored = True
 
 # ✅ 2) 복원 이후에만 기본값 보정 (복원값이 있으면 그대로 유지)
+if st.session_state.get("level") not in catalog_levels():
+    st.session_state.level = current_level()
+
 if "pos_mode" not in st.session_state or st.session_state.get("pos_mode") not in POS_MODES:
     st.session_state.pos_mode = "i_adj"
 
@@ -1399,11 +3471,9 @@ def nav_to(page: str, scroll_top: bool = True):
     if scroll_top:
         st.session_state["_scroll_top_once"] = True
 
-# ✅✅ (2) 프로필 upsert / 출석 체크는 라우팅 전에 1번만
+# ✅✅ (2) 프로필 upsert / 출석 체크는 라우팅 전에 (유저·날짜당) 1번만
 if sb_authed is not None:
-    ensure_profile(sb_authed, user)
-
-    att = mark_attendance_once(sb_authed)
+    att = bootstrap_session_once(sb_authed, user)
     if att:
         st.session_state["streak_count"] = int(att.get("streak_count", 0) or 0)
         st.session_state["did_attend_today"] = bool(att.get("did_attend", False))
@@ -1436,6 +3506,204 @@ def render_admin_dashboard():
         st.warning("세션 토큰이 없습니다. 다시 로그인해 주세요.")
         return
 
+    reg = _bootstrap_registry()
+    with reg["lock"]:
+        skipped = dict(reg["skipped"])
+        n_users_today = len(reg["done"])
+    st.caption(
+        f"세션 부트스트랩(오늘 {n_users_today}명) · 생략한 쓰기: "
+        f"프로필 upsert {skipped['ensure_profile']}회 / 출석 RPC {skipped['mark_attendance']}회"
+    )
+
+    w = _progress_writer()
+    with w["lock"]:
+        ws = dict(w["stats"])
+        n_pending = len(w["pending"])
+    st.caption(
+        f"진행상태 write-behind · 대기 {n_pending}명 / 요청 {ws['enqueued']} / 합쳐짐 {ws['coalesced']} / "
+        f"DB 쓰기 {ws['written']} / 실패 {ws['failed']} / 직접 쓰기 {ws['sync_fallback']}"
+    )
+
+    hc = _attempt_history_cache()
+    with hc["lock"]:
+        hs = dict(hc["stats"])
+        n_cached = len(hc["entries"])
+    st.caption(
+        f"최근 기록 캐시 · {n_cached}명 / 적중 {hs['hits']} / 조회 {hs['misses']} / "
+        f"무효화 {hs['invalidations']} / 밀려남 {hs['evictions']}"
+    )
+
+    vr = _vocab_registry()
+    with vr["lock"]:
+        vs = dict(vr["stats"])
+        current = ", ".join(f"{lv}={v}" for lv, v in vr["current"].items())
+        n_snaps = len(vr["snapshots"])
+        n_pins = len(vr["pins"])
+        last_error = vr["last_error"]
+    st.caption(
+        f"단어 데이터 · 현재 {current or '-'} / 보관 스냅샷 {n_snaps}개(세션 {n_pins}) / "
+        f"로드 {vs['loads']} / 교체 {vs['swaps']} / 해제 {vs['released']} / 실패 {vs['errors']}"
+    )
+    if last_error:
+        st.caption(f"마지막 단어 데이터 오류: {last_error}")
+
+    tr = _token_refresher()
+    with tr["lock"]:
+        ts = dict(tr["stats"])
+    st.caption(
+        f"토큰 갱신 · 미리 {ts['proactive']} / 호출 {ts['refreshed']} / 공유 {ts['shared']} / "
+        f"실패 {ts['failed']} / 그 자리 재시도 {ts['retried']}"
+    )
+
+    try:
+        ob = outbox_summary()
+        oc, os_ = ob["counts"], ob["stats"]
+        oldest = f"{ob['oldest_age']:.0f}초" if ob["oldest_age"] is not None else "-"
+        st.caption(
+            f"제출 outbox · 대기 {oc.get('pending', 0)} / 토큰 대기 {oc.get('need_token', 0)} / 실패 {oc.get('failed', 0)} "
+            f"(가장 오래된 대기 {oldest}) · 전송 {os_['sent']} / 중복 {os_['duplicate'] + os_['dedup']} / "
+            f"재시도 {os_['retried']} / 배치 {os_['batches']}"
+        )
+        of = ob["flush"]
+        if of["n"]:
+            st.caption(
+                f"묶음 저장 · {of['n']}회 · 평균 {of['rows'] / of['n']:.1f}건/{of['users'] / of['n']:.1f}명(최대 {of['rows_max']}건) · "
+                f"단어 결과 {of['items']} → {of['groups']}행 · 평균 {of['ms_total'] / of['n']:.0f}ms(최대 {of['ms_max']:.0f}ms) · "
+                f"1건씩 대체 {of['fallbacks']} · 티켓 발급 {of['tickets']}"
+            )
+    except sqlite3.Error as e:
+        st.caption(f"제출 outbox를 읽지 못했습니다: {e}")
+
+    render_admin_cube(sb_authed_local)
+    render_admin_attempts_explorer(sb_authed_local)
+
+def render_admin_cube(sb_authed):
+    st.divider()
+    st.markdown("### 📈 학습 통계 (일 × 레벨 × 품사 × 유형)")
+
+    if st.button("집계 갱신", use_container_width=True, key="btn_admin_cube_rollup"):
+        try:
+            out = run_db(lambda: run_admin_cube_rollup(sb_authed))
+            st.session_state.pop("_admin_cube", None)
+            st.caption(f"새로 반영된 칸 {out.get('cells', 0)}개 · 기준 시각 {out.get('watermark', '-')}")
+        except Exception as e:
+            st.warning("집계를 갱신하지 못했습니다. (admin_rollup_attempt_cube 마이그레이션 확인)")
+            st.write(str(e))
+
+    cached = st.session_state.get("_admin_cube")
+    if cached is None or time.monotonic() - cached["ts"] > ADMIN_CUBE_TTL_SEC:
+        try:
+            cube = run_db(lambda: fetch_admin_cube(sb_authed))
+        except Exception as e:
+            st.info("통계 큐브를 불러오지 못했습니다.")
+            st.write(str(e))
+            return
+        cached = st.session_state["_admin_cube"] = {"df": cube, "ts": time.monotonic()}
+    cube = cached["df"]
+
+    if cube.empty:
+        st.caption("아직 집계된 기록이 없습니다. '집계 갱신'을 눌러 주세요.")
+        return
+
+    d_min, d_max = min(cube["day"]), max(cube["day"])
+    c1, c2, c3, c4 = st.columns(4)
+    days = c1.date_input("기간", value=(d_min, d_max), min_value=d_min, max_value=d_max, key="admin_cube_days")
+    levels = c2.multiselect("레벨", sorted(cube["level"].unique()), key="admin_cube_levels")
+    modes = c3.multiselect("품사", sorted(cube["pos_mode"].unique()), key="admin_cube_modes",
+                           format_func=lambda x: POS_MODE_MAP.get(x, x))
+    qtypes = c4.multiselect("유형", sorted(cube["quiz_type"].unique()), key="admin_cube_qtypes",
+                            format_func=lambda x: quiz_label_for_table.get(x, x))
+    by = st.multiselect("묶기", list(ADMIN_CUBE_DIMS), default=["day"], key="admin_cube_by")
+
+    filters = {"level": levels, "pos_mode": modes, "quiz_type": qtypes}
+    if isinstance(days, (tuple, list)) and len(days) == 2:
+        filters["day"] = (days[0], days[1])
+
+    out = slice_admin_cube(cube, by, filters)
+    if by == ["day"] and len(out):
+        st.line_chart(out.set_index("day")[["attempts"]])
+    st.dataframe(out, hide_index=True, use_container_width=True)
+
+def render_admin_explorer_stats(state: dict):
+    st.caption(
+        f"불러온 기록 {state['n_rows']:,}건 · {state['n_pages']}페이지"
+        + (" · 끝까지 읽음" if state["done"] else "")
+    )
+    if state["per_day"]:
+        per_day = pd.Series(state["per_day"], name="응시 수").sort_index()
+        per_day.index.name = "날짜"
+        st.bar_chart(per_day)
+    if state["per_mode"]:
+        mode_df = pd.DataFrame(
+            [
+                {
+                    "품사": POS_MODE_MAP.get(mode, mode),
+                    "응시 수": n,
+                    "평균 점수": score_sum / n,
+                    "평균 정답률": f"{rate_sum / n * 100:.0f}%",
+                }
+                for mode, (n, score_sum, rate_sum) in state["per_mode"].items()
+                if n
+            ]
+        ).sort_values("응시 수", ascending=False)
+        st.dataframe(mode_df, hide_index=True, use_container_width=True)
+
+def render_admin_explorer_page(state: dict):
+    rows = state["page"]
+    if not rows:
+        st.caption("아직 불러온 페이지가 없습니다.")
+        return
+    page_df = pd.DataFrame(rows)
+    page_df["created_at"] = to_kst_naive(page_df["created_at"])
+    page_df["pos_mode"] = page_df["pos_mode"].map(lambda x: POS_MODE_MAP.get(x, x))
+    page_df["quiz_type"] = page_df["quiz_type"].map(lambda x: quiz_label_for_table.get(x, x))
+    st.caption(f"{state['n_pages']}페이지 ({len(rows)}건)")
+    st.dataframe(page_df.drop(columns=["id"]), hide_index=True, use_container_width=True)
+
+def render_admin_attempts_explorer(sb_authed):
+    st.divider()
+    st.markdown("### 🔎 전체 기록 탐색")
+
+    state = st.session_state.get("_admin_explorer")
+    if state is None:
+        state = st.session_state["_admin_explorer"] = new_admin_explorer_state()
+
+    c1, c2, c3 = st.columns(3)
+    next_clicked = c1.button("다음 페이지", use_container_width=True, key="btn_admin_next_page",
+                             disabled=state["done"])
+    stream_clicked = c2.button(f"계속 읽기 (최대 {ADMIN_STREAM_MAX_PAGES}페이지)", use_container_width=True,
+                               key="btn_admin_stream", disabled=state["done"])
+    if c3.button("처음부터", use_container_width=True, key="btn_admin_reset_explorer"):
+        state = st.session_state["_admin_explorer"] = new_admin_explorer_state()
+
+    stats_box = st.empty()
+    page_box = st.empty()
+
+    n_pages = 1 if (next_clicked or state["n_pages"] == 0) else (ADMIN_STREAM_MAX_PAGES if stream_clicked else 0)
+    rendered = False
+    for _ in range(n_pages):
+        if state["done"]:
+            break
+        try:
+            rows = run_db(lambda: fetch_attempts_page_admin(sb_authed, state["cursor"]))
+        except Exception as e:
+            st.warning("기록을 불러오지 못했습니다.")
+            st.write(str(e))
+            break
+        admin_explorer_add_page(state, rows)
+        # ✅ 페이지가 도착할 때마다 집계/표를 갱신 (전체를 모아서 그리지 않음)
+        with stats_box.container():
+            render_admin_explorer_stats(state)
+        with page_box.container():
+            render_admin_explorer_page(state)
+        rendered = True
+
+    if not rendered:
+        with stats_box.container():
+            render_admin_explorer_stats(state)
+        with page_box.container():
+            render_admin_explorer_page(state)
+
 def render_my_dashboard():
     st.subheader("📌 내 대시보드")
 
@@ -1494,17 +3762,20 @@ def render_my_dashboard():
                     return True
 
                 run_db(_delete_all)
+                invalidate_attempt_history(user_id_local)
 
                 # 세션 초기화
                 clear_question_widget_keys()
                 for k in [
                     "history", "wrong_counter", "total_counter",
                     "wrong_list", "quiz", "answers", "submitted",
-                    "saved_this_attempt", "stats_saved_this_attempt",
+                    "attempt_id", "attempt_result",
                     "session_stats_applied_this_attempt",
                     "quiz_version",
-                    "mastered_words", "mastery_banner_shown", "mastery_done",
-                    "progress_restored", "pool_ready",
+                    "mastered_words", "mastery_banner_shown", "mastery_done", "srs",
+                    "_word_stats", "_word_sampler", "_bitsets_loaded", "excluded_wrong_words",
+                    "progress_restored", "_vocab_pin",
+                    "_quiz_prefetch",
                 ]:
                     st.session_state.pop(k, None)
 
@@ -1520,23 +3791,23 @@ def render_my_dashboard():
     # 최근 기록 불러오기 (본인 것만)
     # ============================================================
     def _fetch():
-        return fetch_recent_attempts(sb_authed_local, user_id_local, limit=50)
+        return get_recent_attempts(sb_authed_local, user_id_local, limit=50)
 
     try:
-        res = run_db(_fetch)
+        rows = run_db(_fetch)
     except Exception as e:
         st.info("기록을 불러오지 못했습니다.")
         st.write(str(e))
         return
 
-    if not res.data:
+    if not rows:
         st.info("아직 저장된 기록이 없습니다. 문제를 풀고 제출하면 기록이 쌓여요.")
         return
 
     # ------------------------------------------------------------
     # 통계 요약
     # ------------------------------------------------------------
-    hist = pd.DataFrame(res.data).copy()
+    hist = pd.DataFrame(rows).copy()
     hist["created_at"] = to_kst_naive(hist["created_at"])
     hist["정답률"] = (hist["score"] / hist["quiz_len"]).fillna(0.0)
 
@@ -1604,25 +3875,23 @@ def render_my_dashboard():
     )
 
     st.divider()
-    st.markdown("### ❌ 자주 틀린 단어 TOP10 (최근 50회)")
+    st.markdown("### ❌ 자주 틀린 단어 TOP10 (누적)")
 
-    from collections import Counter
-    counter = Counter()
-
-    for row in (res.data or []):
-        wl = row.get("wrong_list") or []
-        if isinstance(wl, list):
-            for w in wl:
-                word = str(w.get("단어", "")).strip()
-                if word:
-                    counter[word] += 1
+    # ✅ 서버 집계에서 10행만 조회 (실패하면 최근 50회 기록으로 직접 계산)
+    basis = "누적 기준"
+    try:
+        top10 = run_db(lambda: fetch_wrong_word_top(sb_authed_local, user_id_local, limit=10))
+    except Exception:
+        try:
+            top10 = run_db(lambda: fetch_wrong_word_top_from_attempts(sb_authed_local, user_id_local, limit=10))
+        except Exception:
+            top10 = []
+        basis = "최근 50회 기준"
 
-    if not counter:
+    if not top10:
         st.caption("아직 오답 데이터가 충분하지 않습니다. 몇 번 더 풀면 TOP10이 생겨요 🙂")
         return
 
-    top10 = counter.most_common(10)
-
     cards = []
     for i, (w, cnt) in enumerate(top10, start=1):
         cards.append(
@@ -1631,7 +3900,7 @@ def render_my_dashboard():
   <div class="top10-row">
     <div>
       <div class="top10-title">#{i} {w}</div>
-      <div class="top10-sub">최근 50회 기준</div>
+      <div class="top10-sub">{basis}</div>
     </div>
     <div class="top10-badge">오답 {cnt}회</div>
   </div>
@@ -1658,7 +3927,7 @@ def render_my_dashboard():
         # ✅✅ 핵심: 섞인 TOP10이면 무조건 mix로 출제
         st.session_state.pos_mode = "mix_adj"
 
-        retry_quiz = build_quiz_from_wrongs(weak_wrong_list, st.session_state.quiz_type)
+        retry_quiz = build_quiz_from_wrongs(vocab_snapshot(fresh=True), weak_wrong_list, st.session_state.quiz_type)
 
         # ✅ 정복 차단 해제
         k = mastery_key(qtype=st.session_state.quiz_type, pos_mode=st.session_state.get("pos_mode", "mix_adj"))
@@ -1673,7 +3942,7 @@ def render_my_dashboard():
 def reset_quiz_state_only():
     """✅ 퀴즈 진행상태만 초기화 (로그인/마이페이지/출석/통계는 유지)"""
     clear_question_widget_keys()
-    for k in ["quiz", "answers", "submitted", "wrong_list", "saved_this_attempt", "stats_saved_this_attempt",
+    for k in ["quiz", "answers", "submitted", "wrong_list", "attempt_id", "attempt_result",
               "session_stats_applied_this_attempt"]:
         st.session_state.pop(k, None)
 
@@ -1683,6 +3952,11 @@ def go_quiz_from_home():
     st.session_state["_scroll_top_once"] = True
 
 def nav_logout():
+    # ✅ 로그아웃 전에 대기 중인 진행상태 저장을 마저 반영
+    try:
+        flush_progress_now()
+    except Exception:
+        pass
     clear_auth_everywhere()
 
 def render_home():
@@ -1769,226 +4043,220 @@ def render_home():
 # ============================================================
 # ✅ 퀴즈 로직: (마이페이지에서도 쓰므로 라우팅보다 위에 있어야 함)
 # ============================================================
-def make_question(
-    row: pd.Series,
-    qtype: str,
-    base_pool_for_reading: pd.DataFrame,
-    distractor_pool: pd.DataFrame,
-) -> dict:
-    jp = row.get("jp_word")
-    rd = row.get("reading")
-    mn = row.get("meaning")
-    pos = str(row.get("pos", "") or "").strip().lower()
-
-    display_word = jp if pd.notna(jp) and str(jp).strip() != "" else rd
-
-    # ✅ (핵심) 혼합 품사에서도 보기(오답 후보)는 "해당 pos 안에서만" 뽑도록 풀을 필터링
-    def _filter_pos(df: pd.DataFrame) -> pd.DataFrame:
-        if (not pos) or (df is None) or ("pos" not in df.columns):
-            return df
-        return df[df["pos"].astype(str).str.strip().str.lower() == pos].copy()
-
-    base_pos = _filter_pos(base_pool_for_reading)
-    dist_pos = _filter_pos(distractor_pool)
-
-    def _enough_candidates(cands) -> bool:
-        try:
-            return len(cands) >= 3
-        except Exception:
-            return False
+QTYPE_FIELD = {"reading": "reading", "meaning": "meaning", "kr2jp": "jp_word"}
+MIX_RATIO = (("i_adj", 2), ("na_adj", 2), ("verb", 6))  # N=10 기준 2:2:6
 
-    if qtype == "reading":
-        prompt = f"{display_word}의 발음은?"
-        correct = row["reading"]
+def make_questions(
+    word_ids,
+    qtype: str,
+    vocab: VocabSnapshot,
+    pos_mode: str,
+    rng: np.random.Generator,
+) -> list[dict]:
+    """word_id 배열 → 문제 dict 리스트 (오답 3개 + 보기 섞기까지 한 번에 벡터 처리)"""
+    if qtype not in QTYPE_FIELD:
+        raise ValueError("Unknown qtype")
 
-        # ✅ pos 내부에서 먼저 후보 생성
-        candidates = (
-            base_pos.loc[base_pos["reading"] != correct, "reading"]
-            .dropna().drop_duplicates().tolist()
-        )
+    wids = np.asarray(word_ids, dtype=np.int64).ravel()
+    n_q = wids.size
+    if n_q == 0:
+        return []
 
-        # ✅ 부족하면 전체 풀로 fallback
-        if not _enough_candidates(candidates):
-            candidates = (
-                base_pool_for_reading.loc[base_pool_for_reading["reading"] != correct, "reading"]
-                .dropna().drop_duplicates().tolist()
-            )
+    field = QTYPE_FIELD[qtype]
+    words = vocab.words
+    level_norm = words["level"][wids[0]]
+    pos_arr = words["pos"][wids]
+    correct = words[field][wids]
+
+    # ✅ (핵심) 혼합 품사에서도 보기(오답 후보)는 "해당 pos 안에서만" 먼저 뽑고,
+    #    부족하면 현재 모드 전체 풀(mix_adj면 い/な/동사 전체)로 fallback
+    wrongs = np.empty((n_q, 3), dtype=object)
+    pending = np.arange(n_q)
+    for scope in ("pos", "mode"):
+        if pending.size == 0:
+            break
+        keys = pos_arr[pending] if scope == "pos" else np.full(pending.size, pos_mode, dtype=object)
+        still = []
+        for key in dict.fromkeys(keys.tolist()):
+            rows = pending[keys == key]
+            bucket = vocab.distractor_index.get((level_norm, key, field))
+            if bucket is None:
+                still.append(rows)
+                continue
+
+            values = bucket["values"]
+            ci = bucket["pos_of_word"][wids[rows]].astype(np.int64)
+            m = values.size - (ci >= 0)
+            ok = m >= 3
+            still.append(rows[~ok])
+            if not ok.any():
+                continue
+
+            picks = sample_distinct(rng, m[ok], 3)
+            ci_ok = ci[ok][:, None]
+            picks = np.where((ci_ok >= 0) & (picks >= ci_ok), picks + 1, picks)  # 정답 위치 건너뛰기
+            wrongs[rows[ok]] = values[picks]
+        pending = np.concatenate(still) if still else pending[:0]
+
+    if pending.size:
+        bad = pending[0]
+        raise ValueError(f"오답 후보 부족: 유형={qtype}, pos={pos_arr[bad]}")
+
+    choices = np.column_stack([wrongs, correct])
+    perm = rng.permuted(np.tile(np.arange(4), (n_q, 1)), axis=1)
+    choices = np.take_along_axis(choices, perm, axis=1).tolist()
+
+    return [question_dict(wid, qtype, choices[i], words) for i, wid in enumerate(wids.tolist())]
+
+def question_dict(word_id: int, qtype: str, choices: list, words) -> dict:
+    """word_id + 보기 목록 → st.session_state.quiz 한 문항 (progress 복원에서도 사용)"""
+    jp = words["jp_word"][word_id]
+    rd = words["reading"][word_id]
+    mn = words["meaning"][word_id]
+    display_word = jp or rd
 
+    if qtype == "reading":
+        prompt = f"{display_word}의 발음은?"
     elif qtype == "meaning":
         prompt = f"{display_word}의 뜻은?"
-        correct = row["meaning"]
-
-        candidates = (
-            dist_pos.loc[dist_pos["meaning"] != correct, "meaning"]
-            .dropna().drop_duplicates().tolist()
-        )
-        if not _enough_candidates(candidates):
-            candidates = (
-                distractor_pool.loc[distractor_pool["meaning"] != correct, "meaning"]
-                .dropna().drop_duplicates().tolist()
-            )
-
-    elif qtype == "kr2jp":
-        prompt = f"'{mn}'의 일본어는?"
-        correct = str(row["jp_word"]).strip()
-
-        # ✅ pos 내부에서 먼저 후보 생성
-        candidates = (
-            base_pos.loc[base_pos["jp_word"] != correct, "jp_word"]
-            .dropna().astype(str).str.strip()
-        )
-        candidates = [x for x in candidates.tolist() if x]
-        candidates = list(dict.fromkeys(candidates))
-
-        # ✅ 부족하면 전체 풀로 fallback
-        if not _enough_candidates(candidates):
-            candidates = (
-                base_pool_for_reading.loc[base_pool_for_reading["jp_word"] != correct, "jp_word"]
-                .dropna().astype(str).str.strip()
-            )
-            candidates = [x for x in candidates.tolist() if x]
-            candidates = list(dict.fromkeys(candidates))
-
     else:
-        raise ValueError("Unknown qtype")
-
-    if len(candidates) < 3:
-        st.error(f"오답 후보 부족: 유형={qtype}, pos={pos}, 후보={len(candidates)}개")
-        st.stop()
-
-    wrongs = random.sample(candidates, 3)
-    choices = wrongs + [correct]
-    random.shuffle(choices)
+        prompt = f"'{mn}'의 일본어는?"
 
     return {
         "prompt": prompt,
-        "choices": choices,
-        "correct_text": correct,
-        "jp_word": row.get("jp_word"),
-        "reading": row.get("reading"),
-        "meaning": row.get("meaning"),
-        "pos": row.get("pos"),
+        "choices": list(choices),
+        "correct_text": words[QTYPE_FIELD[qtype]][word_id],
+        "word_id": int(word_id),
+        "jp_word": jp,
+        "reading": rd,
+        "meaning": mn,
+        "pos": words["pos"][word_id],
         "qtype": qtype,
     }
 
-# ✅✅✅ [추가] 랜덤 N문항 생성 (세그먼트/새문제/세션초기화에서 공용)
-def build_quiz(qtype: str) -> list[dict]:
-    ensure_pools_ready()
-    ensure_mastered_words_shape()
-    ensure_excluded_wrong_words_shape()
-
-    pos_mode = st.session_state.get("pos_mode", "i_adj")
+def build_quizzes(
+    vocab: VocabSnapshot,
+    qtype: str,
+    pos_mode: str,
+    count: int = 1,
+    seed=None,
+    *,
+    blocked: np.ndarray | None = None,
+    review: np.ndarray | None = None,
+    fresh: dict | None = None,
+) -> list[list[dict]]:
+    """N문항 퀴즈 count개를 한 번에 생성 (st 호출 없음 → 미리 만들기/일괄 출력/부하 테스트용)
+
+    - blocked: word_id 비트셋(맞힌+틀린 단어 = 이미 본 단어). 새 단어는 여기서 제외
+    - review: 복습 시각이 된 word_id (급한 순). 퀴즈마다 앞에서부터 먼저 채우고 나머지는 새 단어
+    - fresh: {품사: (count, n) 새 단어 후보} (오답률 가중 추출 결과). 없으면 균등 추출
+    - 복습 + 새 단어가 N개 미만이면 [] (= 정복)
+    - 반환값의 각 원소는 st.session_state.quiz와 같은 모양의 list[dict]
+    """
+    if pos_mode not in POS_MODES:
+        pos_mode = "i_adj"
+    count = int(count)
+    if count <= 0:
+        return []
 
-    # --- 0) ✅ base를 무조건 먼저 정의 ---
-    if pos_mode == "i_adj":
-        base = pool_i
-    elif pos_mode == "na_adj":
-        base = pool_na
-    elif pos_mode == "verb":
-        base = pool_v
-    else:  # mix_adj
-        base = pd.concat([pool_i, pool_na, pool_v], ignore_index=True)
-
-    # --- 1) 유형에 따라 base_for_reading / distractor_pool 결정 ---
-    if qtype in ["reading", "kr2jp"]:
-        if pos_mode == "i_adj":
-            base_for_reading = pool_i_reading
-            distractor_pool = pool_i
-        elif pos_mode == "na_adj":
-            base_for_reading = pool_na_reading
-            distractor_pool = pool_na
-        elif pos_mode == "verb":
-            base_for_reading = pool_v_reading
-            distractor_pool = pool_v
+    rng = np.random.default_rng(seed)
+    kind = "reading" if qtype in ["reading", "kr2jp"] else "all"
+    pools = vocab.pools
+
+    def _eligible(ids: np.ndarray) -> np.ndarray:
+        # ✅ eligible = pool & ~blocked (벡터 연산 1번)
+        if blocked is None:
+            return ids
+        return ids[~blocked[ids]]
+
+    def _reviews(pool: np.ndarray) -> np.ndarray:
+        if review is None or len(review) == 0:
+            return np.empty(0, dtype=np.int32)
+        return review[np.isin(review, pool)]
+
+    def _fill(rv: np.ndarray, src: np.ndarray, n: int, fresh_rows: np.ndarray | None = None) -> np.ndarray | None:
+        # ✅ 퀴즈 i = 복습 rv[i*n:(i+1)*n] + 새 단어로 나머지
+        if fresh_rows is not None and fresh_rows.shape[0] >= count and not np.isin(fresh_rows, rv).any():
+            draws, k = fresh_rows.astype(np.int32, copy=False), fresh_rows.shape[1]
         else:
-            base_for_reading = pd.concat([pool_i_reading, pool_na_reading, pool_v_reading], ignore_index=True)
-            distractor_pool = pd.concat([pool_i, pool_na, pool_v], ignore_index=True)
-    else:
-        base_for_reading = base
-        distractor_pool = base
-
-    # --- 2) 'blocked' = (맞힌 단어 + 틀린 단어) 모두 제외 ---
-    k = mastery_key(qtype=qtype, pos_mode=st.session_state.get("pos_mode"))
-
-    mastered = st.session_state.get("mastered_words", {}).get(k, set())
-    excluded = st.session_state.get("excluded_wrong_words", {}).get(k, set())
-    blocked = set()
-    if mastered:
-        blocked |= set(mastered)
-    if excluded:
-        blocked |= set(excluded)
-
-    def _filter_blocked(df: pd.DataFrame) -> pd.DataFrame:
-        if not blocked:
-            return df
-        ks = (
-            df["jp_word"].astype(str).str.strip().replace({"": None})
-            .fillna(df["reading"].astype(str).str.strip())
-        )
-        return df[~ks.isin(blocked)].copy()
-
-    # ✅✅✅ 3) mix_adj는 2:2:6 강제 (여기서 끝내고 return)
+            src = src[~np.isin(src, rv)]
+            k = min(n, src.size)
+            draws = src[sample_distinct(rng, np.full(count, src.size), k)] if k else np.empty((count, 0), dtype=src.dtype)
+        rows = []
+        for i in range(count):
+            r = rv[i * n:(i + 1) * n]
+            need = n - r.size
+            if need > k:
+                break
+            rows.append(np.concatenate([r, draws[i, :need]]))
+        if not rows:
+            return None
+        return np.stack(rows)
+
+    # ✅✅✅ mix_adj는 2:2:6 강제
     if pos_mode == "mix_adj":
-        n_i, n_na, n_v = 2, 2, 6  # N=10 기준
+        parts = []
+        for pos, n in MIX_RATIO:
+            part = _fill(_reviews(pools[(pos, kind)]), _eligible(pools[(pos, kind)]), n, (fresh or {}).get(pos))
+            if part is None:  # ✅ 부족하면 '정복'
+                return []
+            parts.append(part)
+        n_rows = min(p.shape[0] for p in parts)
+        targets = np.concatenate([p[:n_rows] for p in parts], axis=1)
 
-        src_i  = _filter_blocked(pool_i_reading  if qtype in ["reading", "kr2jp"] else pool_i)
-        src_na = _filter_blocked(pool_na_reading if qtype in ["reading", "kr2jp"] else pool_na)
-        src_v  = _filter_blocked(pool_v_reading  if qtype in ["reading", "kr2jp"] else pool_v)
+    else:
+        rv = _reviews(pools[(pos_mode, kind)])
 
-        # ✅ 부족하면 '정복' 처리
-        if len(src_i) < n_i or len(src_na) < n_na or len(src_v) < n_v:
-            st.session_state.setdefault("mastery_done", {})
-            st.session_state.mastery_done[k] = True
+        # ✅ 정복 판정은 유형과 무관하게 전체 풀 기준 (복습 + 남은 새 단어 수)
+        base = pools[(pos_mode, "all")]
+        n_left = base.size if blocked is None else int(base.size - np.count_nonzero(blocked[base]))
+        if n_left + rv.size < N:
             return []
 
-        sampled = pd.concat(
-            [
-                src_i.sample(n=n_i, replace=False),
-                src_na.sample(n=n_na, replace=False),
-                src_v.sample(n=n_v, replace=False),
-            ],
-            ignore_index=True,
-        ).sample(frac=1).reset_index(drop=True)
-
-        # distractor 풀은 혼합 전체 풀 사용 (오답 보기 생성용이므로 blocked 적용 안 함)
-        base_for_q = (
-            pd.concat([pool_i_reading, pool_na_reading, pool_v_reading], ignore_index=True)
-            if qtype in ["reading", "kr2jp"]
-            else pd.concat([pool_i, pool_na, pool_v], ignore_index=True)
-        )
-        dist_for_q = pd.concat([pool_i, pool_na, pool_v], ignore_index=True)
+        src = _eligible(pools[(pos_mode, kind)])
+        fresh_rows = (fresh or {}).get(pos_mode)
+        if rv.size + src.size < N:
+            src = pools[(pos_mode, kind)]  # 읽기풀 자체가 너무 적으면 fallback
+            fresh_rows = None
+        targets = _fill(rv, src, N, fresh_rows)
+        if targets is None:
+            return []
 
-        quiz = [make_question(sampled.iloc[i], qtype, base_for_q, dist_for_q) for i in range(N)]
-        return quiz
+    targets = rng.permuted(targets, axis=1)
 
-    # --- 4) mix_adj가 아니면: 기존 방식대로 base에서 blocked 제외 후 샘플링 ---
-    base_filtered = _filter_blocked(base)
+    flat = make_questions(targets.ravel(), qtype, vocab, pos_mode, rng)
+    n_per = targets.shape[1]
+    return [flat[i * n_per:(i + 1) * n_per] for i in range(targets.shape[0])]
 
-    if len(base_filtered) < N:
-        st.session_state.setdefault("mastery_done", {})
-        st.session_state.mastery_done[k] = True
-        return []
+# ✅✅✅ [추가] 랜덤 N문항 생성 (세그먼트/새문제/세션초기화에서 공용)
+def build_quiz(vocab: VocabSnapshot, qtype: str) -> list[dict]:
+    """vocab = vocab_snapshot(fresh=True) (새 퀴즈 = 최신 단어 데이터)"""
+    ensure_mastered_words_shape()
+    ensure_excluded_wrong_words_shape()
 
-    # --- 5) 실제 샘플링 + 문제 생성 + return ---
-    if qtype in ["reading", "kr2jp"]:
-        base_for_reading_filtered = _filter_blocked(base_for_reading)
+    pos_mode = st.session_state.get("pos_mode", "i_adj")
 
-        if len(base_for_reading_filtered) < N:
-            base_for_reading_filtered = base_for_reading  # 읽기풀 자체가 너무 적으면 fallback
+    # ✅ 'blocked' = (맞힌 단어 + 틀린 단어) = 새 단어에서 제외, 그중 복습 시각이 된 단어는 먼저 출제
+    k = mastery_key(qtype=qtype, pos_mode=pos_mode)
+    blocked = blocked_bitset(k)
+    review, _ver = srs_due_for_quiz(qtype, pos_mode)
+    fresh = weighted_fresh_ids(qtype, pos_mode, blocked)
 
-        sampled = base_for_reading_filtered.sample(n=N, replace=False).reset_index(drop=True)
-        base_for_q = base_for_reading
-        dist_for_q = distractor_pool
-    else:
-        sampled = base_filtered.sample(n=N, replace=False).reset_index(drop=True)
-        base_for_q = base_for_reading
-        dist_for_q = distractor_pool
+    try:
+        quizzes = build_quizzes(vocab, qtype, pos_mode, count=1, blocked=blocked, review=review, fresh=fresh)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
 
-    quiz = [make_question(sampled.iloc[i], qtype, base_for_q, dist_for_q) for i in range(N)]
-    return quiz
+    st.session_state.setdefault("mastery_done", {})
+    if not quizzes:
+        st.session_state.mastery_done[k] = True
+        return []
+
+    st.session_state.mastery_done[k] = False
+    return quizzes[0]
 
-def build_quiz_from_wrongs(wrong_list: list, qtype: str) -> list:
-    ensure_pools_ready()
+def build_quiz_from_wrongs(vocab: VocabSnapshot, wrong_list: list, qtype: str) -> list:
 
     wrong_words = []
     for w in (wrong_list or []):
@@ -2002,32 +4270,100 @@ def build_quiz_from_wrongs(wrong_list: list, qtype: str) -> list:
         return []
 
     pos_mode = st.session_state.get("pos_mode", "i_adj")
+    if pos_mode not in POS_MODES:
+        pos_mode = "i_adj"
 
-    if pos_mode == "i_adj":
-        base = pool_i
-        base_for_distractor = pool_i
-    elif pos_mode == "na_adj":
-        base = pool_na
-        base_for_distractor = pool_na
-    elif pos_mode == "verb":
-        base = pool_v
-        base_for_distractor = pool_v
-    else:
-        base = pd.concat([pool_i, pool_na, pool_v], ignore_index=True)
-        base_for_distractor = base
-
-    retry_df = base[(base["jp_word"].isin(wrong_words)) | (base["reading"].isin(wrong_words))].copy()
+    base = vocab.pools[(pos_mode, "all")]
+    hit = np.isin(vocab.words["jp_word"][base], wrong_words) | np.isin(vocab.words["reading"][base], wrong_words)
+    retry_ids = base[hit]
 
-    if len(retry_df) == 0:
+    if len(retry_ids) == 0:
         st.error("오답 단어를 풀에서 찾지 못했습니다. (jp_word/reading 매칭 확인)")
         st.stop()
 
-    retry_df = retry_df.sample(frac=1).reset_index(drop=True)
+    rng = np.random.default_rng()
+    try:
+        return make_questions(rng.permutation(retry_ids), qtype, vocab, pos_mode, rng)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+
+# ============================================================
+# ✅ 다음 퀴즈 미리 만들기(prefetch)
+#    - 퀴즈 시작/제출 시점의 (품사, 유형, 제외 비트셋)으로 백그라운드에서 1세트 생성
+#    - "새 문제"/"다음 10문항"은 준비된 퀴즈를 바로 꺼내 씀 (조건이 다르면 버리고 새로 생성)
+# ============================================================
+@st.cache_resource(show_spinner=False)
+def _quiz_prefetch_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="quiz_prefetch")
 
-    return [
-        make_question(retry_df.iloc[i], qtype, base_for_distractor, base_for_distractor)
-        for i in range(len(retry_df))
-    ]
+def invalidate_quiz_prefetch():
+    pf = st.session_state.pop("_quiz_prefetch", None)
+    if pf and pf.get("future") is not None:
+        pf["future"].cancel()
+
+def schedule_quiz_prefetch(qtype: str | None = None):
+    vocab = vocab_snapshot()  # 불변 객체 → 백그라운드 스레드에 그대로 넘김
+
+    qtype = qtype or st.session_state.get("quiz_type", "reading")
+    pos_mode = st.session_state.get("pos_mode", "i_adj")
+    blocked = blocked_bitset(mastery_key(qtype=qtype, pos_mode=pos_mode))  # 현재 시점 스냅샷(복사본)
+    review, srs_ver = srs_due_for_quiz(qtype, pos_mode)  # 힙/Fenwick 트리는 여기(메인 스레드)서만 만짐
+    fresh = weighted_fresh_ids(qtype, pos_mode, blocked)
+
+    invalidate_quiz_prefetch()
+    try:
+        fut = _quiz_prefetch_executor().submit(
+            build_quizzes, vocab, qtype, pos_mode, 1, None, blocked=blocked, review=review, fresh=fresh
+        )
+    except RuntimeError:
+        return
+
+    st.session_state["_quiz_prefetch"] = {
+        "level": current_level(),
+        "vocab_version": vocab.version,
+        "pos_mode": pos_mode,
+        "qtype": qtype,
+        "blocked": blocked,
+        "srs_ver": srs_ver,
+        "future": fut,
+    }
+
+def take_prefetched_quiz(qtype: str) -> list[dict] | None:
+    pf = st.session_state.pop("_quiz_prefetch", None)
+    if not pf:
+        return None
+
+    k = mastery_key(qtype=qtype, pos_mode=st.session_state.get("pos_mode", "i_adj"))
+    if (
+        pf.get("qtype") != qtype
+        or pf.get("level") != current_level()
+        or pf.get("vocab_version") != latest_vocab(current_level()).version
+        or pf.get("pos_mode") != st.session_state.get("pos_mode", "i_adj")
+        or not np.array_equal(pf.get("blocked"), blocked_bitset(k))
+        or pf.get("srs_ver") != srs_state(k)["ver"]
+    ):
+        pf["future"].cancel()
+        return None
+
+    try:
+        quizzes = pf["future"].result(timeout=5)
+    except Exception:
+        return None
+
+    if not quizzes or not quizzes[0]:
+        return None
+    # build_quiz와 같게: 문제가 있는 퀴즈로 바꿔 끼우면 "전부 맞힘" 표시는 해제
+    st.session_state.setdefault("mastery_done", {})
+    st.session_state.mastery_done[k] = False
+    return quizzes[0]
+
+def next_quiz(qtype: str) -> list[dict]:
+    """미리 만든 퀴즈가 있으면 그걸, 없으면 바로 생성"""
+    quiz = take_prefetched_quiz(qtype)
+    if quiz is None:
+        quiz = build_quiz(vocab_snapshot(fresh=True), qtype)
+    return quiz
 # ============================================================
 # ✅ 라우팅 (함수 정의 후, 여기서만 화면 전환)
 # ============================================================
@@ -2113,10 +4449,10 @@ if "submitted" not in st.session_state:
     st.session_state.submitted = False
 if "wrong_list" not in st.session_state:
     st.session_state.wrong_list = []
-if "saved_this_attempt" not in st.session_state:
-    st.session_state.saved_this_attempt = False
-if "stats_saved_this_attempt" not in st.session_state:
-    st.session_state.stats_saved_this_attempt = False
+if "attempt_id" not in st.session_state:
+    st.session_state.attempt_id = None
+if "attempt_result" not in st.session_state:
+    st.session_state.attempt_result = None
 if "session_stats_applied_this_attempt" not in st.session_state:
     st.session_state.session_stats_applied_this_attempt = False
 
@@ -2134,7 +4470,9 @@ if "total_counter" not in st.session_state:
     st.session_state.total_counter = {}
 
 if "quiz" not in st.session_state:
-    st.session_state.quiz = build_quiz(st.session_state.quiz_type) or []
+    st.session_state.quiz = build_quiz(vocab_snapshot(fresh=True), st.session_state.quiz_type) or []
+    if st.session_state.quiz:
+        schedule_quiz_prefetch(st.session_state.quiz_type)
 
 k_now = mastery_key()
 is_mastered_done = st.session_state.get("mastery_done", {}).get(k_now, False)
@@ -2143,7 +4481,7 @@ is_mastered_done = st.session_state.get("mastery_done", {}).get(k_now, False)
 if (not is_mastered_done) and (not isinstance(st.session_state.quiz, list) or len(st.session_state.quiz) == 0):
     st.warning("문제가 0개라서 새로 생성합니다. (데이터/필터 조건 확인 필요)")
     clear_question_widget_keys()
-    st.session_state.quiz = build_quiz(st.session_state.quiz_type) or []
+    st.session_state.quiz = build_quiz(vocab_snapshot(fresh=True), st.session_state.quiz_type) or []
     st.session_state.submitted = False
 
     if len(st.session_state.quiz) == 0:
@@ -2151,9 +4489,21 @@ if (not is_mastered_done) and (not isinstance(st.session_state.quiz, list) or le
         st.stop()
     
 # ============================================================
-# ✅ 상단 UI (품사 / 출제유형)
+# ✅ 상단 UI (레벨 / 품사 / 출제유형)
 # ============================================================
 
+l0, r0 = st.columns([0.8, 9.2], vertical_alignment="center")
+with l0:
+    st.markdown('<div class="seglabel">레벨</div>', unsafe_allow_html=True)
+with r0:
+    level_clicked = st.segmented_control(
+        label="",
+        options=catalog_levels(),
+        format_func=lambda x: ("✅ " + x if x == st.session_state.level else x),
+        default=st.session_state.level,
+        key="seg_level",
+    )
+
 colL, colR = st.columns(2, gap="small")
 
 # --- 왼쪽: 품사 ---
@@ -2197,16 +4547,26 @@ with colR:
         )
 
 # ✅ 변경 감지 로직은 그대로 (아래는 기존과 동일)
+if level_clicked and level_clicked != st.session_state.level:
+    st.session_state.level = level_clicked  # 새 레벨 파티션은 여기서 처음 로드됨
+    clear_question_widget_keys()
+    invalidate_quiz_prefetch()
+    new_quiz = build_quiz(vocab_snapshot(fresh=True), st.session_state.quiz_type)
+    start_quiz_state(new_quiz, st.session_state.quiz_type, clear_wrongs=True)
+    st.rerun()
+
 if pos_clicked and pos_clicked != st.session_state.pos_mode:
     st.session_state.pos_mode = pos_clicked
     clear_question_widget_keys()
-    new_quiz = build_quiz(st.session_state.quiz_type)  # 현재 유형 유지
+    invalidate_quiz_prefetch()
+    new_quiz = build_quiz(vocab_snapshot(fresh=True), st.session_state.quiz_type)  # 현재 유형 유지
     start_quiz_state(new_quiz, st.session_state.quiz_type, clear_wrongs=True)
     st.rerun()
 
 if clicked and clicked != st.session_state.quiz_type:
     clear_question_widget_keys()
-    new_quiz = build_quiz(clicked)
+    invalidate_quiz_prefetch()
+    new_quiz = build_quiz(vocab_snapshot(fresh=True), clicked)
     start_quiz_state(new_quiz, clicked, clear_wrongs=True)
     st.rerun()
 
@@ -2223,12 +4583,16 @@ with cbtn1:
     if st.button("🔄 새 문제(랜덤 10문항)", use_container_width=True, key="btn_new_random_10"):
         k_now = mastery_key()
         if st.session_state.get("mastery_done", {}).get(k_now, False):
-            # ✅ 여기서 안내 띄우지 말고, 그냥 스크롤+리런만
+            # ✅ 그사이 복습 시각이 된 단어가 있으면 다시 출제, 없으면 스크롤+리런만
+            new_quiz = build_quiz(vocab_snapshot(fresh=True), st.session_state.quiz_type)
+            if new_quiz:
+                clear_question_widget_keys()
+                start_quiz_state(new_quiz, st.session_state.quiz_type, clear_wrongs=True)
             st.session_state["_scroll_top_once"] = True
             st.rerun()
 
         clear_question_widget_keys()
-        new_quiz = build_quiz(st.session_state.quiz_type)
+        new_quiz = next_quiz(st.session_state.quiz_type)
         start_quiz_state(new_quiz, st.session_state.quiz_type, clear_wrongs=True)
         st.session_state["_scroll_top_once"] = True
         st.rerun()
@@ -2238,26 +4602,54 @@ with cbtn2:
         ensure_mastered_words_shape()
         k_now = mastery_key()
 
-        # ✅ 여기 1줄만 남기면 됩니다 (중복 제거)
-        st.session_state.mastered_words[k_now] = set()
+        # ✅ 맞힌 단어를 다시 새 단어로 (복습 일정도 같이 지움)
+        mastered_now = word_bitset("mastered_words", k_now)
+        srs_forget(srs_state(k_now), mastered_now.copy())
+        mastered_now[:] = False
+        enqueue_bitsets_save(k_now)
+        invalidate_quiz_prefetch()
 
         # ✅ 조합키 기준으로 통일
         st.session_state.mastery_banner_shown[k_now] = False
         st.session_state.mastery_done[k_now] = False
 
         clear_question_widget_keys()
-        new_quiz = build_quiz(st.session_state.quiz_type)
+        new_quiz = build_quiz(vocab_snapshot(fresh=True), st.session_state.quiz_type)
         start_quiz_state(new_quiz, st.session_state.quiz_type, clear_wrongs=True)
 
         st.success(f"초기화 완료 (유형: {quiz_label_map[st.session_state.quiz_type]})")
         st.session_state["_scroll_top_once"] = True
         st.rerun()
 
+if st.button("❌ 틀린 단어 제외 초기화", use_container_width=True, key="btn_reset_excluded_current_type"):
+    ensure_excluded_wrong_words_shape()
+    k_now = mastery_key()
+
+    # ✅ 틀려서 빠져 있던 단어를 다시 새 단어로 (맞힌 적 없는 단어의 복습 일정도 지움)
+    mastered_now = word_bitset("mastered_words", k_now)
+    excluded_now = word_bitset("excluded_wrong_words", k_now)
+    srs_forget(srs_state(k_now), excluded_now & ~mastered_now)
+    excluded_now[:] = False
+    enqueue_bitsets_save(k_now)
+    invalidate_quiz_prefetch()
+
+    ensure_mastery_banner_shape()
+    st.session_state.mastery_banner_shown[k_now] = False
+    st.session_state.mastery_done[k_now] = False
+
+    clear_question_widget_keys()
+    new_quiz = build_quiz(vocab_snapshot(fresh=True), st.session_state.quiz_type)
+    start_quiz_state(new_quiz, st.session_state.quiz_type, clear_wrongs=True)
+
+    st.session_state["_scroll_top_once"] = True
+    st.rerun()
+
 # ✅✅✅ (추가) 정복 안내 (1안+2안)
 k_now = mastery_key()
 if st.session_state.get("mastery_done", {}).get(k_now, False):
     st.success("🏆 이 유형을 완전히 정복했어요!")  # ✅ 1안
-    st.caption("👉 다른 품사/유형을 선택하거나, '맞힌 단어 제외 초기화'로 다시 시작할 수 있어요.")  # ✅ 2안
+    st.caption("👉 다른 품사/유형을 선택하거나, '맞힌 단어 제외 초기화' / '틀린 단어 제외 초기화'로 다시 시작할 수 있어요.")  # ✅ 2안
+    st.caption("⏰ 복습할 때가 된 단어가 생기면 '새 문제'로 다시 풀 수 있어요.")
         
 # ============================================================
 # ✅ answers 길이 자동 맞춤 (quiz 안전 보정)
@@ -2267,7 +4659,7 @@ if "quiz" not in st.session_state or not isinstance(st.session_state.quiz, list)
     
 # (빈 리스트면 새로 생성)
 if len(st.session_state.quiz) == 0:
-    st.session_state.quiz = build_quiz(st.session_state.quiz_type) or []
+    st.session_state.quiz = build_quiz(vocab_snapshot(fresh=True), st.session_state.quiz_type) or []
 
 quiz_len = len(st.session_state.quiz)
 
@@ -2293,7 +4685,7 @@ for idx, q in enumerate(st.session_state.quiz):
         unsafe_allow_html=True,
     )
 
-    widget_key = f"q_{st.session_state.quiz_version}_{idx}"
+    widget_key = question_widget_key(idx)
 
     prev = st.session_state.answers[idx]
     default_index = None
@@ -2321,11 +4713,41 @@ all_answered = (quiz_len > 0) and all(a is not None for a in st.session_state.an
 
 if st.button("✅ 제출하고 채점하기", disabled=not all_answered, type="primary", use_container_width=True, key="btn_submit"):
     st.session_state.submitted = True
+    st.session_state.attempt_id = new_attempt_id()
+    st.session_state.attempt_result = None
     st.session_state.session_stats_applied_this_attempt = False
 
+    # ✅ 제출 시점의 진행상태는 큐를 기다리지 않고 바로 반영
+    try:
+        flush_progress_now()
+    except Exception:
+        pass
+
 if not all_answered:
     st.info("모든 문제에 답을 선택하면 제출 버튼이 활성화됩니다.")
 
+# ✅ 제출 저장 상태 (outbox): 대기 중이면 이 조각만 주기적으로 다시 그려서 확인 (스크립트는 기다리지 않음)
+@st.fragment(run_every=OUTBOX_STATUS_POLL_SEC)
+def render_submit_status(attempt_id: str, user_id: str):
+    try:
+        status, _result = outbox_status(attempt_id)
+    except sqlite3.Error:
+        status = None
+    if status in ("done", None):
+        st.rerun()  # 끝났으면 전체를 다시 그려서 결과/최근 기록 표시
+
+    if status == "failed":
+        st.error("❌ 기록을 저장하지 못했어요. 다시 저장을 눌러 주세요.")
+        if st.button("🔁 다시 저장", key=f"btn_outbox_retry_{attempt_id}"):
+            try:
+                outbox_retry(attempt_id, user_id, st.session_state.get("access_token"))
+            except sqlite3.Error as e:
+                st.warning(f"다시 저장에 실패했습니다: {e}")
+            else:
+                st.rerun(scope="fragment")
+    else:
+        st.info("⏳ 기록을 저장하는 중이에요. 서버가 바쁘면 잠시 뒤 자동으로 저장됩니다.")
+
 # ============================================================
 # ✅ 제출 후 화면
 # ============================================================
@@ -2347,17 +4769,13 @@ if st.session_state.submitted:
 
         word_key = (str(q.get("jp_word", "")).strip() or str(q.get("reading", "")).strip())
 
+        if word_key:
+            mark_word_result(k_now, q.get("word_id"), word_key, picked == correct)
+
         if picked == correct:
             score += 1
-            if word_key:
-                # ✅ 맞힌 단어 기록
-                st.session_state.mastered_words.setdefault(k_now, set()).add(word_key)
 
         else:
-            if word_key:
-                # ✅ 틀린 단어는 랜덤 출제에서 제외
-                st.session_state.excluded_wrong_words.setdefault(k_now, set()).add(word_key)
-
             word_display = (str(q.get("jp_word", "")).strip() or str(q.get("reading", "")).strip())
             wrong_list.append(
                 {
@@ -2394,78 +4812,93 @@ if st.session_state.submitted:
         if show_post_ui:
             st.warning("DB 저장/조회용 토큰이 없습니다. 다시 로그인해 주세요.")
     else:
-        if not st.session_state.saved_this_attempt:
-            def _save():
-                return save_attempt_to_db(
-                    sb_authed=sb_authed_local,
-                    user_id=user_id,
+        # ✅ 기록 + 단어 통계 = submit_attempt 1번, outbox를 거쳐 백그라운드로 (attempt_id로 멱등)
+        if not st.session_state.get("attempt_id"):
+            st.session_state.attempt_id = new_attempt_id()  # 예전 progress에서 복원된 제출 상태
+        attempt_id = st.session_state.attempt_id
+        result = st.session_state.get("attempt_result")
+
+        if not (isinstance(result, dict) and result.get("attempt_id") == attempt_id):
+            def _payload():
+                # (중요) 위젯 값이 answers와 100% 동기화되게
+                sync_answers_from_widgets()
+
+                attempt = build_attempt_payload(
+                    attempt_id=attempt_id,
                     user_email=user_email,
-                    level=LEVEL,
+                    level=current_level(),
                     quiz_type=current_type,
                     quiz_len=quiz_len,
                     score=score,
                     wrong_list=wrong_list,
+                    pos_mode=st.session_state.get("pos_mode", "i_adj"),
                 )
-            try:
-                run_db(_save)
-                st.session_state.saved_this_attempt = True
-            except Exception as e:
-                if show_post_ui:
-                    st.warning("DB 저장에 실패했습니다. (테이블/컬럼/권한/RLS 정책 확인 필요)")
-                    st.write(str(e))
-
-        if not st.session_state.stats_saved_this_attempt:
-            def _save_stats_bulk():
-                # (중요) 위젯 값이 answers와 100% 동기화되게
-                sync_answers_from_widgets()
-
                 items = build_word_results_bulk_payload(
                     quiz=st.session_state.quiz,
                     answers=st.session_state.answers,
                     quiz_type=current_type,
-                    level=LEVEL,
+                    level=current_level(),
                 )
-
-                if not items:
-                    return None
-
-                # ✅ RPC 1번 호출로 끝
-                return sb_authed_local.rpc(
-                    "record_word_results_bulk",
-                    {"p_items": items},
-                ).execute()
+                return attempt, items
 
             try:
-                run_db(_save_stats_bulk)
-                st.session_state.stats_saved_this_attempt = True
-                if show_post_ui:
-                    st.success("✅ 단어 통계(bulk) 저장 성공")
-            except Exception as e:
+                # ✅ 처음 한 번만 넣고 기다리지 않음 → 저장 상태는 render_submit_status가 따로 확인
+                status, result = outbox_status(attempt_id)
+                if status is None:
+                    outbox_put(user_id, st.session_state.get("access_token"), *_payload())
+                    status, result = "pending", None
+            except sqlite3.Error as e:
+                # 로컬 outbox를 못 쓰면(디스크 등) 예전처럼 바로 DB로
+                status, result = None, None
+                try:
+                    result = run_db(lambda: submit_attempt_to_db(sb_authed_local, *_payload()))
+                    status = "done"
+                    invalidate_attempt_history(user_id)
+                except Exception as e2:
+                    st.warning("기록을 저장하지 못했어요. 잠시 뒤 다시 제출해 주세요.")
+                    if show_post_ui:
+                        st.write(f"{e} / {e2}")
+
+            if status == "done" and isinstance(result, dict):
+                result = {**result, "attempt_id": attempt_id}
+                st.session_state.attempt_result = result
                 if show_post_ui:
-                    st.error("❌ 단어 통계(bulk) 저장 실패 (아래 에러가 진짜 원인입니다)")
-                    st.exception(e)
+                    st.success("✅ 기록 + 단어 통계 저장 성공")
+            elif status in ("pending", "need_token", "failed"):
+                result = None
+                render_submit_status(attempt_id, user_id)  # 관리자만이 아니라 모든 유저에게
 
         # ✅ 아래는 전부 "보여주기"에 해당하므로 show_post_ui로 한번에 묶기
         if show_post_ui:
             st.subheader("📌 내 최근 기록")
 
+            # ✅ submit_attempt가 돌려준 집계가 있으면 그대로 (추가 조회 없음)
+            recent = (result or {}).get("recent") if isinstance(result, dict) else None
+
             def _fetch_hist():
-                return fetch_recent_attempts(sb_authed_local, user_id, limit=10)
+                return get_recent_attempts(sb_authed_local, user_id, limit=10)
 
             try:
-                res = run_db(_fetch_hist)
-                if not res.data:
+                if not recent:
+                    rows = run_db(_fetch_hist)
+                    if rows:
+                        hist = pd.DataFrame(rows).copy()
+                        rate = (hist["score"] / hist["quiz_len"]).fillna(0.0)
+                        recent = {
+                            "n": len(hist),
+                            "avg_rate": float(rate.mean()),
+                            "best": int(hist["score"].max()),
+                            "last_score": int(hist.iloc[0]["score"]),
+                            "last_total": int(hist.iloc[0]["quiz_len"]),
+                        }
+
+                if not recent or not recent.get("n"):
                     st.info("아직 저장된 기록이 없습니다. 문제를 풀고 제출하면 기록이 쌓여요.")
                 else:
-                    hist = pd.DataFrame(res.data).copy()
-                    hist["created_at"] = to_kst_naive(hist["created_at"])
-                    hist["유형"] = hist["pos_mode"].map(lambda x: quiz_label_for_table.get(x, x))
-                    hist["정답률"] = (hist["score"] / hist["quiz_len"]).fillna(0.0)
-
-                    avg_rate = float(hist["정답률"].mean() * 100)
-                    best = int(hist["score"].max())
-                    last_score = int(hist.iloc[0]["score"])
-                    last_total = int(hist.iloc[0]["quiz_len"])
+                    avg_rate = float(recent.get("avg_rate") or 0.0) * 100
+                    best = int(recent.get("best") or 0)
+                    last_score = int(recent.get("last_score") or 0)
+                    last_total = int(recent.get("last_total") or 0)
 
                     c1, c2, c3 = st.columns(3)
                     c1.metric("최근 10회 평균", f"{avg_rate:.0f}%")
@@ -2479,6 +4912,14 @@ if st.session_state.submitted:
     if not st.session_state.session_stats_applied_this_attempt:
         st.session_state.history.append({"type": current_type, "score": score, "total": quiz_len})
 
+        # ✅ 간격 반복 일정 + 오답률 가중치 갱신 (prefetch보다 먼저)
+        srs_review_quiz(k_now, st.session_state.quiz, st.session_state.answers)
+        update_word_stats_local(current_type, st.session_state.quiz, st.session_state.answers)
+        enqueue_bitsets_save(k_now)
+
+        # ✅ 제출 시점의 맞힌/틀린 단어 스냅샷으로 "다음 10문항"을 미리 생성
+        schedule_quiz_prefetch(current_type)
+
         for idx, q in enumerate(st.session_state.quiz):
             word_key = (str(q.get("jp_word", "")).strip() or str(q.get("reading", "")).strip())
             st.session_state.total_counter[word_key] = st.session_state.total_counter.get(word_key, 0) + 1
@@ -2579,6 +5020,7 @@ if st.session_state.submitted and st.session_state.wrong_list:
     ):
         clear_question_widget_keys()
         retry_quiz = build_quiz_from_wrongs(
+            vocab_snapshot(fresh=True),
             st.session_state.wrong_list,
             st.session_state.quiz_type,
         )
@@ -2595,7 +5037,7 @@ if st.session_state.submitted:
         key="btn_next_10",
     ):
         clear_question_widget_keys()
-        new_quiz = build_quiz(st.session_state.quiz_type)
+        new_quiz = next_quiz(st.session_state.quiz_type)
         start_quiz_state(new_quiz, st.session_state.quiz_type, clear_wrongs=True)
         st.session_state["_scroll_top_once"] = True
         st.rerun()
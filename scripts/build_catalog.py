@@ -0,0 +1,80 @@
+"""단어 카탈로그 빌드
+
+- data/catalog/<레벨>/<품사>.csv 파티션 + data/catalog/manifest.json(행 수/sha256)
+- 원본 CSV(level,pos,jp_word,reading,meaning)를 주면 (레벨, 품사)별 파티션으로 나눠 씀
+  (원본에 있는 파티션만 덮어씀, 나머지는 그대로)
+- 인자가 없으면 디스크의 파티션으로 manifest만 다시 만듦
+- 마지막에 모든 파티션을 .arrow로 컴파일 (앱은 이 파일을 memory map으로 읽음)
+
+    python scripts/build_catalog.py data/new_words.csv
+    python scripts/build_catalog.py
+"""
+from pathlib import Path
+import hashlib
+import json
+import sys
+
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from vocab_catalog import LEVEL_ORDER, POS_ORDER, READ_KW, WORD_COLUMNS, compile_partition, ordered  # noqa: E402
+
+CATALOG_DIR = BASE_DIR / "data" / "catalog"
+
+
+def split_source(src: Path):
+    df = pd.read_csv(src, **READ_KW)
+    missing = set(WORD_COLUMNS) - set(df.columns)
+    if missing:
+        raise SystemExit(f"{src}: 필수 컬럼 누락 {sorted(missing)}")
+
+    df = df[list(WORD_COLUMNS)].copy()
+    df["level"] = df["level"].astype(str).str.strip().str.upper()
+    df["pos"] = df["pos"].astype(str).str.strip().str.lower()
+
+    for (level, pos), part in df.groupby(["level", "pos"], sort=False):
+        out = CATALOG_DIR / level / f"{pos}.csv"
+        out.parent.mkdir(parents=True, exist_ok=True)
+        part.to_csv(out, index=False, lineterminator="\n")
+        print(f"{out.relative_to(BASE_DIR)}: {len(part)}행")
+
+
+def build_manifest() -> dict:
+    levels = {}
+    for level_dir in CATALOG_DIR.iterdir():
+        if not level_dir.is_dir():
+            continue
+        parts = {}
+        for path in level_dir.glob("*.csv"):
+            raw = path.read_bytes()
+            rows = len(pd.read_csv(path, **READ_KW))
+            parts[path.stem] = {
+                "file": f"{level_dir.name}/{path.name}",
+                "rows": rows,
+                "sha256": hashlib.sha256(raw).hexdigest(),
+            }
+        if parts:
+            levels[level_dir.name] = {pos: parts[pos] for pos in ordered(parts, POS_ORDER)}
+
+    manifest = {"version": 1, "levels": {lv: levels[lv] for lv in ordered(levels, LEVEL_ORDER)}}
+    (CATALOG_DIR / "manifest.json").write_text(
+        json.dumps(manifest, ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
+    )
+    return manifest
+
+
+def main(argv: list[str]):
+    CATALOG_DIR.mkdir(parents=True, exist_ok=True)
+    for src in argv:
+        split_source(Path(src))
+    manifest = build_manifest()
+    for level, parts in manifest["levels"].items():
+        for entry in parts.values():
+            compile_partition(CATALOG_DIR, entry)
+        print(level, {pos: p["rows"] for pos, p in parts.items()})
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,125 @@
+-- ============================================================
+-- 유저별 단어 정답/오답 누적 집계 (마이페이지 "자주 틀린 단어 TOP10"용)
+--   - record_word_results_bulk 호출과 같은 트랜잭션에서 갱신
+--   - 대시보드는 user_wrong_word_top 뷰에서 10행만 읽음 (기록 수와 무관)
+-- ============================================================
+
+create table if not exists public.user_word_agg (
+  user_id        uuid        not null references auth.users (id) on delete cascade,
+  word_key       text        not null,
+  quiz_type      text        not null,
+  level          text,
+  pos            text,
+  seen_count     integer     not null default 0,
+  wrong_count    integer     not null default 0,
+  backfilled_wrong integer   not null default 0,   -- 아래 백필분 (본 횟수를 모르는 오답 수)
+  last_seen_at   timestamptz,
+  last_wrong_at  timestamptz,
+  primary key (user_id, word_key, quiz_type)
+);
+
+alter table public.user_word_agg enable row level security;
+
+drop policy if exists "user_word_agg_select_own" on public.user_word_agg;
+create policy "user_word_agg_select_own" on public.user_word_agg
+  for select using (auth.uid() = user_id);
+
+drop policy if exists "user_word_agg_delete_own" on public.user_word_agg;
+create policy "user_word_agg_delete_own" on public.user_word_agg
+  for delete using (auth.uid() = user_id);
+
+-- ------------------------------------------------------------
+-- 집계 갱신 (p_items: [{word_key, level, pos, quiz_type, is_correct}, ...])
+-- ------------------------------------------------------------
+create or replace function public.bump_user_word_agg(p_items jsonb)
+returns void
+language sql
+security definer
+set search_path = public
+as $$
+  insert into public.user_word_agg as a
+    (user_id, word_key, quiz_type, level, pos, seen_count, wrong_count, last_seen_at, last_wrong_at)
+  select
+    auth.uid(),
+    x.word_key,
+    x.quiz_type,
+    max(x.level),
+    max(x.pos),
+    count(*),
+    count(*) filter (where not x.is_correct),
+    now(),
+    case when bool_or(not x.is_correct) then now() end
+  from jsonb_to_recordset(p_items) as x(word_key text, level text, pos text, quiz_type text, is_correct boolean)
+  where auth.uid() is not null
+    and coalesce(x.word_key, '') <> ''
+  group by x.word_key, x.quiz_type
+  on conflict (user_id, word_key, quiz_type) do update set
+    level         = excluded.level,
+    pos           = excluded.pos,
+    seen_count    = a.seen_count + excluded.seen_count,
+    wrong_count   = a.wrong_count + excluded.wrong_count,
+    last_seen_at  = excluded.last_seen_at,
+    last_wrong_at = coalesce(excluded.last_wrong_at, a.last_wrong_at);
+$$;
+
+revoke all on function public.bump_user_word_agg(jsonb) from public, anon;
+grant execute on function public.bump_user_word_agg(jsonb) to authenticated;
+
+-- ------------------------------------------------------------
+-- 기존 record_word_results_bulk를 감싸서 같은 호출에서 집계도 갱신
+-- (기존 함수 본문은 record_word_results_bulk_base로 이름만 바꿔 그대로 사용)
+-- ------------------------------------------------------------
+alter function public.record_word_results_bulk(jsonb) rename to record_word_results_bulk_base;
+
+create function public.record_word_results_bulk(p_items jsonb)
+returns void
+language plpgsql
+security invoker
+set search_path = public
+as $$
+begin
+  perform public.record_word_results_bulk_base(p_items);
+  perform public.bump_user_word_agg(p_items);
+end;
+$$;
+
+grant execute on function public.record_word_results_bulk(jsonb) to authenticated;
+
+-- ------------------------------------------------------------
+-- TOP10 조회용 뷰 (유형 합산)
+-- ------------------------------------------------------------
+create or replace view public.user_wrong_word_top
+with (security_invoker = true) as
+select
+  user_id,
+  word_key,
+  sum(wrong_count)::integer as wrong_count,
+  max(last_wrong_at)        as last_wrong_at
+from public.user_word_agg
+where wrong_count > 0
+group by user_id, word_key;
+
+-- ------------------------------------------------------------
+-- 기존 기록(quiz_attempts.wrong_list)으로 오답 수 백필
+--   - wrong_list에는 틀린 단어만 있어서 본 횟수(seen)를 알 수 없음
+--     → seen = wrong = backfilled_wrong으로 넣고, 앱은 오답률을
+--       (wrong - backfilled_wrong) / (seen - backfilled_wrong)로 계산 (가중 샘플링이 쏠리지 않게)
+--   - TOP10(wrong_count)은 실제로 틀린 횟수이므로 그대로
+-- ------------------------------------------------------------
+insert into public.user_word_agg as a
+  (user_id, word_key, quiz_type, level, seen_count, wrong_count, backfilled_wrong, last_seen_at, last_wrong_at)
+select
+  q.user_id,
+  trim(w ->> '단어'),
+  coalesce(w ->> '유형', q.pos_mode),
+  max(q.level),
+  count(*),
+  count(*),
+  count(*),
+  max(q.created_at),
+  max(q.created_at)
+from public.quiz_attempts q
+cross join lateral jsonb_array_elements(coalesce(q.wrong_list, '[]'::jsonb)) as w
+where coalesce(trim(w ->> '단어'), '') <> ''
+group by q.user_id, trim(w ->> '단어'), coalesce(w ->> '유형', q.pos_mode)
+on conflict (user_id, word_key, quiz_type) do nothing;
@@ -0,0 +1,7 @@
+-- ============================================================
+-- 관리자 기록 탐색: (created_at, id) keyset 페이지네이션용 인덱스
+--   where created_at < $ts or (created_at = $ts and id < $id)
+--   order by created_at desc, id desc limit 500
+-- ============================================================
+create index if not exists quiz_attempts_created_at_id_idx
+  on public.quiz_attempts (created_at desc, id desc);
@@ -0,0 +1,141 @@
+-- ============================================================
+-- 관리자 분석 큐브: day(KST) × level × pos_mode × quiz_type
+--   - quiz_attempts를 워터마크 이후 행만 읽어 증분 누적
+--   - 대시보드는 큐브(수백~수천 행)만 읽고 슬라이스는 클라이언트에서
+--   - 로컬 Postgres에서도 그대로 실행 가능:
+--       select public.admin_rollup_attempt_cube();
+-- ============================================================
+
+-- ------------------------------------------------------------
+-- quiz_attempts.pos_mode에는 그동안 quiz_type이 저장되어 왔음
+--   → quiz_type 컬럼을 따로 두고, 기존 행은 옮긴 뒤 pos_mode는 비움(알 수 없음)
+-- ------------------------------------------------------------
+alter table public.quiz_attempts add column if not exists quiz_type text;
+
+update public.quiz_attempts
+set quiz_type = pos_mode,
+    pos_mode  = null
+where quiz_type is null
+  and pos_mode in ('reading', 'meaning', 'kr2jp');
+
+-- ------------------------------------------------------------
+-- 큐브 + 워터마크
+-- ------------------------------------------------------------
+create table if not exists public.admin_attempt_cube (
+  day         date    not null,
+  level       text    not null,
+  pos_mode    text    not null,   -- 알 수 없으면 '-'
+  quiz_type   text    not null,   -- 알 수 없으면 '-'
+  attempts    integer not null default 0,
+  score_sum   bigint  not null default 0,
+  item_count  bigint  not null default 0,   -- sum(quiz_len)
+  wrong_count bigint  not null default 0,   -- sum(wrong_count)
+  primary key (day, level, pos_mode, quiz_type)
+);
+
+create table if not exists public.admin_rollup_watermark (
+  name            text primary key,
+  last_created_at timestamptz not null default '-infinity',
+  rolled_at       timestamptz
+);
+
+alter table public.admin_attempt_cube enable row level security;
+alter table public.admin_rollup_watermark enable row level security;
+
+drop policy if exists "admin_attempt_cube_select_admin" on public.admin_attempt_cube;
+create policy "admin_attempt_cube_select_admin"
+  on public.admin_attempt_cube for select
+  using (exists (select 1 from public.profiles p where p.id = auth.uid() and p.is_admin));
+
+drop policy if exists "admin_rollup_watermark_select_admin" on public.admin_rollup_watermark;
+create policy "admin_rollup_watermark_select_admin"
+  on public.admin_rollup_watermark for select
+  using (exists (select 1 from public.profiles p where p.id = auth.uid() and p.is_admin));
+
+-- ------------------------------------------------------------
+-- 증분 롤업
+--   - (watermark, now() - 1분] 구간만 집계
+--     created_at은 insert 시각이라 1분 지연을 두면 늦게 커밋된 행도 놓치지 않음
+--   - 구간 상한을 포함(<=)하므로 같은 created_at 행이 두 배치로 갈라지지 않음
+--   - advisory lock으로 동시에 돌아도 한 번만 반영
+-- ------------------------------------------------------------
+create or replace function public.admin_rollup_attempt_cube()
+returns jsonb
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_from timestamptz;
+  v_to   timestamptz := now() - interval '1 minute';
+  v_rows integer := 0;
+begin
+  -- 앱에서 호출하면 관리자만, pg_cron/psql(auth.uid() 없음)은 통과
+  if auth.uid() is not null
+     and not exists (select 1 from public.profiles p where p.id = auth.uid() and p.is_admin) then
+    raise exception 'admin only';
+  end if;
+
+  perform pg_advisory_xact_lock(hashtext('admin_rollup_attempt_cube'));
+
+  insert into public.admin_rollup_watermark (name) values ('attempt_cube')
+  on conflict (name) do nothing;
+
+  select last_created_at into v_from
+  from public.admin_rollup_watermark
+  where name = 'attempt_cube'
+  for update;
+
+  if v_to > v_from then
+    with batch as (
+      select
+        (a.created_at at time zone 'Asia/Seoul')::date as day,
+        coalesce(a.level, '-')     as level,
+        coalesce(a.pos_mode, '-')  as pos_mode,
+        coalesce(a.quiz_type, '-') as quiz_type,
+        count(*)::integer                 as attempts,
+        sum(coalesce(a.score, 0))         as score_sum,
+        sum(coalesce(a.quiz_len, 0))      as item_count,
+        sum(coalesce(a.wrong_count, 0))   as wrong_count
+      from public.quiz_attempts a
+      where a.created_at > v_from
+        and a.created_at <= v_to
+      group by 1, 2, 3, 4
+    ), up as (
+      insert into public.admin_attempt_cube as c
+        (day, level, pos_mode, quiz_type, attempts, score_sum, item_count, wrong_count)
+      select day, level, pos_mode, quiz_type, attempts, score_sum, item_count, wrong_count
+      from batch
+      on conflict (day, level, pos_mode, quiz_type) do update
+        set attempts    = c.attempts    + excluded.attempts,
+            score_sum   = c.score_sum   + excluded.score_sum,
+            item_count  = c.item_count  + excluded.item_count,
+            wrong_count = c.wrong_count + excluded.wrong_count
+      returning 1
+    )
+    select count(*) into v_rows from up;
+
+    update public.admin_rollup_watermark
+    set last_created_at = v_to,
+        rolled_at = now()
+    where name = 'attempt_cube';
+  end if;
+
+  return jsonb_build_object('cells', v_rows, 'watermark', greatest(v_from, v_to));
+end;
+$$;
+
+revoke all on function public.admin_rollup_attempt_cube() from public, anon;
+grant execute on function public.admin_rollup_attempt_cube() to authenticated;
+
+-- ------------------------------------------------------------
+-- 주기 실행 (pg_cron이 있을 때만): 5분마다
+-- ------------------------------------------------------------
+do $$
+begin
+  if exists (select 1 from pg_extension where extname = 'pg_cron') then
+    perform cron.schedule('admin_rollup_attempt_cube', '*/5 * * * *',
+                          'select public.admin_rollup_attempt_cube()');
+  end if;
+end;
+$$;
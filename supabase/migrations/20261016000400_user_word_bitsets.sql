@@ -0,0 +1,42 @@
+-- ============================================================
+-- 맞힌/틀린 단어 비트셋 (유저 × 조합키 "품사|유형" 1행)
+--   - mastered/excluded = np.packbits(bool[n_bits]) 의 base64
+--   - words_digest = 앞 n_bits개 word_key의 sha1 앞 16자
+--     (단어장이 뒤로만 늘어나면 그대로 유효, 순서가 바뀌면 앱이 무시)
+--   - srs = 간격 반복(SM-2) 일정이 있는 단어만 (word_id, due, ease, ivl, reps) 고정 길이 레코드의 base64
+--     (word_id 기준이 비트셋과 같음 → 단어장 순서가 바뀌면 같이 무시됨)
+-- ============================================================
+create table if not exists public.user_word_bitsets (
+  user_id      uuid        not null references auth.users (id) on delete cascade,
+  mastery_key  text        not null,
+  n_bits       integer     not null,
+  words_digest text        not null,
+  mastered     text        not null default '',
+  excluded     text        not null default '',
+  srs          text        not null default '',
+  updated_at   timestamptz not null default now(),
+  primary key (user_id, mastery_key)
+);
+
+alter table public.user_word_bitsets enable row level security;
+
+drop policy if exists "user_word_bitsets_select_own" on public.user_word_bitsets;
+create policy "user_word_bitsets_select_own"
+  on public.user_word_bitsets for select
+  using (auth.uid() = user_id);
+
+drop policy if exists "user_word_bitsets_insert_own" on public.user_word_bitsets;
+create policy "user_word_bitsets_insert_own"
+  on public.user_word_bitsets for insert
+  with check (auth.uid() = user_id);
+
+drop policy if exists "user_word_bitsets_update_own" on public.user_word_bitsets;
+create policy "user_word_bitsets_update_own"
+  on public.user_word_bitsets for update
+  using (auth.uid() = user_id)
+  with check (auth.uid() = user_id);
+
+drop policy if exists "user_word_bitsets_delete_own" on public.user_word_bitsets;
+create policy "user_word_bitsets_delete_own"
+  on public.user_word_bitsets for delete
+  using (auth.uid() = user_id);
@@ -0,0 +1,7 @@
+-- ============================================================
+-- 다중 레벨 카탈로그: 조합키에 레벨을 붙임 ("품사|유형" → "레벨|품사|유형")
+--   - 지금까지 저장된 비트셋은 전부 N4 단어장 기준
+-- ============================================================
+update public.user_word_bitsets
+set mastery_key = 'N4|' || mastery_key
+where mastery_key not like '%|%|%';
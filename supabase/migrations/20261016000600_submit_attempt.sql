@@ -0,0 +1,84 @@
+-- ============================================================
+-- 제출 1번 = RPC 1번 (submit_attempt)
+--   - quiz_attempts insert + 단어 통계(record_word_results_bulk)를 한 트랜잭션에서
+--     → 기록만 있고 단어 통계는 없는 반쪽 저장이 생기지 않음
+--   - 클라이언트가 만든 attempt_id로 멱등: 같은 id로 다시 불러도 한 번만 반영
+--   - 반환: 최근 10회 집계 (제출 직후 화면이 따로 조회하지 않게)
+--   - 출석은 쓰지 않음: 앱이 세션 시작 때(유저·날짜당 1번) mark_attendance_kst로 이미 반영/보관
+-- ============================================================
+alter table public.quiz_attempts add column if not exists client_attempt_id uuid;
+
+create unique index if not exists quiz_attempts_user_client_attempt_uidx
+  on public.quiz_attempts (user_id, client_attempt_id);
+
+-- ------------------------------------------------------------
+-- p_attempt: {attempt_id, user_email, level, pos_mode, quiz_type, quiz_len, score, wrong_count, wrong_list}
+-- p_items:   [{word_key, level, pos, quiz_type, is_correct}, ...]  (record_word_results_bulk와 같은 모양)
+-- ------------------------------------------------------------
+create or replace function public.submit_attempt(p_attempt jsonb, p_items jsonb)
+returns jsonb
+language plpgsql
+security invoker
+set search_path = public
+as $$
+declare
+  v_uid        uuid := auth.uid();
+  v_attempt_id uuid := (p_attempt ->> 'attempt_id')::uuid;
+  v_inserted   boolean;
+  v_recent     jsonb;
+begin
+  if v_uid is null then
+    raise exception 'not authenticated' using errcode = '28000';
+  end if;
+  if v_attempt_id is null then
+    raise exception 'attempt_id is required' using errcode = '22023';
+  end if;
+
+  insert into public.quiz_attempts
+    (user_id, client_attempt_id, user_email, level, pos_mode, quiz_type, quiz_len, score, wrong_count, wrong_list)
+  values (
+    v_uid,
+    v_attempt_id,
+    p_attempt ->> 'user_email',
+    p_attempt ->> 'level',
+    p_attempt ->> 'pos_mode',
+    p_attempt ->> 'quiz_type',
+    (p_attempt ->> 'quiz_len')::integer,
+    (p_attempt ->> 'score')::integer,
+    (p_attempt ->> 'wrong_count')::integer,
+    coalesce(p_attempt -> 'wrong_list', '[]'::jsonb)
+  )
+  on conflict (user_id, client_attempt_id) do nothing;
+  v_inserted := found;
+
+  -- ✅ 재시도(같은 attempt_id)면 단어 통계는 이미 반영됨 → 건너뜀
+  if v_inserted and jsonb_array_length(coalesce(p_items, '[]'::jsonb)) > 0 then
+    perform public.record_word_results_bulk(p_items);
+  end if;
+
+  select jsonb_build_object(
+           'n',          count(*),
+           'avg_rate',   coalesce(avg(coalesce(r.score::numeric / nullif(r.quiz_len, 0), 0)), 0),
+           'best',       coalesce(max(r.score), 0),
+           'last_score', (array_agg(r.score    order by r.created_at desc, r.id desc))[1],
+           'last_total', (array_agg(r.quiz_len order by r.created_at desc, r.id desc))[1]
+         )
+    into v_recent
+  from (
+    select a.id, a.created_at, a.score, a.quiz_len
+    from public.quiz_attempts a
+    where a.user_id = v_uid
+    order by a.created_at desc, a.id desc
+    limit 10
+  ) r;
+
+  return jsonb_build_object(
+    'attempt_id',   v_attempt_id,
+    'duplicate',    not v_inserted,
+    'recent',       v_recent
+  );
+end;
+$$;
+
+revoke all on function public.submit_attempt(jsonb, jsonb) from public, anon;
+grant execute on function public.submit_attempt(jsonb, jsonb) to authenticated;
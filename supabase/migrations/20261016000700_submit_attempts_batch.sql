@@ -0,0 +1,186 @@
+-- ============================================================
+-- 여러 유저의 제출을 트랜잭션 1번에 (앱 서버 outbox 워커 → submit_attempts_batch)
+--   - service_role 키도, 유저 흉내(request.jwt.claims 바꿔치기)도 없이 유저 귀속을 서버가 확인
+--     · 유저가 자기 토큰으로 issue_submit_ticket() → 무작위 티켓 (DB에는 sha256만, 12시간 뒤 만료)
+--     · 워커는 티켓을 메모리에만 들고 있다가 배치에 (user_id, ticket)으로 실어 보냄 (anon 키로 호출)
+--     · 티켓 해시 + user_id + 만료를 확인한 유저의 행만 반영, 아니면 그 유저 행은 'ticket'
+--   - p_users: [{user_id, ticket}, ...]
+--   - p_rows:  [{user_id, attempt}, ...]   (attempt = submit_attempt의 p_attempt)
+--   - p_words: [{user_id, word_key, level, pos, quiz_type, is_correct, n}, ...]
+--              앱이 (유저, 단어, 유형, 정답여부)로 미리 합친 개수 → user_word_agg에 그대로 더함 (seen += n)
+--   - 이미 반영된 attempt_id가 섞인 유저는 통째로 건너뜀 → 'retry' (앱이 submit_attempt로 1건씩)
+--     (합친 개수는 제출별로 나눌 수 없음)
+--   - 단어 결과는 user_word_agg에만 반영: 문항 1개 = 1행인 record_word_results_bulk_base는
+--     submit_attempt(1건씩) 경로만 부름 (배치가 다시 문항 단위 작업이 되지 않게)
+--   - 출석은 쓰지 않음 (submit_attempt와 같음)
+--   - 반환: p_rows 순서로 [{attempt_id, status: 'done' | 'retry' | 'ticket', duplicate, recent}, ...]
+-- ============================================================
+create table if not exists public.submit_tickets (
+  ticket_hash bytea       primary key,
+  user_id     uuid        not null references auth.users (id) on delete cascade,
+  expires_at  timestamptz not null
+);
+
+create index if not exists submit_tickets_user_idx on public.submit_tickets (user_id, expires_at);
+
+-- 정책 없음 = 아래 함수로만 읽고 씀
+alter table public.submit_tickets enable row level security;
+
+-- ------------------------------------------------------------
+-- 티켓 발급 (유저 본인 토큰으로)
+-- ------------------------------------------------------------
+create or replace function public.issue_submit_ticket()
+returns jsonb
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_uid    uuid := auth.uid();
+  v_ticket text := replace(gen_random_uuid()::text || gen_random_uuid()::text, '-', '');
+  v_exp    timestamptz := now() + interval '12 hours';
+begin
+  if v_uid is null then
+    raise exception 'not authenticated' using errcode = '28000';
+  end if;
+
+  delete from public.submit_tickets where user_id = v_uid and expires_at < now();
+  insert into public.submit_tickets (ticket_hash, user_id, expires_at)
+  values (sha256(convert_to(v_ticket, 'UTF8')), v_uid, v_exp);
+
+  return jsonb_build_object('ticket', v_ticket, 'expires_at', v_exp);
+end;
+$$;
+
+revoke all on function public.issue_submit_ticket() from public, anon;
+grant execute on function public.issue_submit_ticket() to authenticated;
+
+-- ------------------------------------------------------------
+-- 배치 제출
+-- ------------------------------------------------------------
+create or replace function public.submit_attempts_batch(p_users jsonb, p_rows jsonb, p_words jsonb)
+returns jsonb
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_ok       uuid[];
+  v_retry    uuid[];
+  v_expected integer;
+  v_inserted integer;
+  v_recent   jsonb;
+begin
+  -- ✅ 티켓이 맞는 유저만
+  select coalesce(array_agg(distinct u.user_id), '{}')
+    into v_ok
+  from jsonb_to_recordset(coalesce(p_users, '[]'::jsonb)) as u(user_id uuid, ticket text)
+  join public.submit_tickets t
+    on t.ticket_hash = sha256(convert_to(coalesce(u.ticket, ''), 'UTF8'))
+   and t.user_id = u.user_id
+   and t.expires_at > now();
+
+  -- 이미 들어간 제출이 섞인 유저 → 이번 배치에서 빼고 1건씩
+  select coalesce(array_agg(distinct r.user_id), '{}')
+    into v_retry
+  from jsonb_to_recordset(coalesce(p_rows, '[]'::jsonb)) as r(user_id uuid, attempt jsonb)
+  join public.quiz_attempts a
+    on a.user_id = r.user_id
+   and a.client_attempt_id = (r.attempt ->> 'attempt_id')::uuid
+  where r.user_id = any(v_ok);
+
+  v_ok := array(select unnest(v_ok) except select unnest(v_retry));
+
+  select count(*)
+    into v_expected
+  from jsonb_to_recordset(coalesce(p_rows, '[]'::jsonb)) as r(user_id uuid, attempt jsonb)
+  where r.user_id = any(v_ok);
+
+  insert into public.quiz_attempts
+    (user_id, client_attempt_id, user_email, level, pos_mode, quiz_type, quiz_len, score, wrong_count, wrong_list)
+  select
+    r.user_id,
+    (r.attempt ->> 'attempt_id')::uuid,
+    r.attempt ->> 'user_email',
+    r.attempt ->> 'level',
+    r.attempt ->> 'pos_mode',
+    r.attempt ->> 'quiz_type',
+    (r.attempt ->> 'quiz_len')::integer,
+    (r.attempt ->> 'score')::integer,
+    (r.attempt ->> 'wrong_count')::integer,
+    coalesce(r.attempt -> 'wrong_list', '[]'::jsonb)
+  from jsonb_to_recordset(coalesce(p_rows, '[]'::jsonb)) as r(user_id uuid, attempt jsonb)
+  where r.user_id = any(v_ok)
+  on conflict (user_id, client_attempt_id) do nothing;
+  get diagnostics v_inserted = row_count;
+
+  -- 확인과 insert 사이에 같은 제출이 1건씩 경로로 들어온 경우 → 전체 롤백, 앱이 다시 시도
+  if v_inserted <> v_expected then
+    raise exception 'attempt submitted concurrently' using errcode = '40001';
+  end if;
+
+  -- ✅ 미리 합친 개수를 그대로 (유저 × 단어 × 유형 1행)
+  insert into public.user_word_agg as a
+    (user_id, word_key, quiz_type, level, pos, seen_count, wrong_count, last_seen_at, last_wrong_at)
+  select
+    w.user_id,
+    w.word_key,
+    w.quiz_type,
+    max(w.level),
+    max(w.pos),
+    sum(greatest(coalesce(w.n, 1), 1)),
+    coalesce(sum(greatest(coalesce(w.n, 1), 1)) filter (where not w.is_correct), 0),
+    now(),
+    case when bool_or(not w.is_correct) then now() end
+  from jsonb_to_recordset(coalesce(p_words, '[]'::jsonb))
+         as w(user_id uuid, word_key text, level text, pos text, quiz_type text, is_correct boolean, n integer)
+  where w.user_id = any(v_ok)
+    and coalesce(w.word_key, '') <> ''
+  group by w.user_id, w.word_key, w.quiz_type
+  on conflict (user_id, word_key, quiz_type) do update set
+    level         = excluded.level,
+    pos           = excluded.pos,
+    seen_count    = a.seen_count + excluded.seen_count,
+    wrong_count   = a.wrong_count + excluded.wrong_count,
+    last_seen_at  = excluded.last_seen_at,
+    last_wrong_at = coalesce(excluded.last_wrong_at, a.last_wrong_at);
+
+  -- 유저별 최근 10회 집계 (submit_attempt 반환값과 같은 모양)
+  select coalesce(jsonb_object_agg(u.user_id, s.recent), '{}'::jsonb)
+    into v_recent
+  from unnest(v_ok) as u(user_id)
+  cross join lateral (
+    select jsonb_build_object(
+             'n',          count(*),
+             'avg_rate',   coalesce(avg(coalesce(r.score::numeric / nullif(r.quiz_len, 0), 0)), 0),
+             'best',       coalesce(max(r.score), 0),
+             'last_score', (array_agg(r.score    order by r.created_at desc, r.id desc))[1],
+             'last_total', (array_agg(r.quiz_len order by r.created_at desc, r.id desc))[1]
+           ) as recent
+    from (
+      select a.id, a.created_at, a.score, a.quiz_len
+      from public.quiz_attempts a
+      where a.user_id = u.user_id
+      order by a.created_at desc, a.id desc
+      limit 10
+    ) r
+  ) s;
+
+  return (
+    select coalesce(jsonb_agg(jsonb_build_object(
+             'attempt_id', x -> 'attempt' ->> 'attempt_id',
+             'status',     case
+                             when (x ->> 'user_id')::uuid = any(v_ok)    then 'done'
+                             when (x ->> 'user_id')::uuid = any(v_retry) then 'retry'
+                             else 'ticket'
+                           end,
+             'duplicate',  false,
+             'recent',     v_recent -> (x ->> 'user_id')
+           ) order by i), '[]'::jsonb)
+    from jsonb_array_elements(coalesce(p_rows, '[]'::jsonb)) with ordinality as t(x, i)
+  );
+end;
+$$;
+
+revoke all on function public.submit_attempts_batch(jsonb, jsonb, jsonb) from public;
+grant execute on function public.submit_attempts_batch(jsonb, jsonb, jsonb) to anon, authenticated;
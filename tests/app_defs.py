@@ -0,0 +1,107 @@
+"""app.py의 순수 함수/상수만 꺼내서 테스트하는 로더
+
+app.py는 import하는 순간 Streamlit 화면/로그인/DB 연결까지 실행되므로,
+소스를 AST로 읽어 필요한 최상위 정의(함수·클래스·상수)만 골라 실행한다.
+- 외부 서비스 import(streamlit, supabase, postgrest, 쿠키)는 건너뛰고 st는 아래 FakeStreamlit
+- 정의가 참조하는 다른 이름은 load(..., 이름=값)으로 바꿔 끼움 (예: vocab_snapshot)
+"""
+import ast
+import functools
+from pathlib import Path
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app.py"
+SKIP_MODULES = ("streamlit", "supabase", "postgrest", "streamlit_cookies_manager")
+
+
+class SessionState(dict):
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+class FakeStreamlit:
+    """데코레이터(cache_resource/cache_data/fragment)와 session_state만 흉내"""
+
+    def __init__(self):
+        self.session_state = SessionState()
+
+    @staticmethod
+    def _memo(*args, **kwargs):
+        def deco(fn):
+            cache = {}
+
+            @functools.wraps(fn)
+            def wrapper(*a):
+                if a not in cache:
+                    cache[a] = fn(*a)
+                return cache[a]
+
+            wrapper.clear = cache.clear
+            return wrapper
+
+        if args and callable(args[0]):
+            return deco(args[0])
+        return deco
+
+    cache_resource = cache_data = _memo
+
+    def fragment(self, *args, **kwargs):
+        return args[0] if args and callable(args[0]) else (lambda fn: fn)
+
+
+def _defined_name(node):
+    if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+        return node.name
+    if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+        return node.targets[0].id
+    if isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+        return node.target.id
+    return None
+
+
+def _skipped_import(node) -> bool:
+    if isinstance(node, ast.ImportFrom):
+        return (node.module or "").startswith(SKIP_MODULES)
+    return any(alias.name.startswith(SKIP_MODULES) for alias in node.names)
+
+
+def load(*names: str, **overrides) -> "AppNamespace":
+    """app.py의 names 정의만 실행한 네임스페이스 (속성으로 접근, ns.st = FakeStreamlit)"""
+    tree = ast.parse(APP_PATH.read_text(encoding="utf-8"), filename=str(APP_PATH))
+    wanted, found = set(names), set()
+    body = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            if not _skipped_import(node):
+                body.append(node)
+        elif _defined_name(node) in wanted:
+            body.append(node)
+            found.add(_defined_name(node))
+    if wanted - found:
+        raise NameError(f"app.py에 없는 정의: {sorted(wanted - found)}")
+
+    ns = {"__file__": str(APP_PATH), "__name__": "app_under_test", "st": FakeStreamlit()}
+    exec(compile(ast.Module(body=body, type_ignores=[]), str(APP_PATH), "exec"), ns)
+    ns.update(overrides)
+    return AppNamespace(ns)
+
+
+class AppNamespace:
+    """실행된 정의들의 전역 dict — 속성 대입도 전역에 반영 (예: ns.vocab_snapshot = ...)"""
+
+    def __init__(self, globals_: dict):
+        object.__setattr__(self, "_globals", globals_)
+
+    def __getattr__(self, name):
+        try:
+            return self._globals[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        self._globals[name] = value
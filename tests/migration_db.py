@@ -0,0 +1,119 @@
+"""supabase/migrations를 로컬 Postgres에 그대로 적용하는 테스트 픽스처
+
+- TEST_DATABASE_URL(예: postgresql://postgres@localhost/quiz_test)이 있을 때만 실행
+  → 그 DB의 public/auth 스키마를 지우고 다시 만듦 (테스트 전용 DB만 지정할 것)
+- Supabase가 원래 갖고 있는 것(auth.uid(), anon/authenticated 역할, profiles/quiz_attempts,
+  record_word_results_bulk 등)만 BASE_SQL로 흉내 내고, 마이그레이션 SQL은 파일에서 그대로 읽음
+"""
+import json
+import os
+from pathlib import Path
+
+try:
+    import psycopg2
+except ImportError:  # 선택 의존성: 없으면 이 테스트들만 건너뜀
+    psycopg2 = None
+
+DATABASE_URL = os.environ.get("TEST_DATABASE_URL", "")
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "supabase" / "migrations"
+SKIP_REASON = "TEST_DATABASE_URL과 psycopg2가 있어야 실행 (로컬 Postgres)"
+AVAILABLE = bool(DATABASE_URL) and psycopg2 is not None
+
+BASE_SQL = """
+drop schema if exists public cascade;
+drop schema if exists auth cascade;
+create schema public;
+create schema auth;
+
+do $$
+begin
+  if not exists (select 1 from pg_roles where rolname = 'anon') then create role anon nologin; end if;
+  if not exists (select 1 from pg_roles where rolname = 'authenticated') then create role authenticated nologin; end if;
+end
+$$;
+
+grant usage on schema public, auth to anon, authenticated;
+alter default privileges in schema public grant all on tables to anon, authenticated;
+alter default privileges in schema public grant all on sequences to anon, authenticated;
+
+create table auth.users (id uuid primary key);
+
+-- PostgREST가 JWT의 sub를 넣어 주는 자리
+create function auth.uid() returns uuid
+language sql stable
+as $$ select nullif(current_setting('request.jwt.claim.sub', true), '')::uuid $$;
+
+create table public.profiles (
+  id       uuid primary key references auth.users (id) on delete cascade,
+  is_admin boolean not null default false
+);
+
+create table public.quiz_attempts (
+  id          bigserial   primary key,
+  user_id     uuid        not null references auth.users (id) on delete cascade,
+  user_email  text,
+  level       text,
+  pos_mode    text,
+  quiz_len    integer,
+  score       integer,
+  wrong_count integer,
+  wrong_list  jsonb,
+  created_at  timestamptz not null default now()
+);
+
+alter table public.quiz_attempts enable row level security;
+create policy "quiz_attempts_insert_own" on public.quiz_attempts
+  for insert with check (auth.uid() = user_id);
+create policy "quiz_attempts_select_own" on public.quiz_attempts
+  for select using (auth.uid() = user_id);
+
+-- 기존 단어 통계 RPC (문항 1개 = 1행)
+create table public.word_results (
+  user_id    uuid    not null,
+  word_key   text    not null,
+  quiz_type  text,
+  is_correct boolean not null
+);
+
+create function public.record_word_results_bulk(p_items jsonb)
+returns void
+language sql
+security definer
+set search_path = public
+as $$
+  insert into public.word_results (user_id, word_key, quiz_type, is_correct)
+  select auth.uid(), x.word_key, x.quiz_type, x.is_correct
+  from jsonb_to_recordset(p_items) as x(word_key text, quiz_type text, is_correct boolean);
+$$;
+
+grant execute on function public.record_word_results_bulk(jsonb) to authenticated;
+"""
+
+
+def connect():
+    conn = psycopg2.connect(DATABASE_URL)
+    conn.autocommit = False
+    return conn
+
+
+def migrate(conn, seed_sql: str = "", seed_params=None):
+    """기본 스키마 → (선택) 마이그레이션 전 데이터 → supabase/migrations/*.sql 순서대로 적용 후 커밋"""
+    with conn.cursor() as cur:
+        cur.execute(BASE_SQL)
+        if seed_sql:
+            cur.execute(seed_sql, seed_params)
+        for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+            cur.execute(path.read_text(encoding="utf-8"))
+    conn.commit()
+
+
+def as_role(cur, role: str, user_id=None):
+    """현재 트랜잭션 안에서만 PostgREST 요청처럼 (역할 + JWT sub)"""
+    cur.execute("select set_config('request.jwt.claim.sub', %s, true)", (str(user_id or ""),))
+    cur.execute(f"set local role {role}")
+
+
+def rpc(cur, name: str, *args):
+    placeholders = ", ".join(["%s::jsonb"] * len(args))
+    cur.execute(f"select public.{name}({placeholders})", [json.dumps(a, ensure_ascii=False) for a in args])
+    return cur.fetchone()[0]
@@ -0,0 +1,150 @@
+"""퀴즈 생성 엔진(build_quizzes / make_questions)과 progress v2 압축 저장
+
+- sample_distinct: 행마다 서로 다른 k개, 범위 안
+- 오답 보기 3개는 서로 다르고 정답과 절대 겹치지 않음
+- mix_adj = い형 2 : な형 2 : 동사 6
+- 새 단어가 N개 미만이면 [] (= 정복)
+- progress v2: word_id로 저장 → 같은 단어 데이터면 그대로 복원, 지문이 다르면 None
+실행: python -m unittest discover -s tests
+"""
+import csv
+import hashlib
+import io
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from app_defs import load
+
+VOCAB_NAMES = (
+    "MIX_POS", "DISTRACTOR_FIELDS", "_first_ids", "_build_word_table", "_build_distractor_index",
+    "_build_progress_codec", "VocabSnapshot", "build_vocab_snapshot",
+)
+QUIZ_NAMES = (
+    "N", "POS_MODES", "QTYPE_FIELD", "MIX_RATIO", "sample_distinct", "make_questions", "question_dict",
+    "build_quizzes", "PROGRESS_FORMAT_VERSION", "encode_progress_quiz", "decode_progress_quiz",
+)
+# 품사별 단어 수 (verb는 3개 중 1개가 표기 없이 읽기만)
+POS_SIZES = {"i_adj": 12, "na_adj": 12, "verb": 30}
+
+
+def write_catalog(root: Path) -> dict:
+    """N4 파티션 CSV를 쓰고 manifest 항목 {품사: {"file", "rows", "sha256"}}을 돌려줌"""
+    entries = {}
+    for pos, n in POS_SIZES.items():
+        buf = io.StringIO()
+        out = csv.writer(buf, lineterminator="\n")
+        out.writerow(["level", "pos", "jp_word", "reading", "meaning"])
+        for i in range(n):
+            jp = "" if pos == "verb" and i % 3 == 2 else f"{pos}語{i}"
+            out.writerow(["N4", pos, jp, f"{pos}よみ{i}", f"{pos} 뜻{i}"])
+        path = root / "N4" / f"{pos}.csv"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(buf.getvalue(), encoding="utf-8")
+        raw = path.read_bytes()
+        entries[pos] = {"file": f"N4/{pos}.csv", "rows": n, "sha256": hashlib.sha256(raw).hexdigest()}
+    return entries
+
+
+class QuizBuilderTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = Path(tempfile.mkdtemp())
+        entries = write_catalog(cls.tmp)
+        cls.app = load(*VOCAB_NAMES, *QUIZ_NAMES, CATALOG_DIR=cls.tmp)
+        cls.vocab = cls.app.build_vocab_snapshot("N4", entries, "N4-test")
+        cls.app.vocab_snapshot = lambda fresh=False: cls.vocab
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def test_sample_distinct_rows(self):
+        rng = np.random.default_rng(0)
+        m = np.array([3, 4, 10, 1000] * 250)
+        picks = self.app.sample_distinct(rng, m, 3)
+        self.assertEqual(picks.shape, (m.size, 3))
+        self.assertTrue((picks >= 0).all() and (picks < m[:, None]).all())
+        self.assertTrue(all(len(set(row)) == 3 for row in picks.tolist()))
+
+    def test_distractors_are_distinct_and_never_the_answer(self):
+        rng = np.random.default_rng(1)
+        for qtype in ("reading", "meaning", "kr2jp"):
+            for pos_mode in self.app.POS_MODES:
+                kind = "reading" if qtype in ("reading", "kr2jp") else "all"
+                ids = np.tile(self.vocab.pools[(pos_mode, kind)], 20)
+                for q in self.app.make_questions(ids, qtype, self.vocab, pos_mode, rng):
+                    self.assertEqual(len(set(q["choices"])), 4)
+                    self.assertEqual(q["choices"].count(q["correct_text"]), 1)
+                    self.assertNotIn("", q["choices"])
+
+    def test_distractors_stay_in_part_of_speech(self):
+        rng = np.random.default_rng(2)
+        field_pos = {}
+        for pos in POS_SIZES:
+            for wid in self.vocab.pools[(pos, "all")].tolist():
+                field_pos[self.vocab.words["meaning"][wid]] = pos
+        ids = self.vocab.pools[("mix_adj", "all")]
+        for q in self.app.make_questions(ids, "meaning", self.vocab, "mix_adj", rng):
+            self.assertEqual({field_pos[c] for c in q["choices"]}, {q["pos"]})
+
+    def test_mix_adj_is_two_two_six(self):
+        quizzes = self.app.build_quizzes(self.vocab, "meaning", "mix_adj", count=25, seed=3)
+        self.assertEqual(len(quizzes), 25)
+        for quiz in quizzes:
+            self.assertEqual(len(quiz), self.app.N)
+            self.assertEqual(Counter(q["pos"] for q in quiz), {"i_adj": 2, "na_adj": 2, "verb": 6})
+            self.assertEqual(len({q["word_id"] for q in quiz}), self.app.N)
+
+    def test_mastered_pool_returns_empty(self):
+        blocked = np.ones(self.vocab.n_words, dtype=bool)
+        self.assertEqual(self.app.build_quizzes(self.vocab, "meaning", "verb", blocked=blocked), [])
+
+        # 남은 새 단어가 N개 미만이어도 정복
+        blocked[self.vocab.pools[("verb", "all")][: self.app.N - 1]] = False
+        self.assertEqual(self.app.build_quizzes(self.vocab, "meaning", "verb", blocked=blocked), [])
+
+        # mix_adj는 한 품사라도 모자라면 정복
+        blocked = np.zeros(self.vocab.n_words, dtype=bool)
+        blocked[self.vocab.pools[("na_adj", "all")]] = True
+        self.assertEqual(self.app.build_quizzes(self.vocab, "meaning", "mix_adj", blocked=blocked), [])
+
+    def test_review_words_come_first(self):
+        review = self.vocab.pools[("verb", "all")][:4]
+        blocked = np.zeros(self.vocab.n_words, dtype=bool)
+        blocked[review] = True
+        quiz = self.app.build_quizzes(self.vocab, "meaning", "verb", seed=4, blocked=blocked, review=review)[0]
+        self.assertTrue(set(review.tolist()) <= {q["word_id"] for q in quiz})
+
+    def test_progress_v2_round_trip(self):
+        for qtype in ("reading", "meaning", "kr2jp"):
+            quiz = self.app.build_quizzes(self.vocab, qtype, "mix_adj", seed=5)[0]
+            answers = [q["choices"][i % 4] for i, q in enumerate(quiz)]
+            answers[3] = None
+            progress = self.app.encode_progress_quiz(quiz, answers, qtype)
+            self.assertEqual(progress["v"], self.app.PROGRESS_FORMAT_VERSION)
+            self.assertEqual(progress["a"][3], -1)
+
+            restored = self.app.decode_progress_quiz({**progress, "quiz_type": qtype})
+            self.assertEqual(restored, (quiz, answers))
+
+    def test_progress_v2_rejects_other_vocabulary(self):
+        quiz = self.app.build_quizzes(self.vocab, "meaning", "verb", seed=6)[0]
+        progress = self.app.encode_progress_quiz(quiz, [None] * len(quiz), "meaning")
+        progress["quiz_type"] = "meaning"
+        self.assertIsNone(self.app.decode_progress_quiz({**progress, "data": "0" * 16}))
+        self.assertIsNone(self.app.decode_progress_quiz({**progress, "quiz_type": "listening"}))
+        self.assertIsNone(self.app.decode_progress_quiz({**progress, "c": [[10 ** 6] * 4] * len(quiz)}))
+
+    def test_progress_v2_falls_back_for_unknown_choices(self):
+        quiz = self.app.build_quizzes(self.vocab, "meaning", "verb", seed=7)[0]
+        quiz[0] = {**quiz[0], "choices": ["없는 보기"] + quiz[0]["choices"][1:]}
+        self.assertIsNone(self.app.encode_progress_quiz(quiz, [None] * len(quiz), "meaning"))
+
+
+if __name__ == "__main__":
+    unittest.main()
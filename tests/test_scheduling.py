@@ -0,0 +1,135 @@
+"""복습 일정(SM-2)과 오답률 가중 추출(Fenwick 트리)
+
+- SM-2: 연속 정답 간격 1일 → 6일 → ivl × ease, 틀리면 10분 뒤 다시 + ease 감소(하한 1.3)
+- 힙: 복습 시각이 된 단어만, 오래된 항목은 due와 비교해서 버림
+- Fenwick: 빌드 = 점 갱신 누적과 같음, 총합/누적합 탐색, 가중치 비례 비복원 추출
+실행: python -m unittest discover -s tests
+"""
+import unittest
+from collections import Counter
+
+import numpy as np
+
+from app_defs import load
+
+NOW = 1_800_000_000.0
+
+
+class SrsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = load(
+            "SRS_EASE_INIT", "SRS_EASE_MIN", "SRS_QUALITY_CORRECT", "SRS_QUALITY_WRONG", "SRS_RELEARN_SEC",
+            "DAY_SEC", "srs_new_state", "srs_rebuild_heap", "_srs_compact", "srs_review", "srs_forget",
+        )
+
+    def test_intervals_one_six_then_times_ease(self):
+        app = self.app
+        state = app.srs_new_state(3)
+        expected = [1.0, 6.0]
+        for day in range(5):
+            now = NOW + day * app.DAY_SEC
+            prev_ivl = float(state["ivl"][0])
+            app.srs_review(state, 0, True, now)
+            ivl = float(state["ivl"][0])
+            want = expected[day] if day < 2 else prev_ivl * float(state["ease"][0])
+            self.assertAlmostEqual(ivl, want, places=4)
+            self.assertAlmostEqual(state["due"][0], now + ivl * app.DAY_SEC, delta=1.0)
+        self.assertEqual(int(state["reps"][0]), 5)
+        self.assertAlmostEqual(float(state["ease"][0]), app.SRS_EASE_INIT, places=5)  # 품질 4는 ease 유지
+
+    def test_wrong_answer_relearns_in_ten_minutes(self):
+        app = self.app
+        state = app.srs_new_state(2)
+        app.srs_review(state, 1, True, NOW)
+        app.srs_review(state, 1, True, NOW)
+        app.srs_review(state, 1, False, NOW + 100)
+        self.assertEqual(app.SRS_RELEARN_SEC, 600)
+        self.assertEqual(state["due"][1], NOW + 100 + 600)
+        self.assertEqual((int(state["reps"][1]), float(state["ivl"][1])), (0, 0.0))
+        self.assertAlmostEqual(float(state["ease"][1]), 2.5 - 0.32, places=5)
+
+        # 다시 맞히면 1일부터
+        app.srs_review(state, 1, True, NOW + 700)
+        self.assertEqual(float(state["ivl"][1]), 1.0)
+
+    def test_ease_has_floor(self):
+        app = self.app
+        state = app.srs_new_state(1)
+        for i in range(20):
+            app.srs_review(state, 0, False, NOW + i)
+        self.assertAlmostEqual(float(state["ease"][0]), app.SRS_EASE_MIN, places=5)
+
+    def test_heap_keeps_only_latest_due(self):
+        app = self.app
+        state = app.srs_new_state(4)
+        for i in range(200):
+            app.srs_review(state, i % 4, i % 3 != 0, NOW + i)
+        live = [(d, w) for d, w in state["heap"] if state["due"][w] == d]
+        self.assertEqual(sorted(w for _, w in live), [0, 1, 2, 3])
+        self.assertLessEqual(len(state["heap"]), 2 * 4 + 64)
+
+        app.srs_forget(state, np.array([True, False, True, False]))
+        self.assertTrue(np.isinf(state["due"][[0, 2]]).all())
+        app.srs_rebuild_heap(state)
+        self.assertEqual(sorted(w for _, w in state["heap"]), [1, 3])
+
+
+class FenwickTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = load("fenwick_build", "fenwick_add", "fenwick_total", "fenwick_find", "word_sampler_draw")
+
+    def test_build_matches_point_updates(self):
+        rng = np.random.default_rng(0)
+        for n in (1, 2, 7, 64, 1000):
+            w = rng.random(n)
+            tree = np.zeros(n)
+            for i, x in enumerate(w):
+                self.app.fenwick_add(tree, i, float(x))
+            np.testing.assert_allclose(self.app.fenwick_build(w), tree)
+            self.assertAlmostEqual(self.app.fenwick_total(tree), float(w.sum()))
+
+    def test_find_uses_prefix_sums(self):
+        rng = np.random.default_rng(1)
+        w = rng.random(37)
+        w[[3, 10, 11]] = 0.0
+        tree = self.app.fenwick_build(w)
+        csum = np.cumsum(w)
+        for u in rng.random(500) * csum[-1]:
+            i = self.app.fenwick_find(tree, float(u))
+            self.assertLessEqual(csum[i - 1] if i else 0.0, u)
+            self.assertLess(u, csum[i])
+            self.assertGreater(w[i], 0.0)
+
+        # 점 갱신 뒤에도 누적합 그대로
+        self.app.fenwick_add(tree, 5, 2.0)
+        w[5] += 2.0
+        self.assertAlmostEqual(self.app.fenwick_total(tree), float(w.sum()))
+
+    def sampler(self, w):
+        w = np.asarray(w, dtype=np.float64)
+        return {"pool": np.arange(100, 100 + w.size), "w": w, "tree": self.app.fenwick_build(w)}
+
+    def test_draws_without_replacement(self):
+        rng = np.random.default_rng(2)
+        sp = self.sampler([1.0, 0.0, 3.0, 0.5, 0.0, 2.0])
+        before = sp["tree"].copy()
+        for _ in range(200):
+            picked = self.app.word_sampler_draw(sp, rng, 3).tolist()
+            self.assertEqual(len(set(picked)), 3)
+            self.assertFalse({101, 104} & set(picked))  # 가중치 0은 안 뽑힘
+        np.testing.assert_allclose(sp["tree"], before)  # 트리는 원래대로
+
+        # 후보보다 많이 달라면 있는 만큼만
+        self.assertEqual(sorted(self.app.word_sampler_draw(sp, rng, 10).tolist()), [100, 102, 103, 105])
+
+    def test_draws_follow_weights(self):
+        rng = np.random.default_rng(3)
+        sp = self.sampler([1.0, 9.0])
+        first = Counter(int(self.app.word_sampler_draw(sp, rng, 1)[0]) for _ in range(4000))
+        self.assertAlmostEqual(first[101] / 4000, 0.9, delta=0.03)
+
+
+if __name__ == "__main__":
+    unittest.main()
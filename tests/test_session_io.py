@@ -0,0 +1,106 @@
+"""세션 쓰기 경로: progress write-behind 큐와 JWT 만료 시각
+
+- 같은 키(유저 진행상태 / (유저, 종류, ...))의 연속 저장은 마지막 값 1번으로 합쳐짐
+- 키마다 seq 순서: 늦게 끝난 옛 값이 새 값을 덮지 않음
+- 전체 초기화(discard) 뒤에는 대기 중이던 값이 다시 써지지 않음
+- jwt_exp: payload의 exp (패딩 없는 base64url), 이상한 토큰은 None
+실행: python -m unittest discover -s tests
+"""
+import base64
+import json
+import unittest
+
+from app_defs import load
+
+WRITER_NAMES = (
+    "PROGRESS_FLUSH_QUIET_SEC", "PROGRESS_FLUSH_MAX_DELAY_SEC", "PROGRESS_QUEUE_MAX", "PROGRESS_ENQUEUE_WAIT_SEC",
+    "PROGRESS_MAX_RETRIES", "_progress_writer", "_progress_claim", "_progress_release", "_progress_write",
+    "_progress_flusher_loop", "_progress_flush_all", "enqueue_progress_save", "_progress_user_keys",
+    "flush_progress_for_user", "discard_pending_writes",
+)
+
+
+class ProgressWriteBehindTest(unittest.TestCase):
+    def setUp(self):
+        # 백그라운드 스레드가 테스트 도중에 비우지 않도록 대기 시간을 길게
+        self.app = load(*WRITER_NAMES)
+        self.app.PROGRESS_FLUSH_QUIET_SEC = self.app.PROGRESS_FLUSH_MAX_DELAY_SEC = 3600.0
+        self.w = self.app._progress_writer()
+        self.written = []
+
+    def write(self, client, user_id, payload):
+        self.written.append((user_id, payload))
+
+    def save(self, user_id, payload, key=None):
+        self.app.enqueue_progress_save(None, user_id, payload, key=key, write=self.write)
+
+    def test_same_key_coalesces_to_last_value(self):
+        for i in range(5):
+            self.save("u1", {"cur": i})
+        self.save("u1", {"bits": 1}, key=("u1", "bitset", "verb|meaning"))
+        self.save("u1", {"bits": 2}, key=("u1", "bitset", "verb|meaning"))
+        self.save("u2", {"cur": 9})
+
+        self.assertEqual(self.w["stats"]["coalesced"], 5)
+        self.assertTrue(self.app.flush_progress_for_user("u1"))
+        self.assertEqual(sorted(self.written, key=str), [("u1", {"bits": 2}), ("u1", {"cur": 4})])
+        self.assertEqual(list(self.w["pending"]), ["u2"])  # 다른 유저는 그대로 대기
+        self.assertEqual(self.w["user_locks"], {})
+        self.assertNotIn("u1", self.w["written_seq"])
+
+    def test_older_value_never_overwrites_newer(self):
+        self.save("u1", {"cur": 1})
+        with self.w["lock"]:
+            old = self.w["pending"].pop("u1")  # 워커가 꺼내 갔지만 아직 못 쓴 값
+            self.app._progress_claim(self.w, "u1")
+        self.save("u1", {"cur": 2})
+        self.assertTrue(self.app.flush_progress_for_user("u1"))
+
+        self.assertTrue(self.app._progress_write(self.w, "u1", old))
+        self.assertEqual(self.written, [("u1", {"cur": 2})])
+        self.assertEqual(self.w["user_locks"], {})
+
+    def test_failed_write_reports_false(self):
+        def broken(client, user_id, payload):
+            raise OSError("network")
+
+        self.app.enqueue_progress_save(None, "u1", {"cur": 1}, write=broken)
+        self.assertFalse(self.app.flush_progress_for_user("u1"))
+        self.assertEqual(self.w["stats"]["failed"], 1)
+
+    def test_discard_drops_pending_and_in_flight(self):
+        self.save("u1", {"cur": 1})
+        self.save("u1", {"bits": 1}, key=("u1", "bitset", "k"))
+        with self.w["lock"]:
+            in_flight = self.w["pending"].pop(("u1", "bitset", "k"))
+            self.app._progress_claim(self.w, ("u1", "bitset", "k"))
+
+        self.app.discard_pending_writes("u1")
+        self.assertTrue(self.app._progress_write(self.w, ("u1", "bitset", "k"), in_flight))
+        self.assertTrue(self.app.flush_progress_for_user("u1"))
+        self.assertEqual(self.written, [])
+
+
+def make_jwt(claims: dict) -> str:
+    def part(obj):
+        return base64.urlsafe_b64encode(json.dumps(obj).encode()).rstrip(b"=").decode()
+
+    return f"{part({'alg': 'HS256'})}.{part(claims)}.sig"
+
+
+class JwtExpTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = load("jwt_exp")
+
+    def test_reads_exp_without_padding(self):
+        for claims in ({"exp": 1_800_000_000}, {"exp": 1_800_000_000, "sub": "u" * 7}, {"exp": 1.5, "s": "ab"}):
+            self.assertEqual(self.app.jwt_exp(make_jwt(claims)), float(claims["exp"]))
+
+    def test_bad_tokens_are_none(self):
+        for token in (None, "", "abc", "a.b.c", make_jwt({"sub": "u1"}), make_jwt({"exp": "soon"}), "a.%%%.c"):
+            self.assertIsNone(self.app.jwt_exp(token), token)
+
+
+if __name__ == "__main__":
+    unittest.main()
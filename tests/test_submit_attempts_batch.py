@@ -0,0 +1,143 @@
+"""submit_attempts_batch / issue_submit_ticket 마이그레이션(20261016000700) 확인 — 로컬 Postgres
+
+- 여러 유저의 제출이 호출 1번에 들어가고, 각 행은 티켓이 맞는 유저에게만 귀속되는지
+- 남의 티켓 / 만료된 티켓 / 티켓 없음 → 그 유저 행은 'ticket'으로 아무것도 안 들어가는지
+- 이미 들어간 제출이 섞인 유저는 'retry'로 통째로 빠지는지 (두 번 세지 않음)
+- 단어 결과는 미리 합친 개수로 user_word_agg에만 (문항별 record_word_results_bulk 안 부름)
+실행: TEST_DATABASE_URL=postgresql://... python -m unittest discover -s tests
+"""
+import unittest
+import uuid
+
+from migration_db import AVAILABLE, SKIP_REASON, as_role, connect, migrate, psycopg2, rpc
+
+USERS = [uuid.UUID(f"00000000-0000-0000-0000-00000000000{i}") for i in (1, 2, 3)]
+SEED_SQL = "insert into auth.users (id) values " + ", ".join(f"('{u}')" for u in USERS)
+
+
+def attempt(score=8, quiz_len=10):
+    return {
+        "attempt_id": str(uuid.uuid4()),
+        "user_email": "student@example.com",
+        "level": "N4",
+        "pos_mode": "verb",
+        "quiz_type": "reading",
+        "quiz_len": quiz_len,
+        "score": score,
+        "wrong_count": quiz_len - score,
+        "wrong_list": [],
+    }
+
+
+def word(user_id, word_key, is_correct, n):
+    return {
+        "user_id": str(user_id), "word_key": word_key, "level": "N4", "pos": "verb",
+        "quiz_type": "reading", "is_correct": is_correct, "n": n,
+    }
+
+
+@unittest.skipUnless(AVAILABLE, SKIP_REASON)
+class SubmitAttemptsBatchTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.conn = connect()
+        migrate(cls.conn, SEED_SQL)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+
+    def setUp(self):
+        self.cur = self.conn.cursor()
+
+    def tearDown(self):
+        self.conn.rollback()
+        self.cur.close()
+
+    def ticket(self, user_id):
+        as_role(self.cur, "authenticated", user_id)
+        return rpc(self.cur, "issue_submit_ticket")["ticket"]
+
+    def batch(self, users, rows, words=()):
+        as_role(self.cur, "anon")
+        return rpc(
+            self.cur, "submit_attempts_batch",
+            [{"user_id": str(u), "ticket": t} for u, t in users],
+            [{"user_id": str(u), "attempt": a} for u, a in rows],
+            list(words),
+        )
+
+    def scalar(self, sql, params=()):
+        self.cur.execute("reset role")
+        self.cur.execute(sql, params)
+        return self.cur.fetchone()[0]
+
+    def test_many_users_in_one_call(self):
+        u1, u2 = USERS[:2]
+        t1, t2 = self.ticket(u1), self.ticket(u2)
+        rows = [(u1, attempt(8)), (u2, attempt(5)), (u1, attempt(10))]
+        words = [word(u1, "食べる", True, 3), word(u1, "食べる", False, 2), word(u2, "食べる", False, 1)]
+        out = self.batch([(u1, t1), (u2, t2)], rows, words)
+
+        self.assertEqual([o["status"] for o in out], ["done"] * 3)
+        self.assertEqual([o["attempt_id"] for o in out], [a["attempt_id"] for _, a in rows])
+        self.assertEqual(out[0]["recent"]["n"], 2)
+        self.assertEqual(out[1]["recent"]["best"], 5)
+        for user_id, a in rows:
+            self.assertEqual(
+                self.scalar("select user_id from public.quiz_attempts where client_attempt_id = %s", (a["attempt_id"],)),
+                str(user_id),
+            )
+        self.assertEqual(
+            self.scalar("select array[seen_count, wrong_count] from public.user_word_agg where user_id = %s", (str(u1),)),
+            [5, 2],
+        )
+        self.assertEqual(self.scalar("select count(*) from public.word_results"), 0)
+
+    def test_wrong_or_missing_ticket_writes_nothing_for_that_user(self):
+        u1, u2, u3 = USERS
+        t1 = self.ticket(u1)
+        rows = [(u1, attempt()), (u2, attempt()), (u3, attempt())]
+        words = [word(u2, "食べる", False, 1)]
+        out = self.batch([(u1, t1), (u2, t1), (u3, None)], rows, words)  # u2가 u1의 티켓을 씀
+
+        self.assertEqual([o["status"] for o in out], ["done", "ticket", "ticket"])
+        self.assertEqual(self.scalar("select count(*) from public.quiz_attempts"), 1)
+        self.assertEqual(self.scalar("select count(*) from public.user_word_agg"), 0)
+
+    def test_expired_ticket_is_rejected(self):
+        u1 = USERS[0]
+        t1 = self.ticket(u1)
+        self.scalar("update public.submit_tickets set expires_at = now() - interval '1 second' returning 1")
+        out = self.batch([(u1, t1)], [(u1, attempt())])
+        self.assertEqual(out[0]["status"], "ticket")
+
+    def test_user_with_already_submitted_attempt_is_retried_whole(self):
+        u1, u2 = USERS[:2]
+        t1, t2 = self.ticket(u1), self.ticket(u2)
+        first = attempt()
+        as_role(self.cur, "authenticated", u1)
+        rpc(self.cur, "submit_attempt", first, [])  # 1건씩 경로로 먼저 들어감
+
+        rows = [(u1, first), (u1, attempt()), (u2, attempt())]
+        out = self.batch([(u1, t1), (u2, t2)], rows, [word(u1, "食べる", False, 2)])
+
+        self.assertEqual([o["status"] for o in out], ["retry", "retry", "done"])
+        self.assertEqual(self.scalar("select count(*) from public.quiz_attempts where user_id = %s", (str(u1),)), 1)
+        self.assertEqual(self.scalar("select count(*) from public.user_word_agg"), 0)
+
+    def test_ticket_is_stored_hashed_and_needs_login(self):
+        u1 = USERS[0]
+        t1 = self.ticket(u1)
+        self.assertGreaterEqual(len(t1), 64)
+        self.assertEqual(
+            self.scalar("select count(*) from public.submit_tickets where ticket_hash = sha256(convert_to(%s, 'UTF8'))", (t1,)),
+            1,
+        )
+        as_role(self.cur, "anon")
+        with self.assertRaises(psycopg2.errors.InsufficientPrivilege):
+            rpc(self.cur, "issue_submit_ticket")
+
+
+if __name__ == "__main__":
+    unittest.main()
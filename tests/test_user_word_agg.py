@@ -0,0 +1,112 @@
+"""user_word_agg 마이그레이션(20261016000100) 확인 — 로컬 Postgres에 실제 SQL 적용
+
+- 기존 wrong_list 백필은 backfilled_wrong으로 표시되는지 (오답률 계산에서 빠지는지)
+- record_word_results_bulk 1번 = 기존 본문(문항별) + 집계(단어별 1행)인지
+- 다시 부르면 seen/wrong이 더해지는지 (덮어쓰지 않음), 정답만이면 last_wrong_at 유지
+- 유저/유형별로 따로 쌓이는지, anon은 집계를 못 건드리는지
+실행: TEST_DATABASE_URL=postgresql://... python -m unittest discover -s tests
+"""
+import json
+import unittest
+import uuid
+
+from migration_db import AVAILABLE, SKIP_REASON, as_role, connect, migrate, psycopg2, rpc
+
+U1 = uuid.UUID("00000000-0000-0000-0000-000000000001")
+U2 = uuid.UUID("00000000-0000-0000-0000-000000000002")
+
+# 마이그레이션 전 기록: pos_mode에는 quiz_type이 들어 있었음, wrong_list는 틀린 단어만
+SEED_SQL = """
+insert into auth.users (id) values (%(u1)s), (%(u2)s);
+insert into public.quiz_attempts (user_id, level, pos_mode, quiz_len, score, wrong_count, wrong_list, created_at)
+values
+  (%(u1)s, 'N4', 'reading', 10, 8, 2, %(w1)s, '2026-10-01 09:00+09'),
+  (%(u1)s, 'N4', 'reading', 10, 9, 1, %(w2)s, '2026-10-02 09:00+09');
+"""
+
+
+def item(word_key, is_correct, quiz_type="reading"):
+    return {"word_key": word_key, "level": "N4", "pos": "verb", "quiz_type": quiz_type, "is_correct": is_correct}
+
+
+@unittest.skipUnless(AVAILABLE, SKIP_REASON)
+class UserWordAggMigrationTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.conn = connect()
+        migrate(cls.conn, SEED_SQL, {
+            "u1": str(U1),
+            "u2": str(U2),
+            "w1": json.dumps([{"단어": "食べる"}, {"단어": "飲む", "유형": "meaning"}], ensure_ascii=False),
+            "w2": json.dumps([{"단어": " 食べる "}], ensure_ascii=False),
+        })
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+
+    def setUp(self):
+        self.cur = self.conn.cursor()
+
+    def tearDown(self):
+        self.conn.rollback()
+        self.cur.close()
+
+    def record(self, items, user_id=U1):
+        as_role(self.cur, "authenticated", user_id)
+        rpc(self.cur, "record_word_results_bulk", items)
+
+    def row(self, word_key, quiz_type="reading", user_id=U1):
+        self.cur.execute("reset role")
+        self.cur.execute(
+            "select seen_count, wrong_count, backfilled_wrong, last_wrong_at is not null from public.user_word_agg "
+            "where user_id = %s and word_key = %s and quiz_type = %s",
+            (str(user_id), word_key, quiz_type),
+        )
+        return self.cur.fetchone()
+
+    def test_backfill_marks_rows_backfilled(self):
+        self.assertEqual(self.row("食べる"), (2, 2, 2, True))
+        self.assertEqual(self.row("飲む", quiz_type="meaning"), (1, 1, 1, True))
+        self.assertIsNone(self.row("食べる", user_id=U2))
+
+    def test_same_word_in_one_call_is_one_row(self):
+        self.record([item("行く", True), item("行く", False), item("", False)])
+        self.assertEqual(self.row("行く"), (2, 1, 0, True))
+        # 기존 본문은 그대로 문항별로 불림
+        self.cur.execute("select count(*) from public.word_results")
+        self.assertEqual(self.cur.fetchone()[0], 3)
+
+    def test_repeated_calls_increment(self):
+        self.record([item("行く", False)])
+        self.record([item("行く", True), item("行く", True)])
+        self.assertEqual(self.row("行く"), (3, 1, 0, True))  # 정답만 → last_wrong_at 유지
+
+    def test_users_and_quiz_types_are_separate(self):
+        self.record([item("行く", True, quiz_type="meaning")], user_id=U1)
+        self.record([item("行く", True)], user_id=U2)
+        self.assertEqual(self.row("行く", quiz_type="meaning"), (1, 0, 0, False))
+        self.assertEqual(self.row("行く", user_id=U2), (1, 0, 0, False))
+        self.assertIsNone(self.row("行く"))
+
+    def test_backfilled_wrongs_excluded_from_error_rate(self):
+        # 백필 seen = wrong = 2 (본 횟수 모름) → 이후 실제 기록 4번 중 1번 오답
+        self.record([item("食べる", True)] * 3 + [item("食べる", False)])
+        seen, wrong, bf, _ = self.row("食べる")
+        self.assertEqual((seen, wrong), (6, 3))  # TOP10용 누적 오답은 그대로
+        self.assertEqual((wrong - bf) / (seen - bf), 0.25)  # app.word_stats와 같은 계산
+
+    def test_top_view_sums_quiz_types(self):
+        self.record([item("飲む", False)])
+        as_role(self.cur, "authenticated", U1)
+        self.cur.execute("select word_key, wrong_count from public.user_wrong_word_top")
+        self.assertEqual(dict(self.cur.fetchall()), {"飲む": 2, "食べる": 2})
+
+    def test_anon_cannot_bump(self):
+        as_role(self.cur, "anon")
+        with self.assertRaises(psycopg2.errors.InsufficientPrivilege):
+            rpc(self.cur, "bump_user_word_agg", [item("行く", False)])
+
+
+if __name__ == "__main__":
+    unittest.main()
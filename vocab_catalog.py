@@ -0,0 +1,195 @@
+"""단어 카탈로그 파일 입출력 (streamlit 없이 app.py / scripts에서 공용)
+
+- data/catalog/<레벨>/<품사>.csv = 원본(사람이 고치는 파일)
+- data/catalog/manifest.json    = 파티션별 행 수 + CSV sha256
+- data/catalog/<레벨>/<품사>.arrow = 컴파일본(Arrow IPC, 비압축 → memory map)
+  - level/pos/문자열 정규화 + word_key까지 미리 계산해 둠
+  - 컬럼은 사전 인코딩(dictionary) → 읽을 때 코드(int32)는 복사 없이, 문자열은 고유값만 만듦
+  - 스키마 메타데이터에 원본 CSV의 sha256/크기/mtime을 기록해서 오래됐는지 판정
+  - 없거나 오래됐으면 CSV를 읽고, 가능하면 그 자리에서 다시 컴파일
+"""
+from pathlib import Path
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+READ_KW = dict(
+    dtype=str,
+    keep_default_na=False,
+    na_values=["nan", "NaN", "NULL", "null", "None", "none"],
+)
+
+WORD_COLUMNS = ("level", "pos", "jp_word", "reading", "meaning")
+COMPILED_COLUMNS = WORD_COLUMNS + ("word_key",)
+LEVEL_ORDER = ("N5", "N4", "N3", "N2", "N1")
+POS_ORDER = ("i_adj", "na_adj", "verb")
+COMPILED_FORMAT = "2"
+
+
+def ordered(values, preferred) -> list:
+    return sorted(values, key=lambda v: (preferred.index(v) if v in preferred else len(preferred), v))
+
+
+def load_manifest(catalog_dir: Path) -> dict:
+    with open(Path(catalog_dir) / "manifest.json", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if not isinstance(manifest.get("levels"), dict) or not manifest["levels"]:
+        raise ValueError("카탈로그 manifest에 레벨이 없습니다.")
+    return manifest
+
+
+def compiled_path(catalog_dir: Path, entry: dict) -> Path:
+    return (Path(catalog_dir) / entry["file"]).with_suffix(".arrow")
+
+
+def read_csv_partition(catalog_dir: Path, entry: dict) -> pd.DataFrame:
+    raw = (Path(catalog_dir) / entry["file"]).read_bytes()
+    if hashlib.sha256(raw).hexdigest() != entry["sha256"]:
+        raise ValueError(f"카탈로그 체크섬 불일치: {entry['file']} (scripts/build_catalog.py로 manifest 갱신)")
+    df = pd.read_csv(io.BytesIO(raw), **READ_KW)
+    if len(df) != int(entry["rows"]):
+        raise ValueError(f"카탈로그 행 수 불일치: {entry['file']} ({len(df)} != {entry['rows']})")
+    missing = set(WORD_COLUMNS) - set(df.columns)
+    if missing:
+        raise ValueError(f"CSV 필수 컬럼 누락: {sorted(list(missing))}")
+    return df
+
+
+def effective_entry(catalog_dir: Path, entry: dict) -> dict:
+    """디스크의 CSV 기준 manifest 항목 (manifest 재빌드 없이 CSV만 고친 경우 sha256/rows를 다시 계산)"""
+    raw = (Path(catalog_dir) / entry["file"]).read_bytes()
+    sha = hashlib.sha256(raw).hexdigest()
+    if sha == entry["sha256"]:
+        return entry
+    rows = len(pd.read_csv(io.BytesIO(raw), **READ_KW))
+    return {**entry, "rows": rows, "sha256": sha}
+
+
+def normalize_partition(df: pd.DataFrame) -> dict:
+    """공백 제거 + level 대문자 + pos 소문자 + word_key(표기 우선, 없으면 읽기)"""
+    cols = {}
+    for name in WORD_COLUMNS:
+        values = ["" if v is None or (isinstance(v, float) and pd.isna(v)) else str(v).strip() for v in df[name].tolist()]
+        if name == "level":
+            values = [v.upper() for v in values]
+        elif name == "pos":
+            values = [v.lower() for v in values]
+        cols[name] = values
+    cols["word_key"] = [jp or rd for jp, rd in zip(cols["jp_word"], cols["reading"])]
+    return cols
+
+
+def encode_column(values) -> tuple:
+    """값 목록 → (고유값 배열, 행별 코드 int32) — 고유값은 처음 나온 순서, 문자열 객체는 values의 것을 그대로
+
+    - pyarrow 해시 인코딩 (없으면 np.unique 정렬)
+    """
+    values = np.asarray(values, dtype=object)
+    try:
+        import pyarrow as pa
+    except ImportError:
+        uniq, codes = np.unique(values, return_inverse=True)
+        return uniq, codes.astype(np.int32).reshape(-1)
+    codes = pa.array(values, type=pa.string()).dictionary_encode().indices.to_numpy()
+    _, first = np.unique(codes, return_index=True)
+    return values[first], codes
+
+
+def merge_encoded(pairs: list) -> tuple:
+    """파티션별 (고유값, 코드) 여러 개 → 이어 붙인 하나의 (고유값, 코드) — 다시 인코딩은 고유값에만"""
+    if not pairs:
+        return np.zeros(0, dtype=object), np.zeros(0, dtype=np.int32)
+    if len(pairs) == 1:
+        return pairs[0]
+    values, remap = encode_column(np.concatenate([v for v, _ in pairs]))
+    offsets = np.cumsum([0] + [len(v) for v, _ in pairs[:-1]])
+    codes = np.concatenate([c.astype(np.int64) + off for (_, c), off in zip(pairs, offsets)])
+    return values, remap[codes]
+
+
+def _source_meta(catalog_dir: Path, entry: dict) -> dict:
+    st_ = (Path(catalog_dir) / entry["file"]).stat()
+    return {
+        "format": COMPILED_FORMAT,
+        "source_sha256": entry["sha256"],
+        "source_size": str(st_.st_size),
+        "source_mtime_ns": str(st_.st_mtime_ns),
+    }
+
+
+def compile_partition(catalog_dir: Path, entry: dict, cols: dict | None = None) -> Path:
+    """CSV 파티션 → .arrow (임시 파일에 쓰고 rename → 읽는 쪽은 항상 완성된 파일만 봄)"""
+    import pyarrow as pa
+
+    if cols is None:
+        cols = normalize_partition(read_csv_partition(catalog_dir, entry))
+    table = pa.table({name: pa.array(cols[name], type=pa.string()).dictionary_encode() for name in COMPILED_COLUMNS})
+    table = table.replace_schema_metadata(_source_meta(catalog_dir, entry))
+
+    out = compiled_path(catalog_dir, entry)
+    tmp = out.with_name(f".{out.name}.{os.getpid()}.tmp")
+    with pa.OSFile(str(tmp), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, out)
+    return out
+
+
+def read_compiled_partition(catalog_dir: Path, entry: dict):
+    """.arrow를 memory map으로 읽음 (복사 없음). 없거나 오래됐으면 None"""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+
+    path = compiled_path(catalog_dir, entry)
+    if not path.exists():
+        return None
+
+    try:
+        reader = pa.ipc.open_file(pa.memory_map(str(path), "r"))
+        meta = {k.decode(): v.decode() for k, v in (reader.schema.metadata or {}).items()}
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+    if meta.get("format") != COMPILED_FORMAT or meta.get("source_sha256") != entry["sha256"]:
+        return None
+
+    # ✅ CSV가 컴파일 이후 건드려졌으면(크기/mtime) 내용 해시로 한 번 더 확인
+    src_meta = _source_meta(catalog_dir, entry)
+    if (meta.get("source_size"), meta.get("source_mtime_ns")) != (src_meta["source_size"], src_meta["source_mtime_ns"]):
+        raw = (Path(catalog_dir) / entry["file"]).read_bytes()
+        if hashlib.sha256(raw).hexdigest() != entry["sha256"]:
+            return None
+
+    table = reader.read_all()
+    if table.num_rows != int(entry["rows"]) or not set(COMPILED_COLUMNS) <= set(table.column_names):
+        return None
+    return table
+
+
+def load_partition(catalog_dir: Path, entry: dict, compile_on_miss: bool = True) -> tuple[dict, str]:
+    """(컬럼 → (고유값 배열, 행별 코드 int32), "arrow"|"csv")
+
+    - 행별 문자열 객체는 만들지 않음: values[codes]로 펼쳐도 같은 값은 같은 객체
+    """
+    table = read_compiled_partition(catalog_dir, entry)
+    if table is not None:
+        table = table.unify_dictionaries()
+        cols = {}
+        for name in COMPILED_COLUMNS:
+            arr = table.column(name).combine_chunks()
+            cols[name] = (arr.dictionary.to_numpy(zero_copy_only=False), arr.indices.to_numpy())
+        return cols, "arrow"
+
+    cols = normalize_partition(read_csv_partition(catalog_dir, entry))
+    if compile_on_miss:
+        try:
+            compile_partition(catalog_dir, entry, cols)
+        except (ImportError, OSError):
+            pass  # 읽기 전용 배포 등: 다음에도 CSV로
+    return {name: encode_column(cols[name]) for name in COMPILED_COLUMNS}, "csv"